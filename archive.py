@@ -0,0 +1,499 @@
+# CA2 OOP - Bank Management System
+# old transactions moved out of the ledger into compressed blocks with an index of what each block holds
+import os
+import lzma
+import zlib
+import bisect
+import struct
+import hashlib
+import argparse
+import threading
+import metrics
+from locks import FileLock
+from storage import LedgerIndex, file_id
+from shards import ShardedLedger
+
+# codec name -> (byte kept in the index, compress, decompress)
+CODECS = {"lzma": (b"x", lzma.compress, lzma.decompress),
+          "zlib": (b"z", lambda data: zlib.compress(data, 9), zlib.decompress)}
+DECOMPRESS = {tag: decompress for tag, compress, decompress in CODECS.values()}
+
+
+class Bloom(object):
+    """Bloom filter of the IBANs of the transactions in a block, so a statement of one account skips
+    the blocks it has no transactions in without decompressing them. It has about ten bits per IBAN
+    and five bits are set for each one, so about one block in a hundred without the IBAN is still read"""
+    BITS = 10  # bits per IBAN
+    HASHES = 5
+
+    def __init__(self, bits):
+        self.bits = bits
+
+    @classmethod
+    def of(cls, IBANs):
+        bloom = cls(bytearray(max(8, (len(IBANs) * cls.BITS + 7) // 8)))
+        for IBAN in IBANs:
+            bloom.add(IBAN)
+        return bloom
+
+    def _positions(self, IBAN):
+        digest = int.from_bytes(hashlib.blake2b(IBAN.encode(), digest_size=8).digest(), "little")
+        first, step = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        size = len(self.bits) * 8
+        return [(first + i * step) % size for i in range(self.HASHES)]
+
+    def add(self, IBAN):
+        for position in self._positions(IBAN):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, IBAN):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(IBAN))
+
+
+class Block(object):
+    """One compressed block of ledger lines in the archive data file, as listed in the index. The
+    range of ids and dates and the bloom filter of IBANs say which queries can find something in it"""
+    ENTRY = struct.Struct("<qqqqq10s10scI")  # offset, size, first and last id, lines, first and last date, codec, bloom bytes
+
+    def __init__(self, offset, size, first, last, count, start, end, codec, bloom):
+        self.offset = offset  # where the compressed block starts in the data file and its length
+        self.size = size
+        self.first = first  # lowest and highest transaction id in the block
+        self.last = last
+        self.count = count  # lines in the block
+        self.start = start  # earliest and latest transaction date, in YYYY-MM-DD form
+        self.end = end
+        self.codec = codec
+        self.bloom = bloom
+
+    def pack(self):
+        return self.ENTRY.pack(self.offset, self.size, self.first, self.last, self.count, self.start.encode(),
+                               self.end.encode(), self.codec, len(self.bloom.bits)) + bytes(self.bloom.bits)
+
+    @classmethod
+    def unpack(cls, data, position):
+        """method returning the block whose entry starts at position in the index and where the next one starts"""
+        offset, size, first, last, count, start, end, codec, length = cls.ENTRY.unpack_from(data, position)
+        position += cls.ENTRY.size
+        bloom = Bloom(bytearray(data[position:position + length]))
+        return cls(offset, size, first, last, count, start.decode(), end.decode(), codec, bloom), position + length
+
+    def overlaps(self, start, end):
+        """method to check if the block can have transactions between two dates. None is no bound"""
+        return (start is None or self.end >= start) and (end is None or self.start <= end)
+
+
+def block_lines(filename, block, fd=None):
+    """function returning the ledger lines of a block of the data file as bytes without their newlines"""
+    if fd is None:
+        with open(filename, "rb") as a_reader:
+            a_reader.seek(block.offset)
+            data = a_reader.read(block.size)
+    else:
+        data = os.pread(fd, block.size, block.offset)  # threads read blocks at the same time
+    if metrics.enabled:
+        metrics.file_io(filename, read=len(data), lines=block.count)
+    return DECOMPRESS[block.codec](data).splitlines()
+
+
+class LedgerArchive(object):
+    """Archive of the oldest transactions of the ledger. The lines are kept as they were in the
+    ledger, in blocks of about BLOCK bytes that are each compressed on their own, in the .arc data
+    file. The .arx index file lists every block with its range of ids and dates and a bloom filter
+    of its IBANs, so a query only decompresses the blocks that can have what it asks for.
+
+    Every transaction id up to last is in the archive and none after it. New blocks are only
+    appended to the data file and the index is replaced through a synced temp file once they are
+    synced, so blocks written by an archive run that didn't finish are past the end the index
+    records and are written over by the next run"""
+    MAGIC = b"BANKARC1"
+    HEADER = struct.Struct("<8sqqq")  # magic, last id archived, end of the blocks in the data file, blocks
+    BLOCK = 1 << 16
+
+    def __init__(self, filename="accountsTransactions.txt"):
+        prefix = os.path.splitext(filename)[0]
+        self._data = prefix + ".arc"
+        self._index = prefix + ".arx"
+        self._index_id = None
+        self.last = 0
+        self._end = 0
+        self._blocks = []  # blocks by first id
+        self._firsts = []  # first id of each block, for bisect
+        self._reach = []  # highest last id of each block and the blocks before it
+        self._fd = None  # data file opened on first read
+        self._cached = (None, None)  # block decompressed last and its lines by id
+        self._pending = []  # blocks written by extend() that aren't in the index yet
+        self._read_lock = threading.Lock()
+
+    def _refresh(self):
+        """method to read the index again if an archive run has replaced it"""
+        index = file_id(self._index)
+        if index == self._index_id:
+            return
+        with self._read_lock:
+            blocks = []
+            last = end = 0
+            if index is not None:
+                with open(self._index, "rb") as index_reader:
+                    data = index_reader.read()
+                magic, last, end, count = self.HEADER.unpack_from(data)
+                if magic != self.MAGIC:
+                    raise ValueError(self._index + " is not a ledger archive index")
+                position = self.HEADER.size
+                for i in range(count):
+                    block, position = Block.unpack(data, position)
+                    blocks.append(block)
+            blocks.sort(key=lambda block: block.first)
+            self._blocks = blocks
+            self._firsts = [block.first for block in blocks]
+            self._reach = []
+            for block in blocks:
+                self._reach.append(max(block.last, self._reach[-1] if self._reach else 0))
+            self.last, self._end = last, end
+            self._cached = (None, None)
+            self._index_id = index
+
+    def last_tid(self):
+        """method returning the highest transaction id archived, 0 if nothing is"""
+        self._refresh()
+        return self.last
+
+    def blocks(self):
+        """method returning the blocks in id order"""
+        self._refresh()
+        return list(self._blocks)
+
+    def data_file(self):
+        """method returning the name of the data file, for programs that read blocks themselves"""
+        return self._data
+
+    def _lines(self, block):
+        """method returning the lines of a block by transaction id. the last block read is kept as
+        statements read the ids of an account in order and often find several in a row in a block"""
+        cached = self._cached
+        if cached[0] is block:
+            return cached[1]
+        if self._fd is None:
+            with self._read_lock:
+                if self._fd is None:
+                    self._fd = os.open(self._data, os.O_RDONLY)
+        lines = {}
+        for line in block_lines(self._data, block, self._fd):
+            tid = line.split(b"_", 1)[0]
+            if tid.isdigit():
+                lines[int(tid)] = line
+        self._cached = (block, lines)
+        return lines
+
+    def _holding(self, tid):
+        """generator returning the blocks whose range of ids has tid in it"""
+        i = bisect.bisect_right(self._firsts, tid) - 1
+        while i >= 0 and self._reach[i] >= tid:  # blocks further left all end before tid
+            if self._blocks[i].last >= tid:
+                yield self._blocks[i]
+            i -= 1
+
+    @metrics.timed("archive.read")
+    def read(self, tids, start=None, end=None):
+        """generator returning the list of details of each passed transaction id in id order, like
+        Ledger.read. only the blocks with the ids that have transactions between the start and end
+        dates, if they are passed, are decompressed. ids that are not in the archive are skipped"""
+        self._refresh()
+        start = str(start) if start else None
+        end = str(end) if end else None
+        wanted = sorted(set(int(tid) for tid in tids if str(tid).isdigit() and 0 < int(tid) <= self.last))
+        for tid in wanted:
+            for block in self._holding(tid):
+                if block.overlaps(start, end):
+                    line = self._lines(block).get(tid)
+                    if line is not None:
+                        yield line.decode().split("_")
+                        break
+
+    def between(self, start=None, end=None, IBAN=None):
+        """generator returning every archived transaction dated between start and end, and paid into
+        or out of IBAN if it is passed. only the blocks with transactions in the range, and with the
+        IBAN in their bloom filter, are decompressed"""
+        start = str(start) if start else None
+        end = str(end) if end else None
+        for block in self.blocks():
+            if not block.overlaps(start, end) or (IBAN is not None and IBAN not in block.bloom):
+                continue
+            for line in block_lines(self._data, block):
+                transaction = line.decode().split("_")
+                if len(transaction) < 5:
+                    continue
+                if (start is not None and transaction[4] < start) or (end is not None and transaction[4] > end):
+                    continue
+                if IBAN is None or transaction[2] == IBAN or transaction[5:6] == [IBAN]:
+                    yield transaction
+
+    def __iter__(self):
+        """iterate through the details of every archived transaction, block by block"""
+        return self.between()
+
+    def extend(self, lines, codec="lzma", size=BLOCK):
+        """method to compress ledger lines, as bytes with their newlines, into blocks appended to the
+        data file. the blocks are synced but not in the index until commit() is called. the lock of
+        the ledger is held by the caller"""
+        self._refresh()
+        tag, compress = CODECS[codec][:2]
+        blocks = []
+        with open(self._data, "r+b" if os.path.exists(self._data) else "w+b") as a_writer:
+            a_writer.truncate(self._end)  # blocks of a run that didn't finish
+            a_writer.seek(self._end)
+            chunk = []
+            length = 0
+            for line in lines:
+                chunk.append(line)
+                length += len(line)
+                if length >= size:
+                    blocks.append(self._write_block(a_writer, chunk, tag, compress))
+                    chunk = []
+                    length = 0
+            if chunk:
+                blocks.append(self._write_block(a_writer, chunk, tag, compress))
+            a_writer.flush()
+            os.fsync(a_writer.fileno())
+        self._pending = blocks
+        return blocks
+
+    def _write_block(self, a_writer, chunk, tag, compress):
+        first = last = start = end = None
+        IBANs = set()
+        for line in chunk:
+            transaction = line.decode().strip().split("_")
+            if len(transaction) < 5 or not transaction[0].isdigit():
+                continue
+            tid = int(transaction[0])
+            first = tid if first is None else min(first, tid)
+            last = tid if last is None else max(last, tid)
+            start = transaction[4] if start is None else min(start, transaction[4])
+            end = transaction[4] if end is None else max(end, transaction[4])
+            IBANs.update(transaction[2:3] + transaction[5:6])
+        data = compress(b"".join(chunk))
+        offset = a_writer.tell()
+        a_writer.write(data)
+        if metrics.enabled:
+            metrics.file_io(self._data, written=len(data))
+        if first is None:  # only lines spoilt by a crash. kept but never read
+            first, last, start, end = 0, -1, "0000-00-00", "0000-00-00"
+        return Block(offset, len(data), first, last, len(chunk), start, end, tag, Bloom.of(IBANs))
+
+    def commit(self, last):
+        """method to add the blocks written by extend() to the index, with every id up to last now
+        in the archive. the index is replaced through a synced temp file"""
+        blocks = self._blocks + self._pending
+        end = max([self._end] + [block.offset + block.size for block in blocks])
+        temp = self._index + ".tmp"
+        with open(temp, "wb") as index_writer:
+            index_writer.write(self.HEADER.pack(self.MAGIC, max(last, self.last), end, len(blocks)))
+            for block in blocks:
+                index_writer.write(block.pack())
+            index_writer.flush()
+            os.fsync(index_writer.fileno())
+        os.replace(temp, self._index)
+        self._pending = []
+        self._index_id = None
+        self._refresh()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ArchivedLedger(object):
+    """Ledger whose oldest transactions have been moved into an archive. It has the same methods as
+    Ledger. Transactions are appended to the ledger, and ids up to the last one archived are read
+    from the archive and the rest from the ledger. Lines left in the ledger by an archive run that
+    stopped after writing the archive index are in the archive too and are skipped"""
+    def __init__(self, ledger, archive):
+        self.ledger = ledger
+        self.archive = archive
+
+    def begin(self):
+        self.ledger.begin()
+
+    def commit(self):
+        self.ledger.commit()
+
+    def append(self, tid, kind, IBAN, amount, date=None, source=None):
+        self.ledger.append(tid, kind, IBAN, amount, date, source)
+
+    def read(self, tids, start=None, end=None):
+        """generator returning the list of details of each passed transaction id in id order"""
+        floor = self.archive.last_tid()
+        archived, live = [], []
+        for tid in tids:
+            if str(tid).isdigit():
+                (archived if int(tid) <= floor else live).append(tid)
+        if archived:
+            yield from self.archive.read(archived, start, end)
+        if live:
+            yield from self.ledger.read(live, start, end)
+
+    def between(self, start=None, end=None, IBAN=None):
+        """generator returning every transaction dated between start and end, and paid into or out
+        of IBAN if it is passed, the archived ones first"""
+        floor = self.archive.last_tid()
+        yield from self.archive.between(start, end, IBAN)
+        start = str(start) if start else None
+        end = str(end) if end else None
+        live = self.ledger.between(start, end) if hasattr(self.ledger, "between") else iter(self.ledger)
+        for transaction in live:
+            if len(transaction) < 5 or not transaction[0].isdigit() or int(transaction[0]) <= floor:
+                continue
+            if (start is not None and transaction[4] < start) or (end is not None and transaction[4] > end):
+                continue
+            if IBAN is None or transaction[2] == IBAN or transaction[5:6] == [IBAN]:
+                yield transaction
+
+    def __iter__(self):
+        """iterate through the details of every transaction, the archived ones first"""
+        return self.between()
+
+    def files(self):
+        """method returning the files of the ledger that aren't archived. the archive is read in
+        blocks through archive.blocks()"""
+        return self.ledger.files()
+
+    def last_tid(self):
+        return max(self.ledger.last_tid(), self.archive.last_tid())
+
+    def close(self):
+        self.ledger.close()
+        self.archive.close()
+
+
+def _split(filename, floor, last, kept):
+    """generator returning the lines of the transactions file with ids after floor up to last, and
+    writing the lines after last to kept. lines up to floor are in the archive already"""
+    with open(filename, "rb") as t_reader:
+        for line in t_reader:
+            tid = line.split(b"_", 1)[0].strip()
+            if not tid.isdigit():
+                if line.strip():
+                    kept.write(line)
+            elif int(tid) > last:
+                kept.write(line)
+            elif int(tid) > floor:
+                yield line
+
+
+def _archive_file(store, filename, before, codec, size):
+    """function for archiving the transactions of the transactions file up to the first one dated on
+    or after before. the lines left are written to a temp file that replaces the transactions file
+    once the archive index is written, and the ledger index is built again"""
+    with FileLock(filename + ".lock"):
+        floor = store.last_tid()
+        first_kept = None
+        highest = floor
+        stale = False  # lines left by a run that stopped after writing the archive index
+        if os.path.exists(filename):
+            with open(filename, "rb") as t_reader:
+                for line in t_reader:
+                    transaction = line.strip().split(b"_")
+                    if len(transaction) < 5 or not transaction[0].isdigit():
+                        continue
+                    tid = int(transaction[0])
+                    highest = max(highest, tid)
+                    stale = stale or tid <= floor
+                    if transaction[4].decode() >= before and (first_kept is None or tid < first_kept):
+                        first_kept = tid
+        last = max(floor, highest if first_kept is None else first_kept - 1)
+        if last == floor and not stale:
+            return 0, floor
+        temp = filename + ".tmp"
+        with open(temp, "wb") as kept:
+            blocks = store.extend(_split(filename, floor, last, kept), codec, size)
+            kept.flush()
+            os.fsync(kept.fileno())
+        store.commit(last)
+        os.replace(temp, filename)
+        index = LedgerIndex(filename)
+        index.catch_up()  # the file is shorter than the index covers so it is built again in place
+        index.close()
+        return sum(block.count for block in blocks), last
+
+
+def _archive_shards(store, filename, before, codec, size):
+    """function for archiving the shards, from the oldest on, that are closed and end before the
+    passed date. they are taken out of the manifest and removed once the archive index is written"""
+    ledger = ShardedLedger(filename)
+    with ledger._lock:
+        ledger._refresh()
+        floor = store.last_tid()
+        cold = []
+        for shard in ledger._shards:
+            if shard.state == "open" or shard.first is None or shard.end >= before:
+                break
+            cold.append(shard)
+        if not cold:
+            return 0, floor
+        last = max([floor] + [shard.last for shard in cold])
+        blocks = []
+        if last > floor:
+            blocks = store.extend(_shard_lines(cold, floor), codec, size)
+            store.commit(last)
+        ledger._shards = [shard for shard in ledger._shards if shard not in cold]
+        ledger._write_manifest()
+        for shard in cold:
+            for name in (shard.filename, os.path.splitext(shard.filename)[0] + ".idx"):
+                if os.path.exists(name):
+                    os.remove(name)
+        return sum(block.count for block in blocks), last
+
+
+def _shard_lines(shards, floor):
+    for shard in shards:
+        if shard.last <= floor or not os.path.exists(shard.filename):  # archived by a run that didn't finish
+            continue
+        with open(shard.filename, "rb") as t_reader:
+            for line in t_reader:
+                tid = line.split(b"_", 1)[0].strip()
+                if tid.isdigit() and int(tid) > floor:
+                    yield line
+
+
+def archive(before, filename="accountsTransactions.txt", codec="lzma", size=LedgerArchive.BLOCK):
+    """function for moving the transactions dated before the passed YYYY-MM-DD date out of the
+    ledger into the archive. ids go up with the dates, so what is archived is every id up to the
+    first transaction dated on or after the date. a sharded ledger archives whole closed shards that
+    end before the date. returns the number of transactions archived and the last id in the archive.
+    it is run when the bank is quiet as programs reading the ledger at the time can miss lines"""
+    store = LedgerArchive(filename)
+    try:
+        if os.path.exists(os.path.splitext(filename)[0] + ".manifest"):
+            return _archive_shards(store, filename, str(before), codec, size)
+        return _archive_file(store, filename, str(before), codec, size)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old transactions into the compressed archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive_command = commands.add_parser("before", help="archive the transactions dated before a date")
+    archive_command.add_argument("date", help="YYYY-MM-DD date of the first transaction kept in the ledger")
+    archive_command.add_argument("--codec", choices=sorted(CODECS), default="lzma")
+    archive_command.add_argument("--block", type=int, default=64, help="kilobytes of ledger lines in a block")
+    statement_command = commands.add_parser("statement", help="list the archived transactions of an IBAN")
+    statement_command.add_argument("IBAN")
+    statement_command.add_argument("--start", default=None, help="YYYY-MM-DD")
+    statement_command.add_argument("--end", default=None, help="YYYY-MM-DD")
+    commands.add_parser("info", help="show the blocks of the archive")
+    args = parser.parse_args()
+    if args.command == "before":
+        count, last = archive(args.date, codec=args.codec, size=args.block << 10)
+        print(count, "transactions archived, ids up to", last, "are in the archive")
+    elif args.command == "statement":
+        for transaction in LedgerArchive().between(args.start, args.end, args.IBAN):
+            print(" ".join(transaction))
+    else:
+        store = LedgerArchive()
+        blocks = store.blocks()
+        for block in blocks:
+            print("ids", block.first, "to", block.last, "dates", block.start, "to", block.end, block.count, "lines",
+                  block.size, "bytes")
+        print(len(blocks), "blocks,", sum(block.size for block in blocks), "bytes, ids up to", store.last_tid())
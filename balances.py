@@ -0,0 +1,186 @@
+# CA2 OOP - Bank Management System
+# balance book holding every account's balance in columns for bank wide month end jobs
+import array
+import argparse
+import datetime
+try:
+    import numpy  # columns are numpy arrays and the jobs run over a whole column at once
+except ImportError:
+    numpy = None  # the same columns are kept in array.array and the jobs loop over them
+from money import Money, cents
+from project import backend, account_store, tid_allocator, ledger, open_bank
+
+SAVINGS = 0
+CHECKING = 1
+
+
+class BalanceBook(object):
+    """Balances, account types, credit limits and the date of the last withdrawal/transfer of every
+    account kept in columns, one row per account, instead of one account object per account. Amounts
+    are kept in cents so the columns are whole numbers and sums stay exact. The row
+    of an account is found from its number through a slot column, the same way as the binary
+    accounts file. Month end jobs work out the change to every account in one pass over the columns
+    and apply() writes the changed accounts back together"""
+    def __init__(self):
+        self.numbers = self._column([])  # account number of each row
+        self.balances = self._column([])
+        self.types = self._column([])  # SAVINGS or CHECKING
+        self.limits = self._column([])  # credit limit of checking accounts, 0 for savings
+        self.last_debits = self._column([])  # ordinal of the last withdrawal/transfer date, 0 if none
+        self._slots = array.array("q")  # account number -> row + 1
+
+    @staticmethod
+    def _column(values):
+        if numpy is not None:
+            return numpy.array(values, dtype=numpy.int64)
+        return array.array("q", values)
+
+    @classmethod
+    def load(cls, store):
+        """method to build the book from every account in an account store"""
+        numbers, balances, types, limits, last_debits = [], [], [], [], []
+        for acc in store:
+            numbers.append(int(acc[0]))
+            balances.append(cents(acc[4]))
+            if acc[1] == "savings":
+                types.append(SAVINGS)
+                limits.append(0)
+                dates = acc[6] if len(acc) > 6 else "None"
+                if dates == "None":
+                    last_debits.append(0)
+                else:
+                    last_debits.append(max(datetime.date.fromisoformat(d).toordinal() for d in dates.split(",")))
+            else:
+                types.append(CHECKING)
+                limits.append(cents(acc[6]))
+                last_debits.append(0)
+        book = cls()
+        book.numbers = cls._column(numbers)
+        book.balances = cls._column(balances)
+        book.types = cls._column(types)
+        book.limits = cls._column(limits)
+        book.last_debits = cls._column(last_debits)
+        if numbers:
+            book._slots = array.array("q", bytes(8 * (max(numbers) + 1)))
+            for row, acc_number in enumerate(numbers):
+                book._slots[acc_number] = row + 1
+        return book
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def row(self, acc_number):
+        """method returning the row of an account number. None if the book doesn't have it"""
+        acc_number = int(acc_number)
+        if acc_number >= len(self._slots) or self._slots[acc_number] == 0:
+            return None
+        return self._slots[acc_number] - 1
+
+    def balance(self, acc_number):
+        row = self.row(acc_number)
+        if row is None:
+            return None
+        return Money(int(self.balances[row]))
+
+    # month end jobs. each returns a column with the amount to be applied to every row
+
+    def savings_interest(self, rate):
+        """method working out the interest of savings accounts with money in them. rate is the
+        fraction paid for the month and amounts are rounded down to whole cents"""
+        ppm = round(rate * 1000000)  # parts per million so the sums stay in whole numbers
+        if numpy is not None:
+            earning = (self.types == SAVINGS) & (self.balances > 0)
+            return numpy.where(earning, self.balances * ppm // 1000000, 0)
+        return array.array("q", (b * ppm // 1000000 if t == SAVINGS and b > 0 else 0
+                                 for b, t in zip(self.balances, self.types)))
+
+    def overdraft_fees(self, fee):
+        """method working out the fee charged to checking accounts below zero. the fee is Money"""
+        fee = int(fee)
+        if numpy is not None:
+            return numpy.where((self.types == CHECKING) & (self.balances < 0), fee, 0).astype(numpy.int64)
+        return array.array("q", (fee if t == CHECKING and b < 0 else 0 for b, t in zip(self.balances, self.types)))
+
+    def over_limit(self):
+        """method returning the account numbers of checking accounts below their credit limit"""
+        if numpy is not None:
+            return [str(n) for n in self.numbers[(self.types == CHECKING) & (self.balances < self.limits)]]
+        return [str(n) for n, b, t, limit in zip(self.numbers, self.balances, self.types, self.limits)
+                if t == CHECKING and b < limit]
+
+    def limit_reached(self, date=None):
+        """method returning the account numbers of savings accounts that have had a withdrawal or
+        transfer in the month of the passed date"""
+        if date is None:
+            date = datetime.date.today()
+        first = date.replace(day=1).toordinal()
+        if numpy is not None:
+            return [str(n) for n in self.numbers[(self.types == SAVINGS) & (self.last_debits >= first)]]
+        return [str(n) for n, t, last in zip(self.numbers, self.types, self.last_debits)
+                if t == SAVINGS and last >= first]
+
+    def apply(self, amounts, kind, credit=True, date=None):
+        """method to write a column of amounts to the accounts. every row with an amount gets one
+        transaction of the passed kind in the ledger, the balance is raised by it for a credit and
+        lowered by it for a debit, and the changed accounts are saved together. the backend
+        transaction should be held by the caller so nothing changes the accounts in between.
+        returns the number of accounts changed and the total amount"""
+        if numpy is not None:
+            rows = numpy.flatnonzero(amounts).tolist()
+        else:
+            rows = [row for row, amount in enumerate(amounts) if amount != 0]
+        if not rows:
+            return 0, Money(0)
+        tids = iter(tid_allocator.reserve(len(rows)))
+        changed = []
+        total = Money(0)
+        ledger.begin()
+        try:
+            for row in rows:
+                amount = Money(int(amounts[row]))
+                acc = account_store.get(str(int(self.numbers[row])))
+                tid = next(tids)
+                ledger.append(tid, kind, acc[3], amount, date)
+                acc[4] = str(Money(cents(acc[4]) + (amount if credit else -amount)))
+                acc[5] = str(tid) if acc[5] == "None" else acc[5] + "," + str(tid)
+                changed.append(acc)
+                total += amount
+        finally:
+            ledger.commit()  # transactions are recorded before the balances are saved
+        for acc in changed:
+            account_store.put(acc)
+        account_store.save()
+        if numpy is not None:
+            self.balances += amounts if credit else -amounts
+        else:
+            for row in rows:
+                self.balances[row] += amounts[row] if credit else -amounts[row]
+        return len(rows), total
+
+
+def month_end(rate=0.001, fee=15, date=None):
+    """function to run the month end jobs over every account: interest is paid into savings accounts,
+    checking accounts below zero are charged the overdraft fee, and the accounts left below their
+    credit limit are reported. returns a summary of what was done"""
+    fee = Money.parse(fee)
+    open_bank()
+    with backend.transaction():  # no other program changes an account while the book is used
+        account_store.refresh()
+        book = BalanceBook.load(account_store)
+        interest = book.apply(book.savings_interest(rate), "interest", True, date)
+        fees = book.apply(book.overdraft_fees(fee), "fee", False, date)
+    return {"accounts": len(book), "interest_paid": interest[0], "interest_total": interest[1],
+            "fees_charged": fees[0], "fees_total": fees[1], "over_limit": book.over_limit()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the month end jobs over every account")
+    parser.add_argument("--rate", type=float, default=0.001, help="monthly interest paid on savings")
+    parser.add_argument("--fee", type=Money.parse, default=15, help="fee charged to overdrawn checking accounts")
+    args = parser.parse_args()
+    summary = month_end(args.rate, args.fee)
+    print(summary["accounts"], "accounts")
+    print("Interest paid to", summary["interest_paid"], "savings accounts, total", summary["interest_total"])
+    print("Fees charged to", summary["fees_charged"], "checking accounts, total", summary["fees_total"])
+    if summary["over_limit"]:
+        print("Accounts over their credit limit:", ", ".join(summary["over_limit"]))
@@ -0,0 +1,152 @@
+# CA2 OOP - Bank Management System
+# batch mode for processing a file of deposit/withdraw/transfer requests in a single pass
+import sys
+import json
+import datetime
+from money import Money
+from project import (account_store, tid_allocator, ledger, create_account, open_bank, BankError,
+                     AccountNotFoundError)
+
+
+class BatchEngine(object):
+    """Applies deposit, withdraw and transfer requests to accounts kept in memory. The same error
+    checking as the account classes is used, transactions are written to the ledger through one
+    buffered file and the changed accounts are only saved once when the batch is finished.
+
+    A request is a dictionary such as
+    {"id": "r1", "op": "transfer", "account": "1", "amount": 100, "to": "IE57570"}
+    where the account can be given by account number ("account") or by IBAN ("iban")"""
+    def __init__(self, block=10000):
+        self._accounts = {}  # account number -> account object for every account used by the batch
+        self._block = block  # number of transaction ids reserved at a time
+        self._tids = iter(())
+        self._date = datetime.date.today()
+
+    def _tid(self):
+        """method to take the next transaction id from the reserved block"""
+        for tid in self._tids:
+            return tid
+        self._tids = iter(tid_allocator.reserve(self._block))
+        return next(self._tids)
+
+    def _account(self, acc):
+        """method to get the account object of a list of account details. the object is created
+        the first time and kept for the rest of the batch"""
+        account = self._accounts.get(acc[0])
+        if account is None:
+            account = create_account(acc)
+            self._accounts[acc[0]] = account
+        return account
+
+    def find(self, request):
+        """method to find the account a request is for. None if it doesn't exist"""
+        if "iban" in request:
+            acc = account_store.find_iban(str(request["iban"]))
+        else:
+            acc_number = str(request.get("account"))
+            if acc_number in self._accounts:
+                return self._accounts[acc_number]
+            acc = account_store.get(acc_number)
+        if acc is None:
+            return None
+        return self._account(acc)
+
+    def apply(self, request):
+        """method to apply one request. returns the result as a dictionary with the transaction id
+        if it went ahead or the error message if it didn't"""
+        result = {"id": request.get("id")}
+        op = request.get("op")
+        try:
+            amount = Money.parse(request.get("amount"))
+        except (TypeError, ValueError):
+            result["error"] = "Not a valid number"
+            return result
+        account = self.find(request)
+        if account is None:
+            result["error"] = "Account does not exist"
+            return result
+
+        try:
+            match op:
+                case "deposit":
+                    account.check_deposit(amount)
+                    tid = self._tid()
+                    ledger.append(tid, "deposit", account.IBAN, amount, self._date)
+                    account._credit(tid, amount)
+                case "withdraw":
+                    account.check_withdraw(amount)
+                    tid = self._tid()
+                    ledger.append(tid, "withdraw", account.IBAN, amount, self._date)
+                    account._debit(tid, amount)
+                case "transfer":
+                    account.check_transfer(amount)
+                    payee = self.find({"iban": request.get("to")})
+                    if payee is None:
+                        raise AccountNotFoundError("IBAN does not exist")
+                    tid = self._tid()
+                    ledger.append(tid, "transfer", payee.IBAN, amount, self._date, account.IBAN)
+                    account._debit(tid, amount)
+                    payee._credit(tid, amount)
+                case _:
+                    raise BankError("Not a valid operation")
+        except BankError as error:  # same error checking as the account classes
+            result["error"] = str(error)
+            return result
+        result["tid"] = tid
+        return result
+
+    def run(self, requests, results=None):
+        """method to apply every request from an iterable of JSON lines. each result is written as a
+        JSON line to the results file if one is passed. returns the number of requests that went
+        ahead and the number that failed"""
+        done = 0
+        failed = 0
+        open_bank()
+        # the accounts file is locked for the whole batch so other programs wait instead of working
+        # on balances the batch is about to change
+        store_lock = account_store.lock()
+        store_lock.acquire()
+        account_store.refresh()
+        ledger.begin()
+        try:
+            for line in requests:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    result = self.apply(request)
+                else:  # not JSON, or JSON that isn't an object
+                    result = {"id": None, "error": "Not a valid request"}
+                if "error" in result:
+                    failed += 1
+                else:
+                    done += 1
+                if results is not None:
+                    results.write(json.dumps(result) + "\n")
+        finally:
+            ledger.commit()  # transactions are recorded before the balances are saved
+            for account in self._accounts.values():
+                account_store.put(account.get_details())
+            account_store.save()
+            store_lock.release()
+        return done, failed
+
+
+def run_batch(requests_file, results_file=None):
+    """function to process a JSONL file of requests. the results are written to results_file"""
+    with open(requests_file, "r") as requests:
+        if results_file is None:
+            return BatchEngine().run(requests)
+        with open(results_file, "w", buffering=1 << 20) as results:
+            return BatchEngine().run(requests, results)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python batch.py requests.jsonl [results.jsonl]")
+        sys.exit(1)
+    done, failed = run_batch(*sys.argv[1:])
+    print(done, "requests processed,", failed, "failed")
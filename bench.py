@@ -0,0 +1,238 @@
+# CA2 OOP - Bank Management System
+# synthetic data generator and benchmarks of the banking operations at different file sizes
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import contextlib
+
+FIRSTNAMES = ("Kieran", "Aoife", "Sean", "Niamh", "Conor", "Ciara", "Darragh", "Saoirse", "Liam", "Emma")
+LASTNAMES = ("Silada", "Murphy", "Kelly", "Byrne", "Ryan", "Walsh", "O'Brien", "Doyle", "Lynch", "Smith")
+NAMES = ("MyChecking", "MySaving", "Holidays", "Bills", "Rent", "Car", "Wedding", "Rainy Day")
+
+
+def iban_numbers(count):
+    """function returning count different IBAN numbers spread over the number space. a number is
+    picked by multiplying the position by a prime that shares no factor with the size of the space,
+    so no two positions give the same number and no set of used IBANs has to be kept"""
+    space = 100000
+    while space < count * 10:
+        space *= 10
+    step = 7919  # prime, so coprime with a power of ten
+    return ((i * step) % space for i in range(1, count + 1))
+
+
+def generate(directory, customers, accounts, transactions, seed=0, legacy=False):
+    """function for writing customers.txt, accounts.txt and accountsTransactions.txt with the given
+    number of rows to a directory. every customer has at least one account, balances are the sum of
+    the account's transactions, money is only taken out when the balance allows it, and savings
+    accounts keep their withdrawal/transfer dates. transfers have the payer's IBAN at the end of the
+    line, as the bank writes them, or only the payee as in files from before that if legacy is True"""
+    rng = random.Random(seed)
+    accounts = max(accounts, customers)
+    types = ["savings" if rng.random() < 0.4 else "checking" for _ in range(accounts)]
+    ibans = ["IE" + str(n) for n in iban_numbers(accounts)]
+    funds = [0] * accounts
+    tids = [[] for _ in range(accounts)]
+    debits = [[] for _ in range(accounts)]
+
+    start = datetime.date.today() - datetime.timedelta(days=730)  # two years of history
+    with open(os.path.join(directory, "accountsTransactions.txt"), "w", buffering=1 << 20) as t_writer:
+        for tid in range(1, transactions + 1):
+            date = start + datetime.timedelta(days=730 * tid // (transactions + 1))
+            acc = rng.randrange(accounts)
+            amount = rng.randint(1, 500)
+            kind = rng.choice(("deposit", "withdraw", "transfer"))
+            if kind != "deposit" and funds[acc] < amount:
+                kind = "deposit"  # never take out more than the account has
+            IBAN = ibans[acc]
+            if kind == "deposit":
+                funds[acc] += amount
+            else:
+                funds[acc] -= amount
+                if types[acc] == "savings":
+                    debits[acc].append(date)
+                    del debits[acc][:-12]  # only the most recent dates are kept, the same as SavingsAccount.window
+            tids[acc].append(tid)
+            if kind == "transfer":
+                payee = rng.randrange(accounts)
+                IBAN = ibans[payee]
+                funds[payee] += amount
+                if payee != acc:
+                    tids[payee].append(tid)
+            line = str(tid) + "_" + kind + "_" + IBAN + "_" + str(amount) + "_" + str(date)
+            if kind == "transfer" and not legacy:
+                line += "_" + ibans[acc]
+            t_writer.write(line + "\n")
+
+    owned = [[] for _ in range(customers)]  # account numbers of each customer
+    with open(os.path.join(directory, "accounts.txt"), "w", buffering=1 << 20) as acc_writer:
+        for acc in range(accounts):
+            acc_number = acc + 1
+            owned[acc % customers].append(str(acc_number))
+            transactionlist = ",".join(str(t) for t in tids[acc]) if tids[acc] else "None"
+            if types[acc] == "savings":
+                last = ",".join(str(d) for d in debits[acc]) if debits[acc] else "None"
+            else:
+                last = "-1000"
+            acc_writer.write("_".join((str(acc_number), types[acc], rng.choice(NAMES), ibans[acc], str(funds[acc]),
+                                       transactionlist, last)) + "\n")
+
+    with open(os.path.join(directory, "customers.txt"), "w", buffering=1 << 20) as c_writer:
+        for customer in range(customers):
+            c_writer.write("_".join((str(customer + 1), "%04d" % rng.randrange(10000), rng.choice(FIRSTNAMES),
+                                     rng.choice(LASTNAMES), str(rng.randint(16, 90)), ",".join(owned[customer]))) + "\n")
+
+
+def summary(latencies, errors, total):
+    """function returning the throughput and latency percentiles of one operation"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    result = {"count": count, "errors": errors, "seconds": round(total, 6),
+              "ops_per_second": round(count / total, 1) if total > 0 else None}
+    for name, q in (("p50_ms", 0.50), ("p99_ms", 0.99)):
+        result[name] = round(latencies[int(q * (count - 1))] * 1000, 4) if latencies else None
+    return result
+
+
+def benchmark(directory, ops, seed=0):
+    """function timing every public operation of the account and customer classes on the files in a
+    directory. the directory becomes the working directory, as the bank opens its files from there,
+    so this is run in a process of its own for each data set"""
+    os.chdir(directory)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import project
+    rng = random.Random(seed)
+    results = {}
+
+    started = time.perf_counter()  # first use of the storage reads or indexes the files
+    project.customer_store.get("1")
+    project.account_store.get("1")
+    list(project.ledger.read(["1"]))
+    results["load"] = summary([time.perf_counter() - started], 0, time.perf_counter() - started)
+
+    customer_numbers = rng.sample(range(1, len(project.customer_store) + 1), min(ops, len(project.customer_store)))
+    customers = [c for c in (project.customer_store.get(str(n)) for n in customer_numbers) if c is not None]
+    checking = []  # different checking accounts, which don't have a monthly limit on taking money out
+    acc_numbers = list(range(1, len(project.account_store) + 1))
+    rng.shuffle(acc_numbers)
+    for acc_number in acc_numbers:
+        if len(checking) == ops:
+            break
+        acc = project.account_store.get(str(acc_number))
+        if acc is not None and acc[1] == "checking":
+            checking.append(acc)
+
+    def timed(name, calls):
+        latencies = []
+        errors = 0
+        total = time.perf_counter()
+        for call in calls:
+            t = time.perf_counter()
+            try:
+                call()
+            except project.BankError:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+        results[name] = summary(latencies, errors, time.perf_counter() - total)
+
+    banks = [project.Bank() for _ in customers]
+    timed("login", [lambda b=b, c=c: b.login(c[0], c[1]) for b, c in zip(banks, customers)])
+    accounts = [project.create_account(acc) for acc in checking]
+
+    def deposit(account):
+        account.deposit(rng.randint(1, 100))
+        account.update_details()
+
+    def withdraw(account):
+        account.withdraw(rng.randint(1, 10))
+        account.update_details()
+
+    def view(account):
+        with contextlib.redirect_stdout(io.StringIO()):
+            account.view_transactions()
+
+    timed("deposit", [lambda a=a: deposit(a) for a in accounts])
+    timed("withdraw", [lambda a=a: withdraw(a) for a in accounts])
+    payees = [rng.choice(checking)[3] for _ in accounts]
+    timed("transfer", [lambda a=a, p=p: a.transfer(rng.randint(1, 10), p) for a, p in zip(accounts, payees)])
+    timed("statement", [lambda a=a: a.statement() for a in accounts])
+    timed("view_transactions", [lambda a=a: view(a) for a in accounts])
+    timed("account_update", [lambda a=a: a.update_details() for a in accounts])
+    owners = [bank.get_customer() for bank in banks]
+    timed("new_account", [lambda c=c: c.new_account("Bench", rng.choice(("1", "2"))) for c in owners])
+    timed("customer_update", [lambda c=c: c.update_details() for c in owners])
+    project.backend.close()
+    return results
+
+
+def run_size(directory, size, ops, backend="text", seed=0, legacy=False):
+    """function generating a data set in a directory and benchmarking it in a new process"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = {"customers": max(1, size // 2), "accounts": size, "transactions": size}
+    started = time.perf_counter()
+    generate(directory, rows["customers"], rows["accounts"], rows["transactions"], seed, legacy)
+    generated = time.perf_counter() - started
+    if backend in ("binary", "sqlite"):
+        script = "binstore.py" if backend == "binary" else "sqlstore.py"
+        subprocess.run([sys.executable, os.path.join(here, script), "import"], cwd=directory, check=True)
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", directory, "--ops", str(ops),
+                            "--seed", str(seed)], check=True, capture_output=True, text=True)
+    return {"size": size, "rows": rows, "generate_seconds": round(generated, 3),
+            "operations": json.loads(child.stdout)}
+
+
+def run(sizes, ops, backend="text", seed=0, keep=None, legacy=False):
+    """function benchmarking a generated data set of each size. returns the report of every size.
+    the files are generated in a temporary directory unless a directory to keep them in is passed"""
+    report = {"created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "platform": platform.platform(),
+              "backend": backend, "ops": ops, "seed": seed, "legacy": legacy, "results": []}
+    for size in sizes:
+        if keep is not None:
+            directory = os.path.join(keep, str(size))
+            os.makedirs(directory, exist_ok=True)
+            report["results"].append(run_size(directory, size, ops, backend, seed, legacy))
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                report["results"].append(run_size(directory, size, ops, backend, seed, legacy))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bank on generated data")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated numbers of accounts and transactions, from 1000 up to 10000000")
+    parser.add_argument("--ops", type=int, default=200, help="number of times each operation is timed")
+    parser.add_argument("--backend", choices=("text", "binary", "sqlite"), default="text")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy", action="store_true", help="write transfers without the payer, as older files have them")
+    parser.add_argument("--output", default="bench.json", help="JSON file the results are written to")
+    parser.add_argument("--keep", help="directory to keep the generated files in")
+    parser.add_argument("--generate", metavar="DIRECTORY", help="only generate files of the first size")
+    parser.add_argument("--run", metavar="DIRECTORY", help=argparse.SUPPRESS)  # used by the child processes
+    args = parser.parse_args()
+    if args.run is not None:
+        print(json.dumps(benchmark(args.run, args.ops, args.seed)))
+        sys.exit(0)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.generate is not None:
+        os.makedirs(args.generate, exist_ok=True)
+        generate(args.generate, max(1, sizes[0] // 2), sizes[0], sizes[0], args.seed, args.legacy)
+        sys.exit(0)
+    report = run(sizes, args.ops, args.backend, args.seed, args.keep, args.legacy)
+    with open(args.output, "w") as bench_writer:
+        json.dump(report, bench_writer, indent=2)
+    for result in report["results"]:
+        print("size", result["size"])
+        for name, op in result["operations"].items():
+            print("  {:18s}{:>12} ops/s   p50 {:>10} ms   p99 {:>10} ms".format(
+                name, str(op["ops_per_second"]), str(op["p50_ms"]), str(op["p99_ms"])))
+    print("Results written to", args.output)
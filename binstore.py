@@ -0,0 +1,428 @@
+# CA2 OOP - Bank Management System
+# optional binary storage for the accounts with fixed size records updated in place
+import os
+import sys
+import mmap
+import array
+import struct
+import datetime
+import metrics
+from locks import FileLock
+from money import Money, CENTS
+
+
+class BinaryAccountStore(object):
+    """Account store kept in a binary file of fixed size records instead of accounts.txt. The file is
+    accessed through mmap, so changing a balance writes the 8 bytes of the balance in place instead of
+    rewriting the file. Accounts are found by account number through a numeric index of record slots
+    and by IBAN through a dictionary, both built when the file is opened.
+
+    The transaction ids of an account don't fit in a fixed size record, so they are kept as a chain
+    in a links file next to it: each link holds a transaction id and the position of the account's
+    previous link, and the record points to the latest link and has the number of links. The details
+    made from a record are kept with a copy of the record's bytes. While the bytes are the same the
+    kept details are used, and when transactions have been added only the new links are read, so
+    getting an account doesn't go through its whole chain every time.
+
+    An update that only changes the balance and adds transactions, which is most of them, writes the
+    8 bytes of the balance and the 12 bytes of the latest link and count in place.
+
+    Balances and credit limits are kept in cents. A file from before cents were kept, with whole
+    units, is converted the first time it is opened.
+
+    There are no snapshots, but like the snapshot of the txt file the .tag file beside it has the id
+    the ledger was checked up to by recovery, so TextBackend.recover() works the same for both.
+
+    It has the same methods as AccountStore so it can be used in its place"""
+    MAGIC = b"BANKACC2"
+    UNITS = b"BANKACC1"  # file with the amounts in whole units
+    HEADER = struct.Struct("<8sQ")  # magic, number of records
+    # account number, type, name, IBAN, balance, credit limit, position of the latest transaction link + 1,
+    # number of transactions and the dates of the most recent withdrawals/transfers of a savings account
+    RECORD = struct.Struct("<QB3x24s12sqqqI12I4x")
+    LINK = struct.Struct("<qq")  # transaction id, position of the previous link + 1
+    BALANCE = 48  # offset of the balance within a record
+    CHAIN = 64  # offset of the latest transaction link and the number of transactions
+    TYPES = ("savings", "checking")
+    WINDOW = 12  # number of withdrawal/transfer dates a record holds
+    NAME = 24  # bytes of the account name a record holds
+    IBAN = 12  # bytes of the IBAN a record holds
+
+    def __init__(self, filename="accounts.bin"):
+        self._filename = filename
+        self._links = os.path.splitext(filename)[0] + ".links"
+        self._tag = os.path.splitext(filename)[0] + ".tag"  # id of the ledger checked up to by recovery
+        self._lock = FileLock(filename + ".lock")
+        self._file = None
+        self._map = None
+        self._count = 0  # number of records indexed
+        self._slots = array.array("q")  # account number -> record slot + 1
+        self._ibans = {}  # IBAN -> account number
+        self._last_number = 0
+        self._cached = {}  # record slot -> (bytes of the record, details made from them)
+
+    # file handling
+
+    def _open(self):
+        """method to map the file and index the records. only done the first time the store is used"""
+        if self._map is not None:
+            return
+        with self._lock:
+            if self._map is not None:
+                return
+            if not os.path.exists(self._filename):
+                with open(self._filename, "wb") as bin_writer:
+                    bin_writer.write(self.HEADER.pack(self.MAGIC, 0))
+                    bin_writer.write(bytes(self.RECORD.size * 64))  # room for the first accounts
+            self._file = open(self._filename, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            magic, count = self.HEADER.unpack_from(self._map, 0)
+            if magic == self.UNITS:
+                self._convert(count)
+                magic = self.MAGIC
+            if magic != self.MAGIC:
+                raise ValueError(self._filename + " is not a binary accounts file")
+            self._index_to(count)
+
+    def _convert(self, count):
+        """method to change the balances and credit limits of a file in whole units to cents. a copy is
+        converted and put in place of the file in one step, so a crash leaves the old file as it was"""
+        data = bytearray(self._map)
+        for slot in range(count):
+            position = self._position(slot) + self.BALANCE
+            funds, creditlimit = struct.unpack_from("<qq", data, position)
+            struct.pack_into("<qq", data, position, funds * CENTS, creditlimit * CENTS)
+        self.HEADER.pack_into(data, 0, self.MAGIC, count)
+        temp = self._filename + ".tmp"
+        with open(temp, "wb") as bin_writer:
+            bin_writer.write(data)
+            bin_writer.flush()
+            os.fsync(bin_writer.fileno())
+        self._map.close()
+        self._file.close()
+        os.replace(temp, self._filename)
+        self._file = open(self._filename, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _index_to(self, count):
+        """method to add the records from the last indexed one up to count to the indexes"""
+        for slot in range(self._count, count):
+            record = self.RECORD.unpack_from(self._map, self._position(slot))
+            acc_number = record[0]
+            if acc_number >= len(self._slots):
+                self._slots.extend([0] * (acc_number + 1 - len(self._slots)))
+            self._slots[acc_number] = slot + 1
+            self._ibans[record[3].rstrip(b"\0").decode()] = str(acc_number)
+            if acc_number > self._last_number:
+                self._last_number = acc_number
+        self._count = count
+
+    def _position(self, slot):
+        return self.HEADER.size + slot * self.RECORD.size
+
+    def _slot(self, acc_number):
+        """method to find the record slot of an account number. None if it doesn't exist"""
+        acc_number = str(acc_number)
+        if not acc_number.isdigit() or int(acc_number) >= len(self._slots):
+            return None
+        slot = self._slots[int(acc_number)]
+        if slot == 0:
+            return None
+        return slot - 1
+
+    def refresh(self):
+        """method to index records added by other programs. changes to existing records are seen
+        straight away because the file is shared through mmap"""
+        self._open()
+        with self._lock:
+            count = self.HEADER.unpack_from(self._map, 0)[1]
+            if self._position(count) > len(self._map):  # file grown by another program
+                self._remap()
+            if count > self._count:
+                self._index_to(count)
+
+    def _remap(self):
+        self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def lock(self):
+        """method returning the lock of the file, for holding it across several calls"""
+        return self._lock
+
+    def snapshot_tag(self):
+        """get method for the id the ledger has been checked up to by recovery, kept in the .tag file
+        as the binary file has no snapshots. None if the ledger hasn't been checked yet"""
+        try:
+            with open(self._tag, "r") as tag_reader:
+                return int(tag_reader.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def tag_snapshot(self, tag):
+        """method to write the id the ledger has been checked up to. the records are written in place
+        so they are already on the file"""
+        if self._map is not None:
+            self._map.flush()  # the records recovery changed are on disk before the tag says they are
+        temp = self._tag + ".tmp"
+        with open(temp, "w") as tag_writer:
+            tag_writer.write(str(tag))
+            tag_writer.flush()
+            os.fsync(tag_writer.fileno())
+        os.replace(temp, self._tag)
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    # transaction links
+
+    def _chain(self, head, stop=0, count=None):
+        """method returning the transaction ids of a chain in the order they were added, from the
+        link after stop up to head. None if count links are read without getting to stop"""
+        tids = []
+        if head == stop:
+            return tids
+        with open(self._links, "rb") as link_reader:
+            while head != stop:
+                if head == 0 or (count is not None and len(tids) == count):
+                    return None
+                link_reader.seek(head - 1)
+                tid, head = self.LINK.unpack(link_reader.read(self.LINK.size))
+                tids.append(str(tid))
+        if metrics.enabled:
+            metrics.file_io(self._links, read=len(tids) * self.LINK.size, lines=len(tids))
+        tids.reverse()
+        return tids
+
+    def _link(self, head, tids):
+        """method to append transaction ids to a chain. returns the new head"""
+        if not tids:
+            return head
+        with self._lock, open(self._links, "ab") as link_writer:  # other programs append to the same file
+            position = link_writer.tell()
+            data = bytearray()
+            for tid in tids:
+                data += self.LINK.pack(int(tid), head)
+                head = position + len(data) - self.LINK.size + 1
+            link_writer.write(data)
+        if metrics.enabled:
+            metrics.file_io(self._links, written=len(data))
+        return head
+
+    # conversion between records and lists of account details
+
+    def _details(self, slot):
+        """method returning the details of a record. they are kept and must not be changed"""
+        position = self._position(slot)
+        data = self._map[position:position + self.RECORD.size]
+        cached = self._cached.get(slot)
+        if cached is not None and cached[0] == data:
+            return cached[1]
+        (acc_number, acctype, name, IBAN, funds, creditlimit, head, count,
+         *debits) = self.RECORD.unpack(data)
+        transactions = None
+        if cached is not None:  # only the links added since the record was last read are needed
+            old_head, old_count = self.RECORD.unpack(cached[0])[6:8]
+            tids = self._chain(head, old_head, count - old_count) if count >= old_count else None
+            if tids is not None:
+                transactions = cached[1][5]
+                if tids:
+                    transactions = ",".join(tids if transactions == "None" else [transactions] + tids)
+        if transactions is None:
+            tids = self._chain(head)
+            transactions = ",".join(tids) if tids else "None"
+        acc = [str(acc_number), self.TYPES[acctype], name.rstrip(b"\0").decode(), IBAN.rstrip(b"\0").decode(),
+               str(Money(funds)), transactions]
+        if acctype == 0:
+            dates = [str(datetime.date.fromordinal(d)) for d in debits if d != 0]
+            acc.append(",".join(dates) if dates else "None")
+        else:
+            acc.append(str(Money(creditlimit)))
+        self._cached[slot] = (data, acc)
+        return acc
+
+    def _write(self, slot, acc, old_count=0, old_head=0):
+        """method to write a list of account details to a record slot. only transaction ids after
+        the ones already in the chain are linked"""
+        acc = [str(a) for a in acc]
+        for field, size, value in (("Account name", self.NAME, acc[2]), ("IBAN", self.IBAN, acc[3])):
+            if len(value.encode()) > size:
+                raise ValueError("%s too long for the binary accounts file, it can be up to %d characters" % (field, size))
+        tids = [] if acc[5] == "None" else acc[5].split(",")
+        head = self._link(old_head, tids[old_count:])
+        debits = [0] * self.WINDOW
+        creditlimit = 0
+        if acc[1] == "savings":
+            if len(acc) > 6 and acc[6] != "None":
+                dates = acc[6].split(",")[-self.WINDOW:]
+                for i, date in enumerate(dates):
+                    debits[i] = datetime.date.fromisoformat(date).toordinal()
+        else:
+            creditlimit = Money.parse(acc[6])
+        self.RECORD.pack_into(self._map, self._position(slot), int(acc[0]), self.TYPES.index(acc[1]),
+                              acc[2].encode(), acc[3].encode(), Money.parse(acc[4]), creditlimit, head, len(tids),
+                              *debits)
+
+    # same methods as AccountStore
+
+    def get(self, acc_number):
+        self._open()
+        slot = self._slot(acc_number)
+        if slot is None:
+            return None
+        return list(self._details(slot))  # copy so callers can't change the kept details
+
+    def current(self, acc_number):
+        """method returning the kept details of an account without copying them, the same list
+        until the record changes. they must not be changed. None if the account doesn't exist"""
+        self._open()
+        slot = self._slot(acc_number)
+        if slot is None:
+            return None
+        return self._details(slot)
+
+    def find_iban(self, IBAN):
+        self._open()
+        acc_number = self._ibans.get(IBAN)
+        if acc_number is None:
+            return None
+        return self.get(acc_number)
+
+    def iban_exists(self, IBAN):
+        self._open()
+        return IBAN in self._ibans
+
+    def next_number(self):
+        self.refresh()
+        return self._last_number + 1
+
+    def __contains__(self, acc_number):
+        self._open()
+        return self._slot(acc_number) is not None
+
+    def __len__(self):
+        self._open()
+        return self._count
+
+    def __iter__(self):
+        self._open()
+        for slot in range(self._count):
+            yield list(self._details(slot))
+
+    @metrics.timed("store.add")
+    def add(self, acc):
+        """method for adding a new account in the next free record. the file is doubled in size
+        when it is full"""
+        with self._lock:
+            self.refresh()
+            if self._slot(acc[0]) is not None:
+                raise ValueError("Account number already exists")
+            if self._position(self._count + 1) > len(self._map):
+                self._file.truncate(len(self._map) * 2)
+                self._remap()
+            self._write(self._count, acc)
+            self.HEADER.pack_into(self._map, 0, self.MAGIC, self._count + 1)
+            self._index_to(self._count + 1)
+
+    @metrics.timed("store.update")
+    def put(self, acc):
+        """method to write the details of an account to its record in place. if only the balance and
+        the transactions have changed, only they are written"""
+        self._open()
+        slot = self._slot(acc[0])
+        if slot is None:
+            return self.add(acc)
+        acc = [str(a) for a in acc]
+        old = self._details(slot)
+        if acc[:4] == old[:4] and acc[6:] == old[6:] and (old[5] == "None" or acc[5] == old[5]
+                                                           or acc[5].startswith(old[5] + ",")):
+            if acc[5] != old[5]:
+                added = acc[5].split(",") if old[5] == "None" else acc[5][len(old[5]) + 1:].split(",")
+                self.add_transactions(acc[0], added)
+            if acc[4] != old[4]:
+                self.set_balance(acc[0], acc[4])
+            return
+        record = self.RECORD.unpack_from(self._map, self._position(slot))
+        self._write(slot, acc, record[7], record[6])
+        old_IBAN = record[3].rstrip(b"\0").decode()
+        if old_IBAN != acc[3]:
+            del self._ibans[old_IBAN]
+            self._ibans[acc[3]] = str(acc[0])
+
+    def update(self, acc):
+        self.put(acc)
+
+    def save(self):
+        """records are written in place so there is nothing left to save"""
+        pass
+
+    def set_balance(self, acc_number, funds):
+        """method to change only the balance of an account. the 8 bytes of the balance are
+        written in place"""
+        self._open()
+        slot = self._slot(acc_number)
+        struct.pack_into("<q", self._map, self._position(slot) + self.BALANCE, Money.parse(funds))
+
+    def get_balance(self, acc_number):
+        self._open()
+        slot = self._slot(acc_number)
+        return Money(struct.unpack_from("<q", self._map, self._position(slot) + self.BALANCE)[0])
+
+    def add_transactions(self, acc_number, tids):
+        """method to link transactions to an account without rewriting the rest of the record"""
+        self._open()
+        position = self._position(self._slot(acc_number)) + self.CHAIN
+        head, count = struct.unpack_from("<qI", self._map, position)
+        struct.pack_into("<qI", self._map, position, self._link(head, tids), count + len(tids))
+
+
+def import_text(text_file="accounts.txt", bin_file="accounts.bin", ledger=None):
+    """function for converting accounts.txt, with its journal, into the binary accounts file. the
+    withdrawal/transfer dates of savings lines from before they were saved are found in the ledger,
+    and left empty without one"""
+    from storage import AccountStore, debit_dates
+    if os.path.exists(bin_file):
+        raise FileExistsError(bin_file + " already exists")
+    tag = os.path.splitext(bin_file)[0] + ".tag"
+    if os.path.exists(tag):
+        os.remove(tag)  # left from an earlier binary file. the ledger is checked again from the start
+    store = BinaryAccountStore(bin_file)
+    for acc in AccountStore(text_file, journaled=True):
+        if acc[1] == "savings" and len(acc) < 7:
+            # savings line from before the withdrawal/transfer dates were saved
+            tids = [] if acc[5] == "None" else acc[5].split(",")
+            debits = debit_dates(ledger, acc[3], tids, store.WINDOW) if ledger is not None else []
+            acc = acc[:6] + [",".join(debits) if debits else "None"]
+        store.add(acc)
+    store.close()
+
+
+def export_text(bin_file="accounts.bin", text_file="accounts.txt"):
+    """function for converting the binary accounts file back into the accounts.txt format"""
+    store = BinaryAccountStore(bin_file)
+    temp = text_file + ".tmp"
+    with open(temp, "w") as text_writer:
+        for acc in store:
+            text_writer.write("_".join(acc) + "\n")
+    store.close()
+    os.replace(temp, text_file)
+    journal = os.path.splitext(text_file)[0] + ".journal"
+    if os.path.exists(journal):
+        os.remove(journal)  # the exported file is up to date so an old journal must not be folded over it
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python binstore.py import|export [accounts.txt] [accounts.bin]")
+        sys.exit(1)
+    text = sys.argv[2] if len(sys.argv) > 2 else "accounts.txt"
+    binary = sys.argv[3] if len(sys.argv) > 3 else "accounts.bin"
+    if sys.argv[1] == "import":
+        from project import ledger  # the transactions file, its month files or its archive
+        import_text(text, binary, ledger)
+    else:
+        export_text(binary, text)
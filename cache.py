@@ -0,0 +1,117 @@
+# CA2 OOP - Bank Management System
+# bounded cache of account objects kept between operations
+import threading
+import collections
+
+
+class AccountCache(object):
+    """The least recently used account objects, by account number, so an account that is used again
+    and again, like a payee of many transfers, isn't created from its details and read from the file
+    every time. The IBANs of the accounts in the cache are kept too so transfers find the payee in it.
+
+    The store is still what everything goes by. Each account is kept with the list of details the
+    store had for it when it was created or last written. The store gives a record a new list every
+    time it changes, so if the store still has the same list the account is up to date without
+    anything being read or compared. If the list is a new one, as after another program changed the
+    account, the details are compared and the account is only created again if they differ.
+
+    An account changed in memory is taken out of the cache until it is written back through put, so
+    an account left half changed by an operation that failed is never handed out again. Once size
+    accounts are kept the least recently used one is dropped. A size of 0 turns the cache off"""
+    def __init__(self, store, build, size=1024):
+        self._store = store
+        self._build = build  # function creating an account object from a list of details
+        self.size = size
+        self._accounts = collections.OrderedDict()  # account number -> [account, details], least recent first
+        self._ibans = {}  # IBAN -> account number of the accounts in the cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _current(self, acc_number):
+        """method returning the store's details of an account. stores that read the details again
+        every time don't have current so the details can only be compared"""
+        current = getattr(self._store, "current", None)
+        if current is None:
+            return self._store.get(acc_number)
+        return current(acc_number)
+
+    def _found(self, acc_number, details):
+        """method returning the account of the details, from the cache if it matches them"""
+        with self._lock:
+            entry = self._accounts.get(acc_number)
+            if entry is not None and (entry[1] is details or entry[1] == details):
+                entry[1] = details
+                self._accounts.move_to_end(acc_number)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        account = self._build(details)
+        self._keep(acc_number, account, details)
+        return account
+
+    def _keep(self, acc_number, account, details):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._drop(acc_number)
+            self._accounts[acc_number] = [account, details]
+            self._ibans[details[3]] = acc_number
+            while len(self._accounts) > self.size:
+                self._drop(next(iter(self._accounts)))
+                self.evictions += 1
+
+    def _drop(self, acc_number):
+        """method to take an account out of the cache. called holding the lock"""
+        entry = self._accounts.pop(acc_number, None)
+        if entry is not None and self._ibans.get(entry[1][3]) == acc_number:
+            del self._ibans[entry[1][3]]
+
+    def get(self, acc_number):
+        """get method for retrieving the account object of an account number. None is returned if
+        the account doesn't exist"""
+        acc_number = str(acc_number)
+        details = self._current(acc_number)
+        if details is None:
+            self.discard(acc_number)
+            return None
+        return self._found(acc_number, details)
+
+    def find_iban(self, IBAN):
+        """get method for retrieving the account object with the passed IBAN. None is returned if
+        no account has it"""
+        acc_number = self._ibans.get(IBAN)
+        if acc_number is None:
+            details = self._store.find_iban(IBAN)
+            if details is None:
+                return None
+            acc_number = details[0]
+        details = self._current(acc_number)
+        if details is None or details[3] != IBAN:  # the account's IBAN has changed since it was kept
+            self.discard(acc_number)
+            details = self._store.find_iban(IBAN)
+            if details is None:
+                return None
+            acc_number = details[0]
+        return self._found(acc_number, details)
+
+    def put(self, account, details):
+        """method to keep an account that has just been written to the store with the passed details"""
+        self._keep(str(account.get_acc()), account, details)
+
+    def discard(self, acc_number):
+        """method to take an account out of the cache, as it is being changed"""
+        with self._lock:
+            self._drop(str(acc_number))
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+            self._ibans.clear()
+
+    def stats(self):
+        """method returning the number of accounts kept and the hits, misses and evictions so far"""
+        with self._lock:
+            return {"accounts": len(self._accounts), "size": self.size, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,230 @@
+# CA2 OOP - Bank Management System
+# appending to files with the writes of several operations synced to disk together
+import os
+import time
+import threading
+import metrics
+
+
+class SyncPolicy(object):
+    """When appended data is synced to disk.
+    os       - never synced by the program. the operating system writes it out when it likes
+    always   - every operation waits until its data is synced. operations that finish writing while
+               a sync is running are covered by one sync afterwards
+    interval - data is synced every interval seconds and operations wait for the next sync
+    records  - data is synced once count records are waiting, or after interval seconds so an
+               operation is never left waiting for records that don't come
+    The policy is read from the BANK_FSYNC environment variable as "os", "always", "interval:MS"
+    or "records:COUNT" """
+    MODES = ("os", "always", "interval", "records")
+
+    def __init__(self, mode="os", interval=0.01, count=100):
+        if mode not in self.MODES:
+            raise ValueError("Not a valid sync policy: " + mode)
+        self.mode = mode
+        self.interval = interval  # seconds between syncs
+        self.count = count  # records waiting before a sync
+
+    @classmethod
+    def parse(cls, text):
+        mode, _, value = text.strip().lower().partition(":")
+        if mode == "interval":
+            return cls(mode, interval=int(value or 10) / 1000)
+        if mode == "records":
+            return cls(mode, interval=0.1, count=int(value or 100))
+        return cls(mode)
+
+    @classmethod
+    def from_environment(cls):
+        return cls.parse(os.environ.get("BANK_FSYNC", "os"))
+
+    def __str__(self):
+        if self.mode == "interval":
+            return "interval:" + str(round(self.interval * 1000))
+        if self.mode == "records":
+            return "records:" + str(self.count)
+        return self.mode
+
+
+default_policy = SyncPolicy.from_environment()
+
+_deferred = threading.local()  # syncs a thread waits for when its durable() block ends
+
+
+class GroupCommitter(object):
+    """File kept open for appending, instead of being opened and closed for every line, with the
+    data synced to disk according to a policy. write() appends and returns a ticket and wait()
+    returns once the data of the ticket has been synced. Threads waiting at the same time are
+    covered by the same sync, so a sync is shared by every operation that wrote before it started.
+
+    The caller holds the lock of the file while writing so the offset returned is where its data
+    went. If the file has been renamed or removed, as a journal is when it is compacted, the file
+    is opened again by name before the next write. A sync that fails is raised by the threads
+    waiting for the tickets it was for"""
+    def __init__(self, filename, policy=None):
+        self._filename = filename
+        self._policy = policy if policy is not None else default_policy
+        self._fd = None
+        self._inode = None
+        self._condition = threading.Condition()
+        self._written = 0  # tickets handed out
+        self._synced = 0  # tickets covered by a finished sync
+        self._syncing = False
+        self._flusher = None
+        self._error = None  # error of the last sync, raised by the threads waiting for its tickets
+        self._failed = 0  # tickets the failed sync was for
+
+    def _open(self):
+        try:
+            stat = os.stat(self._filename)
+        except FileNotFoundError:
+            stat = None
+        if self._fd is not None and stat is not None and stat.st_ino == self._inode:
+            return self._fd
+        fd = os.open(self._filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        with self._condition:  # a sync takes its copy of the descriptor holding the condition too
+            if self._fd is not None:
+                if self._policy.mode != "os":
+                    os.fsync(self._fd)  # the tickets written to the old file are covered before it is let go
+                os.close(self._fd)
+            self._fd = fd
+            self._inode = os.fstat(fd).st_ino
+        return fd
+
+    def inode(self):
+        return self._inode
+
+    def write(self, data):
+        """method to append data to the file. returns the offset the data was written at and the
+        ticket to wait for"""
+        fd = self._open()
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        end = os.lseek(fd, 0, os.SEEK_CUR)
+        with self._condition:
+            self._written += 1
+            ticket = self._written
+            if self._policy.mode == "records" and ticket - self._synced >= self._policy.count:
+                self._condition.notify_all()  # wakes the flusher
+        return end - len(data), ticket
+
+    def wait(self, ticket):
+        """method returning once the ticket's data is synced as the policy asks. inside durable()
+        the wait is left until the block ends"""
+        if self._policy.mode == "os":
+            return
+        pending = getattr(_deferred, "pending", None)
+        if pending is not None:
+            pending.append((self, ticket))
+            return
+        self._wait(ticket)
+
+    def _wait(self, ticket):
+        with self._condition:
+            if self._policy.mode == "always":
+                while self._synced < ticket:
+                    if self._syncing:
+                        self._condition.wait()  # a sync is running. the next one covers us
+                    else:
+                        self._sync()  # nobody is syncing so this thread does it for everyone waiting
+            else:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush, name="sync " + self._filename, daemon=True)
+                    self._flusher.start()
+                while self._synced < ticket:
+                    if self._error is not None and ticket <= self._failed:
+                        raise self._error
+                    self._condition.wait()
+
+    def _sync(self):
+        """method to sync everything written so far. called holding the condition, which is let go
+        during the sync so other threads can carry on writing"""
+        target = self._written
+        fd = os.dup(self._fd)  # the file can be opened again by a writer while this one is synced
+        self._syncing = True
+        self._condition.release()
+        error = None
+        try:
+            start = time.perf_counter()
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            if metrics.enabled:
+                metrics.record("fsync", time.perf_counter() - start)
+        except OSError as failure:
+            error = failure
+            raise
+        finally:
+            self._condition.acquire()
+            self._syncing = False
+            if error is None:
+                self._synced = max(self._synced, target)
+                self._error = None
+            else:
+                self._error, self._failed = error, target
+            self._condition.notify_all()
+
+    def _flush(self):
+        """flusher thread of the interval and records policies"""
+        with self._condition:
+            while True:
+                if self._policy.mode == "records":
+                    self._condition.wait_for(lambda: self._written - self._synced >= self._policy.count,
+                                             self._policy.interval)
+                else:
+                    self._condition.wait(self._policy.interval)
+                if self._fd is not None and self._written > self._synced and not self._syncing:
+                    try:
+                        self._sync()
+                    except OSError:  # raised by the threads waiting for it. the flusher carries on
+                        pass
+
+    def sync(self):
+        """method to sync everything written so far, whatever the policy"""
+        with self._condition:
+            if self._fd is not None and self._written > self._synced:
+                self._sync()
+
+    def close(self):
+        with self._condition:
+            if self._fd is not None:
+                if self._policy.mode != "os" and self._written > self._synced:
+                    self._sync()
+                os.close(self._fd)
+                self._fd = None
+
+
+class durable(object):
+    """Context manager holding a lock, for the operations that make up one unit of work, and
+    waiting for their data to be synced only after the lock is let go. Other threads can take
+    the lock and write while this one waits, so their data is covered by the same sync. The
+    caller gets its result once everything it wrote is synced as the policy asks"""
+    def __init__(self, lock):
+        self._lock = lock
+
+    def acquire(self):
+        self._lock.acquire()
+        depth = getattr(_deferred, "depth", 0)
+        if depth == 0:
+            _deferred.pending = []
+        _deferred.depth = depth + 1
+
+    def release(self):
+        _deferred.depth -= 1
+        pending = None
+        if _deferred.depth == 0:
+            pending = _deferred.pending
+            _deferred.pending = None
+        self._lock.release()
+        if pending:
+            for committer, ticket in pending:
+                committer._wait(ticket)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
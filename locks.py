@@ -0,0 +1,200 @@
+# CA2 OOP - Bank Management System
+# locks used so that several threads and several running programs can share the txt files safely
+import os
+import time
+import zlib
+import errno
+import struct
+import threading
+try:
+    import fcntl  # advisory file locks. not available on Windows where only threads are locked
+except ImportError:
+    fcntl = None
+
+
+class FileLock(object):
+    """Advisory lock on a whole file held by one thread of one program at a time. Used for the short
+    critical sections where a shared file is read and appended to. The same thread can take the lock
+    again while holding it"""
+    def __init__(self, filename):
+        self._filename = filename
+        self._lock = threading.RLock()  # threads of this program
+        self._depth = 0  # number of times the holding thread has taken the lock
+        self._file = None  # lock file kept open while the lock is held
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._file = open(self._filename, "a")
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)  # other programs
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def lock_number(acc_number):
+    """function for turning an account number into the number used to pick its locks"""
+    acc_number = str(acc_number)
+    if acc_number.isdigit():
+        return int(acc_number)
+    return zlib.crc32(acc_number.encode())
+
+
+# struct flock of Linux: type, whence, start, length and pid, which is 0 for open file description locks
+FLOCK = struct.Struct("hhqqi4x")
+
+
+class AccountLocks(object):
+    """Lock table keyed by account number. Threads of this program share a fixed number of locks
+    (stripes) picked by account number, and other programs are kept out with a byte range lock on
+    the byte of the lock file at the account number. Operations on different accounts can run at
+    the same time. An operation takes all of its locks in account number order, so a transfer and
+    a transfer back can never wait on each other.
+
+    The byte range locks are open file description locks where the system has them. lockf locks
+    belong to the whole program, so with several threads in several programs waiting the system
+    sees cycles between programs that aren't there and refuses the lock with EDEADLK. Where there
+    are only lockf locks the locks taken are given back and taken again when that happens"""
+    RETRY = 0.001  # seconds waited before taking the locks again after EDEADLK, doubled each time
+    def __init__(self, filename="accounts.lock", stripes=64):
+        self._filename = filename
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._file = None  # lock file opened on first use and kept open. closing it would drop the locks
+        self._open_lock = threading.Lock()
+
+    def _fileno(self):
+        if self._file is None:
+            with self._open_lock:
+                if self._file is None:
+                    self._file = open(self._filename, "a")
+        return self._file.fileno()
+
+    def acquire(self, acc_numbers):
+        """method to take the locks of the passed accounts. returns what has to be passed to release()"""
+        numbers = sorted(set(lock_number(n) for n in acc_numbers))
+        stripes = sorted(set(n % len(self._stripes) for n in numbers))
+        taken = []
+        try:
+            for stripe in stripes:
+                self._stripes[stripe].acquire()
+                taken.append(stripe)
+            if fcntl is not None:
+                self._lock_bytes(numbers)
+        except BaseException:
+            for stripe in reversed(taken):
+                self._stripes[stripe].release()
+            raise
+        return numbers, stripes
+
+    def _lock_byte(self, n, exclusive):
+        """method to lock or unlock the byte of the lock file at n, waiting for other programs"""
+        if hasattr(fcntl, "F_OFD_SETLKW"):
+            kind = fcntl.F_WRLCK if exclusive else fcntl.F_UNLCK
+            fcntl.fcntl(self._fileno(), fcntl.F_OFD_SETLKW, FLOCK.pack(kind, os.SEEK_SET, n, 1, 0))
+        else:
+            fcntl.lockf(self._fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN, 1, n)
+
+    def _lock_bytes(self, numbers):
+        """method to lock the bytes of the passed account numbers in order. if the system refuses one
+        as a deadlock the bytes already locked are unlocked so the other program can go ahead"""
+        wait = self.RETRY
+        while True:
+            locked = []
+            try:
+                for n in numbers:
+                    self._lock_byte(n, True)
+                    locked.append(n)
+                return
+            except OSError as error:
+                if error.errno != errno.EDEADLK:
+                    raise
+            finally:
+                if len(locked) < len(numbers):
+                    for n in reversed(locked):
+                        self._lock_byte(n, False)
+            time.sleep(wait)
+            wait = min(wait * 2, 0.1)
+
+    def release(self, held):
+        numbers, stripes = held
+        if fcntl is not None:
+            for n in reversed(numbers):
+                self._lock_byte(n, False)
+        for stripe in reversed(stripes):
+            self._stripes[stripe].release()
+
+    def hold(self, acc_numbers):
+        """method for use in a with statement holding the locks of the passed accounts"""
+        return _Held(self, acc_numbers)
+
+
+class _Held(object):
+    def __init__(self, locks, acc_numbers):
+        self._locks = locks
+        self._acc_numbers = acc_numbers
+        self._held = None
+
+    def __enter__(self):
+        self._held = self._locks.acquire(self._acc_numbers)
+        return self
+
+    def __exit__(self, *args):
+        self._locks.release(self._held)
+
+
+class HeldRanges(object):
+    """Ranges of numbers held by the running programs, as open file description locks on the bytes of
+    a file at those numbers. The system lets go of the locks of a program when it ends or crashes, so
+    a range is only held while the program that took it runs. Used for the blocks of transaction ids
+    programs have reserved, so recovery knows which ids may still be written to the ledger. A program
+    holds shared locks, which never wait for each other, and looks for the locks of every program,
+    its own included, through another open of the file. supported is False where there are no open
+    file description locks"""
+    supported = fcntl is not None and hasattr(fcntl, "F_OFD_SETLK")
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = None  # opened on first use and kept open. closing it would drop the locks
+        self._open_lock = threading.Lock()
+
+    def _fileno(self):
+        if self._file is None:
+            with self._open_lock:
+                if self._file is None:
+                    self._file = open(self._filename, "a+")
+        return self._file.fileno()
+
+    def hold(self, start, stop):
+        """method to hold the numbers from start up to stop"""
+        if self.supported and stop > start:
+            fcntl.fcntl(self._fileno(), fcntl.F_OFD_SETLK, FLOCK.pack(fcntl.F_RDLCK, os.SEEK_SET, start, stop - start, 0))
+
+    def let_go(self, start, stop):
+        """method to stop holding the numbers from start up to stop"""
+        if self.supported and stop > start and self._file is not None:
+            fcntl.fcntl(self._fileno(), fcntl.F_OFD_SETLK, FLOCK.pack(fcntl.F_UNLCK, os.SEEK_SET, start, stop - start, 0))
+
+    def lowest(self, below):
+        """method returning the lowest number held by any program that is below the passed number,
+        or the passed number if none is. must only be called where supported is True"""
+        with open(self._filename, "a+") as probe:
+            while below > 0:
+                found = fcntl.fcntl(probe.fileno(), fcntl.F_OFD_GETLK, FLOCK.pack(fcntl.F_WRLCK, os.SEEK_SET, 0, below, 0))
+                kind, whence, start, length, pid = FLOCK.unpack(found)
+                if kind == fcntl.F_UNLCK:
+                    break
+                below = start  # a range held lower down. looked for again below it
+        return below
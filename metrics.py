@@ -0,0 +1,197 @@
+# CA2 OOP - Bank Management System
+# optional counters of how often and how long operations run and how much of the files they touch
+import os
+import json
+import time
+import atexit
+import inspect
+import functools
+import threading
+
+# nothing is recorded unless metrics are enabled, with enable() or by setting BANK_METRICS=1.
+# disabled, a timed function costs one extra call and a check of this flag, and the file
+# counters are skipped by a check of the flag where they are recorded
+enabled = os.environ.get("BANK_METRICS", "") not in ("", "0")
+
+_lock = threading.Lock()
+_operations = {}  # operation name -> [calls, errors, seconds, slowest call]
+_files = {}  # file name -> [bytes read, bytes written, lines scanned]
+_dumper = None
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    """function to set every counter back to zero"""
+    with _lock:
+        _operations.clear()
+        _files.clear()
+
+
+def record(name, seconds, error=False):
+    """function to add one call of an operation to its counters"""
+    with _lock:
+        counters = _operations.get(name)
+        if counters is None:
+            counters = _operations[name] = [0, 0, 0.0, 0.0]
+        counters[0] += 1
+        if error:
+            counters[1] += 1
+        counters[2] += seconds
+        if seconds > counters[3]:
+            counters[3] = seconds
+
+
+def file_io(filename, read=0, written=0, lines=0):
+    """function to add to the bytes read and written and lines scanned of a file. callers check
+    enabled first so nothing is done when metrics are off"""
+    with _lock:
+        counters = _files.get(filename)
+        if counters is None:
+            counters = _files[filename] = [0, 0, 0]
+        counters[0] += read
+        counters[1] += written
+        counters[2] += lines
+
+
+def timed(name):
+    """decorator counting the calls, errors and wall time of a function under the passed name.
+    the time of a generator is the time taken to go through it"""
+    def decorate(function):
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not enabled:
+                    return function(*args, **kwargs)
+                return _timed_generator(name, function(*args, **kwargs))
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException:
+                    record(name, time.perf_counter() - start, True)
+                    raise
+                record(name, time.perf_counter() - start)
+                return result
+        return wrapper
+    return decorate
+
+
+def _timed_generator(name, generator):
+    seconds = 0.0
+    error = False
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                return
+            except BaseException:
+                seconds += time.perf_counter() - start
+                error = True
+                raise
+            seconds += time.perf_counter() - start  # time the caller spends on each item isn't counted
+            yield item
+    finally:
+        generator.close()
+        record(name, seconds, error)
+
+
+def snapshot():
+    """function returning a copy of every counter as a dictionary"""
+    with _lock:
+        operations = {}
+        for name, (calls, errors, seconds, slowest) in sorted(_operations.items()):
+            operations[name] = {"calls": calls, "errors": errors, "seconds": seconds, "slowest_seconds": slowest}
+        files = {}
+        for name, (read, written, lines) in sorted(_files.items()):
+            files[name] = {"bytes_read": read, "bytes_written": written, "lines_scanned": lines}
+    return {"time": time.time(), "operations": operations, "files": files}
+
+
+def to_json(metrics=None):
+    if metrics is None:
+        metrics = snapshot()
+    return json.dumps(metrics, indent=2)
+
+
+def to_prometheus(metrics=None):
+    """function returning the counters in the Prometheus text format"""
+    if metrics is None:
+        metrics = snapshot()
+    lines = []
+    for metric, key, label, group, help_text in (
+            ("bank_operation_calls_total", "calls", "operation", "operations", "Number of calls"),
+            ("bank_operation_errors_total", "errors", "operation", "operations", "Number of calls that raised an error"),
+            ("bank_operation_seconds_total", "seconds", "operation", "operations", "Wall time spent in calls"),
+            ("bank_operation_slowest_seconds", "slowest_seconds", "operation", "operations", "Wall time of the slowest call"),
+            ("bank_file_read_bytes_total", "bytes_read", "file", "files", "Bytes read from the file"),
+            ("bank_file_written_bytes_total", "bytes_written", "file", "files", "Bytes written to the file"),
+            ("bank_file_lines_scanned_total", "lines_scanned", "file", "files", "Lines read from the file")):
+        lines.append("# HELP " + metric + " " + help_text)
+        lines.append("# TYPE " + metric + (" gauge" if key == "slowest_seconds" else " counter"))
+        for name, counters in metrics[group].items():
+            lines.append("%s{%s=\"%s\"} %s" % (metric, label, name.replace("\\", "\\\\").replace("\"", "\\\""),
+                                               repr(counters[key])))
+    return "\n".join(lines) + "\n"
+
+
+def dump(filename):
+    """function to write the counters to a file, as JSON if the file name ends in .json and in the
+    Prometheus text format otherwise. the file is replaced in one step so readers never see half of it"""
+    text = to_json() if filename.endswith(".json") else to_prometheus()
+    temp = filename + ".tmp"
+    with open(temp, "w") as metrics_writer:
+        metrics_writer.write(text)
+    os.replace(temp, filename)
+
+
+class _Dumper(threading.Thread):
+    def __init__(self, filename, interval):
+        super().__init__(name="metrics", daemon=True)
+        self.filename = filename
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            dump(self.filename)
+
+
+def start_dump(filename, interval=10.0):
+    """function to enable metrics and write them to a file every interval seconds and when the
+    program ends"""
+    global _dumper
+    enable()
+    stop_dump()
+    _dumper = _Dumper(filename, interval)
+    _dumper.start()
+
+
+def stop_dump():
+    """function to stop the periodic dump. the counters are written one last time"""
+    global _dumper
+    if _dumper is not None:
+        _dumper.stopped.set()
+        _dumper.join()
+        dump(_dumper.filename)
+        _dumper = None
+
+
+atexit.register(stop_dump)
+if os.environ.get("BANK_METRICS_FILE"):
+    start_dump(os.environ["BANK_METRICS_FILE"], float(os.environ.get("BANK_METRICS_INTERVAL", "10")))
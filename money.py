@@ -0,0 +1,90 @@
+# CA2 OOP - Bank Management System
+# amounts of money kept as whole numbers of cents
+import re
+
+CENTS = 100  # cents in a unit
+LIMIT = 10 ** 15  # largest amount or balance in cents taken in. the 64 bit numbers of the stores hold thousands of it
+AMOUNT = re.compile(r"([+-]?)(\d+)(?:\.(\d{1,2}))?")  # units with up to two decimal places
+
+
+def cents(value):
+    """function for converting an amount in units, written as text like "12" or "12.05" or passed as
+    a number, into a whole number of cents. Money is already in cents. raises ValueError for text
+    that isn't an amount or has more than two decimal places and TypeError for anything else"""
+    if isinstance(value, Money):
+        return int(value)
+    if isinstance(value, bool):
+        raise TypeError("Not an amount of money")
+    if isinstance(value, int):
+        return value * CENTS
+    if isinstance(value, float):
+        value = repr(value)  # 12.1 is read as the digits it is written with, not as the nearest float
+    elif not isinstance(value, str):
+        raise TypeError("Not an amount of money")
+    if value.isdigit():  # whole amounts, which is most of them
+        return int(value) * CENTS
+    match = AMOUNT.fullmatch(value.strip())
+    if match is None:
+        raise ValueError("Not an amount of money: " + value)
+    sign, units, fraction = match.groups()
+    amount = int(units) * CENTS + int((fraction or "0").ljust(2, "0"))
+    return -amount if sign == "-" else amount
+
+
+class Money(int):
+    """An amount of money as a whole number of cents. It is an int, so amounts are compared, added
+    and kept like any other number without being converted, and sums of cents are exact where
+    floats would not be. Added to or taken from a number of cents it stays Money.
+
+    It is written in units, with the cents only when there are some, so 130000 cents is written
+    as 1300 and 1205 cents as 12.05. Files of whole amounts written before cents were kept read
+    back the same. Amounts become Money once, where they come into the program from the files or
+    the user, with parse()"""
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, value):
+        """method returning the Money of an amount in units. Money is returned as it is"""
+        if type(value) is cls:
+            return value
+        return cls(cents(value))
+
+    def __str__(self):
+        units, fraction = divmod(abs(int(self)), CENTS)
+        text = str(units) if fraction == 0 else "%d.%02d" % (units, fraction)
+        return "-" + text if self < 0 else text
+
+    def __repr__(self):
+        return "Money('" + str(self) + "')"
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def number(self):
+        """method returning the amount in units as a number for JSON. a whole amount is an int and
+        otherwise it is a float, which JSON writes with the two decimal places"""
+        units, fraction = divmod(int(self), CENTS)
+        return units if fraction == 0 else int(self) / CENTS
+
+    def __add__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int(self) + int(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int(self) - int(other))
+
+    def __rsub__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int(other) - int(self))
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
@@ -1,799 +1,979 @@
-# CA2 OOP - Bank Management System
-import datetime
-import random
-import os
-
-
-# general account class which will act as a superclass/parent to different account types
-class Account(object):
-    """General superclass for an account. Used as a parent for subclasses defined
-    as account types"""
-    def __init__(self, acc_number, name, IBAN, funds, transactions="None"):
-        """constructor to initialise the object. most attributes are protected so that only the class
-        and its subclasses can access them"""
-        self._acc_number = acc_number  # protected acc number for security reasons. only to be used for identification
-        self._name = name # protected name to identify between the user's accounts
-        self.IBAN = IBAN  # public IBAN to be used for money transfers
-        self._funds = funds  # protected funds
-        if transactions == "None":  # avoid problems with mutable lists. protected too for security reasons
-            self._transactions = []
-        else:
-            transactions = transactions.strip().split(",")
-            self._transactions = transactions
-
-    def get_balance(self):
-        """get method for retrieving the balance of an account"""
-        return self._funds
-
-    def get_acc(self):
-        """get method for retrieving account number"""
-        return self._acc_number
-
-    def get_name(self):
-        """get method for retrieving the name"""
-        return self._name
-
-    def get_transactionlist(self):
-        """get method for formatting the account transaction list attribute into a string.
-        This is to be used for writing/updating the accounts.txt file. Each element of the
-        transactions list is appended to a string and separated by commas"""
-        transactionlist = ''  # format the transaction list into a writeable string
-        if not self._transactions:
-            return "None"
-        for t, l in enumerate(self._transactions):
-            if t == (len(self._transactions) - 1):  # end of line to not append a comma
-                transactionlist += str(self._transactions[t])
-            else:
-                transactionlist += str(self._transactions[t]) + ","  # separate each element(transaction id) with a comma
-        return transactionlist
-
-    def withdraw(self, amount):
-        """withdraw method for taking out money. error checking is done first and then the transaction
-        is recorded in the accountsTransactions.txt file. Funds are then removed from the account"""
-        if int(amount) <= 0:
-            print("You can only withdraw a positive value")  # error validation for negative withdraw values
-            return
-        if int(amount) > int(self._funds):
-            print("You have insufficient funds to withdraw the requested amount")  # error checking for not enough funds
-            return
-        # call tid function
-        tid = calculate_tid()
-
-        #  open the transactions file to append the new transaction
-        with open("accountsTransactions.txt", "a") as file_reader:
-            #  transaction is a line string with some details
-
-            transaction = str(tid) + "_withdraw_" + self.IBAN + "_" + str(amount) + "_" + str(datetime.date.today())
-            print(transaction, file=file_reader)  # print to the file
-        self._transactions.append(str(tid))  # append id to transactions list to link to the account
-        result = int(self._funds) - int(amount)
-        self._funds = result  # remove funds as requested from account
-
-    def deposit(self, amount):
-        """deposit method for putting in money. error checking is done then the transaction is recorded
-         and funds are added"""
-        if int(amount) <= 0:
-            print("You can only deposit a positive value")  # error validation for negative deposit values
-            return
-
-        # call tid function
-        tid = calculate_tid()
-
-        #  open the transactions file to append the new transaction
-        with open("accountsTransactions.txt", "a") as file_reader:
-            #  transaction is a line string with some details
-            transaction = str(tid) + "_deposit_" + self.IBAN + "_" + str(amount) + "_" + str(datetime.date.today())
-            print(transaction, file=file_reader)  # print to the file
-        self._transactions.append(str(tid))  # append id to transactions list to link to the account
-        result = int(self._funds) + int(amount)
-        self._funds = result  # add funds as requested to account
-
-    def receive_transfer(self, tid, amount):
-        """receive transfer method for payee to receive transferred funds. transaction is appended to
-        the transactions list attribute and details are updated"""
-        self._transactions.append(str(tid))  # transaction id is appended to payee's list of transactions
-        result = int(self._funds) + int(amount)
-        self._funds = result  # funds are added to the account
-        self.update_details()
-
-    def transfer(self, amount, IBAN):
-        """transfer method for transferring money to other accounts. error checking is done first.
-        afterwards, the passed IBAN must be validated to check if it exists or not.
-        If it does the transfer is recorded, funds are removed from the account and added
-        to the account corresponding with the IBAN"""
-        if amount <= 0:
-            print("You can only transfer a positive value")  # error validation for negative transfer values
-            return
-
-        if amount > self._funds:
-            print("You have insufficient funds to transfer the requested amount")  # error checking for not enough funds
-            return
-
-        # IBAN validation to check if passed IBAN is valid/exists
-        with open("accounts.txt", "r") as file_reader:
-            for line in file_reader:
-                # split string into list. the string contains account details separated with an underscore
-                acc = line.strip().split("_")
-                if IBAN == acc[3]:  # find the passed IBAN substring in the string
-                    # call tid function
-                    tid = calculate_tid()
-
-                    #  open the transactions file to append the new transaction
-                    with open("accountsTransactions.txt", "a") as line_reader:
-                        #  transaction is a line string with some details
-                        transaction = str(tid) + "_transfer_" + IBAN + "_" + str(amount) + "_" + str(datetime.date.today())
-                        print(transaction, file=line_reader)  # print to the file
-
-                    self._transactions.append(str(tid))
-                    result = int(self._funds) - int(amount)
-                    self._funds = result  # remove funds as requested from account
-
-                    # create temporary account instance with list elements
-                    if acc[1] == "savings":
-                        payee = SavingsAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5])
-                    else:
-                        payee = CheckingAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5], acc[6])
-                    payee.receive_transfer(tid, amount)  # pass tid and amount into receive_transfer method
-                    self.update_details()
-                    return
-            print("IBAN does not exist")  # indicate IBAN does not exist to the user
-            return
-
-    def view_transactions(self):
-        """method to print transactions associated to the account"""
-        if self._transactions == []:
-            print("No transactions available")
-            return
-        print("Transfer ID      Type         IBAN          Amount        Date")
-        print(60*"-")
-        with open("accountsTransactions.txt", "r") as t_reader:
-            for line in t_reader:
-                t_details = line.strip().split("_")
-                if t_details[0] in self._transactions:
-                    print("{:15s}{:15s}{:15s}{:15s}{:15s}".format(t_details[0], t_details[1], t_details[2], t_details[3], t_details[4]))
-
-    def update_details(self):
-        """method to write all the object details back to the account txt file.
-        a temp file is used to write all the existing data except the outdated data which
-        is overwritten by the current running objects. The object attributes are converted into a single line
-        string format to be written to the txt file"""
-        with open("accounts.txt", "r") as account_reader, open("accountstemp.txt", "w") as temp_reader:  # temp file to write data plus the updates to
-            for line in account_reader:
-                accounts = line.strip().split("_")
-                # write data normally until an account line matches our current one
-                # the current one(the most up to date) will replace the account line to be written to the temp file
-                if accounts[0] == self._acc_number:
-                    account = str(self._acc_number) + "_" + self._name + "_" + self.IBAN + "_" + str(self._funds) + "_" + self.get_transactionlist() + "\n"  # format account atrributes into a string
-                    temp_reader.write(account)
-                else:
-                    temp_reader.write(line)
-
-        with open("accountstemp.txt", "r") as temp_reader, open("accounts.txt", "w") as file_reader:  # copy the contents of the temp file back to main accounts
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("accountstemp.txt")
-
-    def __str__(self):
-        """str method for when class is called to print"""
-        result = "Account Number: {:6s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._name, self.IBAN)
-        return result
-
-
-class SavingsAccount(Account):
-    """An account type object inheriting from the Account class. It defines a SavingsAccount.
-    Works the same as the Account class except there is a limit of 1 withdrawal/transfer
-    transaction per month"""
-    def __init__(self, acc_number, acctype, name, IBAN, funds, transactions="None"):
-        Account.__init__(self, acc_number, name, IBAN, funds, transactions)
-        self._acctype = acctype
-
-    def get_type(self):
-        """get method for returning the account type"""
-        return self._acctype
-
-    def withdraw(self, amount):
-        """the same as withdraw from Account class but with added validation.
-        The transactions of the savings account is checked. Their dates are loaded onto a list
-        and the most recent element's month is compared with the system/current month.
-        If they are the same then the method will not proceed"""
-        # validation for savings account
-        # checks the most recent transfer/withdraw transaction date and compares it with current month
-        # the limit is once per month so if they are the same then we return back to the menu
-        datelist = []
-        with open("accountsTransactions.txt", "r") as t_reader:
-            for line in t_reader:  # iterate through each line of the file
-                tran = line.strip().split("_")  # split string into a list of the transaction details
-
-                # tran[0] contains the tid(transaction id) of a transaction
-                # tran[1] contains the transaction type
-                # if tran[0] is in the account's list of transaction id's and the type is withdraw or transfer
-                # we go into the suite
-                if tran[0] in self._transactions and (tran[1] == "withdraw" or tran[1] == "transfer"):
-                    print(datelist)
-                    print(tran)
-                    datelist.append(str(tran[4]))  # append the date to a list
-        if datelist:
-            print(datelist)
-            tdate = datelist[len(datelist) - 1]  # most recent date will be the last element of the list
-            tdate = tdate.split("-")  # split the date into year, month, day
-            today = datetime.date.today()  # retrieve current month date
-            if tdate[1] == str(today.month):  # compare both months
-                print("Savings accounts are restricted to only one withdrawal or transfer per month. Your limit of 1"
-                      " has already been exceeded")  # error message for user
-                return
-        Account.withdraw(self, amount)
-
-    def transfer(self, amount, IBAN):
-        """same as transfer from account class but with added validation.
-        The transactions of the savings account is checked. Their dates are loaded onto a list
-        and the most recent element's month is compared with the system/current month.
-        If they are the same then the method will not proceed"""
-        # validation for savings account
-        # checks the most recent transfer/withdraw transaction date and compares it with current month
-        # the limit is once per month so if they are the same then we return back to the menu
-        datelist = []
-        with open("accountsTransactions.txt", "r") as t_reader:
-            for line in t_reader:  # iterate through each line of the file
-                tran = line.strip().split("_")  # split string into a list of the transaction details
-
-                # tran[0] contains the tid(transaction id) of a transaction
-                # tran[1] contains the transaction type
-                # if tran[0] is in the account's list of transaction id's and the type is withdraw or transfer
-                # we go into the suite
-                if tran[0] in self._transactions and (tran[1] == "withdraw" or tran[1] == "transfer"):
-                    datelist.append(str(tran[4]))  # append the date to a list
-        if datelist:
-            tdate = datelist[len(datelist) - 1]  # most recent date will be the last element of the list
-            tdate = tdate.split("-")  # split the date into year, month, day
-            today = datetime.date.today()  # retrieve current month date
-            if tdate[1] == str(today.month):  # compare both months
-                print("Savings accounts are restricted to only one withdrawal or transfer per month. Your limit of 1"
-                      "has already been exceeded")  # error message for user
-                return
-        Account.transfer(self, amount, IBAN)
-
-    def __str__(self):
-        result = "Account Number: {:6s} Type: {:10s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._acctype, self._name, self.IBAN)
-        return result
-
-    def update_details(self):
-        with open("accounts.txt", "r") as account_reader, open("accountstemp.txt", "w") as temp_reader:  # temp file to write data plus the updates to
-            for line in account_reader:
-                accounts = line.strip().split("_")
-                # write data normally until an account line matches our current one
-                # the current one(the most up to date) will replace the account line to be written to the temp file
-                if accounts[0] == self._acc_number:
-                    account = str(self._acc_number) + "_" + self._acctype + "_" + self._name + "_" + self.IBAN\
-                              + "_" + str(self._funds) + "_" +\
-                              self.get_transactionlist() + "\n" # format account atrributes into a string
-                    temp_reader.write(account)
-                else:
-                    temp_reader.write(line)
-
-        with open("accountstemp.txt", "r") as temp_reader, open("accounts.txt", "w") as file_reader:  # copy the contents of the temp file back to main accounts
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("accountstemp.txt")
-
-
-class CheckingAccount(Account):
-    """An account type subclass of account. Everything is the same except for some formatting and the added credit limit"""
-    def __init__(self, acc_number, acctype, name, IBAN, funds, transactions="None", creditlimit=-1000):
-        Account.__init__(self, acc_number, name, IBAN, funds, transactions)
-        self._acctype = acctype
-        self._creditlimit = creditlimit  # specified credit limit for negative balance
-
-    def get_type(self):
-        return self._acctype
-
-    def get_limit(self):
-        return self._creditlimit
-
-    def withdraw(self, amount):  # method for taking money out of the checking account
-        if int(amount) <= 0:
-            print("You can only withdraw a positive value")  # error validation for negative withdraw values
-            return
-        if amount > abs(int(self._creditlimit)) + int(self._funds):
-            # error checking for not enough funds with credit limit added on for the checking account
-            print("You have insufficient funds to withdraw the requested amount")
-            return
-        # call tid function
-        tid = calculate_tid()
-
-        #  open the transactions file to append the new transaction
-        with open("accountsTransactions.txt", "a") as file_reader:
-            #  transaction is a line string with some details
-            transaction = str(tid) + "_withdraw_" + self.IBAN + "_" + str(amount) + "_" + str(datetime.date.today())
-            print(transaction, file=file_reader)  # print to the file
-        self._transactions.append(str(tid))  # append id to transactions list to link to the account
-        result = int(self._funds) - int(amount)
-        self._funds = result  # remove funds as requested from account
-
-    def transfer(self, amount, IBAN):
-        if int(amount) <= 0:
-            print("You can only transfer a positive value")  # error validation for negative transfer values
-            return
-
-        if amount > abs(int(self._creditlimit)) + int(self._funds):
-            # error checking for not enough funds with credit limit added on for the checking account
-            print("You have insufficient funds to withdraw the requested amount")
-            return
-
-        # IBAN validation to check if passed IBAN is valid/exists
-        with open("accounts.txt", "r") as file_reader:
-            for line in file_reader:
-                # split string into list. the string contains account details separated with an underscore
-                acc = line.strip().split("_")
-                print(acc)
-                if IBAN == acc[3]:  # find the passed IBAN substring in the string
-                    # call tid function
-                    tid = calculate_tid()
-
-                    #  open the transactions file to append the new transaction
-                    with open("accountsTransactions.txt", "a") as line_reader:
-                        #  transaction is a line string with some details
-                        transaction = str(tid) + "_transfer_" + IBAN + "_" + str(amount) + "_" + str(datetime.date.today())
-                        print(transaction, file=line_reader)  # print to the file
-
-                    self._transactions.append(str(tid))
-                    sub = int(self._funds) - int(amount)
-                    self._funds = str(sub)
-
-                    # create temporary account instance with list elements
-                    if acc[1] == "savings":
-                        payee = SavingsAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5])
-                    else:
-                        payee = CheckingAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5], acc[6])
-                    payee.receive_transfer(tid, amount)  # pass tid and amount into receive_transfer method
-                    self.update_details()
-                    return
-            print("IBAN does not exist")  # indicate IBAN does not exist to the user
-            return
-
-    def __str__(self):
-        result = "Account Number: {:6s} Type: {:10s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._acctype, self._name, self.IBAN)
-        return result
-
-    def update_details(self):  # method to write all the object details back to the account txt file
-        with open("accounts.txt", "r") as account_reader, open("accountstemp.txt", "w") as temp_reader:  # temp file to write data plus the updates to
-            for line in account_reader:
-                accounts = line.strip().split("_")
-                # write data normally until an account line matches our current one
-                # the current one(the most up to date) will replace the account line to be written to the temp file
-                if accounts[0] == self._acc_number:
-                    account = str(self._acc_number) + "_" + self._acctype + "_" + self._name + "_" + self.IBAN\
-                              + "_" + str(self._funds) + "_" + self.get_transactionlist() + "_"\
-                              + str(self._creditlimit) + "\n" # format account atrributes into a string
-                    temp_reader.write(account)
-                else:
-                    temp_reader.write(line)
-
-        with open("accountstemp.txt", "r") as temp_reader, open("accounts.txt", "w") as file_reader:  # copy the contents of the temp file back to main accounts
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("accountstemp.txt")
-
-
-class Customer(object):
-    """General Bank Customer class with private attributes and composition for accounts"""
-    def __init__(self, customerid, pin, firstname, lastname, age, accounts="None"):
-        self.__customerid = customerid
-        self.__PIN = pin  # private pin for customer login
-        self.__firstname = firstname
-        self.__lastname = lastname
-        self.__age = age
-        if accounts == "None":
-            self.__accounts = []
-        else:
-            self.__accounts = accounts  # assign list of account numbers to the accounts attribute
-            with open("accounts.txt", "r") as account_reader:
-                accounttemp = []  # temp list for account instances
-                for line in account_reader:  # read every account line
-                    acclist = line.strip().split("_")  # split line into list of account details
-                    if acclist[0] in self.__accounts:  # check if the read account number matches an element in the list
-                        if acclist[1] == "savings":  # create the appropriate account object by checking the type
-                            accounttemp.append(SavingsAccount(acclist[0], acclist[1], acclist[2], acclist[3], int(acclist[4]), acclist[5]))
-                        else:
-                            accounttemp.append(CheckingAccount(acclist[0], acclist[1], acclist[2], acclist[3], int(acclist[4]), acclist[5], acclist[6]))
-                self.__accounts = accounttemp  # assign temp list back to customer accounts attribute
-
-    def __str__(self):
-        result = "Customer ID: " + self.__customerid + "\n" + "Firstname" + self.__firstname + "\n" + "Lastname: " + \
-                 self.__lastname + "\n" + "Age: " + self.__age + "\n"
-        return result
-
-    def get_custno(self):
-        return self.__customerid
-
-    def get_name(self):
-        return self.__firstname
-
-    def get_accounts(self):
-        return self.__accounts
-
-    def get_accountlist(self):
-        """same as get_transactionslist from account class"""
-        accountlist = ''  # format the transaction list into a writeable string
-        for t, l in enumerate(self.__accounts):
-            if t == (len(self.__accounts) - 1):  # end of line to not append a comma
-                accountlist += str(self.__accounts[t].get_acc())
-            else:
-                accountlist += str(self.__accounts[t].get_acc()) + ","  # separate each element(transaction id) with a comma
-        return accountlist
-
-    def new_account(self, name, acctype):
-        """method for creating new account for customer object. error checking is done
-        and then a new account number and IBAN is calculated. The new account object is then created and
-        linked to the current customer instance"""
-        if acctype == "2" and self.__age < "18":
-            print("Customer Age is not above 18 for a checking account")
-            return
-        # open the accounts file in order to calculate the new account number id
-        with open("accounts.txt", "r") as account_reader:
-            aid = 0
-            for aid, l in enumerate(account_reader):  # counts the number of lines in the file
-                pass
-            if aid == 0:
-                try:  # exception for first line of txt file
-                    l
-                    aid += 2
-                except NameError:  # if file is empty
-                    l = None
-                    aid += 1
-            else:
-                aid += 2  # each line is an account so the no. of lines plus 2 indicates the next line/id
-
-        # determine new IBAN
-        used = False
-        while True:
-            num = random.randint(1, 99999)  # random number up to 5 digits
-            IBAN = "IE" + str(num)  # cast as a string and add IE identifier
-            # check if already used
-            with open("accounts.txt", "r") as account_reader:
-                for line in account_reader:
-                    acclist = line.strip().split("_")
-                    if IBAN == acclist[3]:
-                        used = True
-            if used is False:
-                break
-
-        match acctype:  # switch statement equivalent from c
-            case "1":  # creating a new SavingsAccount
-                with open("accounts.txt", "a") as account_reader:
-                    #  write the account line that is to be written to the accounts file
-                    account = str(aid) + "_savings_" + name + "_" + IBAN + "_" + "0" + "_" + "None"
-                    account_reader.write(account)  # output to file
-                    self.__accounts.append(SavingsAccount(str(aid), "savings", name, IBAN, 0, "None"))
-            case "2":  # creating a new CheckingAccount
-                with open("accounts.txt", "a") as account_reader:
-                    #  write the account line that is to be written to the accounts file
-                    account = str(aid) + "_checking_" + name + "_" + IBAN + "_" + "0" + "_" + "None" + "_" + "-1000"
-                    print(account, file=account_reader)  # output to file
-                    self.__accounts.append(CheckingAccount(str(aid), "checking", name, IBAN, 0, "None", -1000))
-        print("Account created successfully")
-        print(self.__accounts[len(self.__accounts) - 1])
-
-    def delete_account(self):
-        """method for deleting customer's account. The account is already delinked from the customer and
-        so the customer details must be updated using the new account list"""
-        accountlist = ''  # format the account list into a writeable string
-        for t, l in enumerate(self.__accounts):
-            if t == (len(self.__accounts) - 1):  # end of line to not append a comma
-                accountlist += str(self.__accounts[t].get_acc())
-            else:
-                accountlist += str(self.__accounts[t].get_acc()) + ","  # separate each element(account number) with a comma
-        with open("customers.txt", "r") as c_reader, open("customerstemp.txt", "w") as temp_reader:
-            for line in c_reader:
-                customers = line.strip().split("_")
-                # write data normally until a customer line matches our current one
-                # the current one(the most up to date) will replace the customer line to be written to the temp file
-                if customers[0] == self.__customerid:
-                    customer = str(self.__customerid) + "_" + self.__PIN + "_" + self.__firstname + "_" + self.__lastname \
-                              + "_" + str(self.__age) + "_" + accountlist + "\n"  # format customer atrributes into a string
-                    temp_reader.write(customer)
-                else:
-                    temp_reader.write(line)
-
-        with open("customerstemp.txt", "r") as temp_reader, open("customers.txt", "w") as file_reader:  # copy the contents of the temp file back to main customers
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("customerstemp.txt")
-
-    def update_details(self):
-        """method to write all the object details back to the account and customer txt file"""
-        with open("accounts.txt", "r") as account_reader, open("accountstemp.txt", "w") as temp_reader:  # temp file to write data plus the updates to
-            for line in account_reader:
-                accounts = line.strip().split("_")
-                # write data normally until an account line matches our current one
-                # the current one(the most up to date) will replace the account line to be written to the temp file
-                account = ""
-                for acc in self.__accounts:
-                    if accounts[0] == acc.get_acc():
-                        if accounts[1] == "savings":
-                            account = str(acc.get_acc()) + "_" + acc.get_type() + "_" + acc.get_name() + "_" + acc.IBAN\
-                                      + "_" + str(acc.get_balance()) + "_" + \
-                                      acc.get_transactionlist() + "\n"  # format account atrributes into a string
-                            temp_reader.write(account)
-                            break
-                        else:
-                            # format account atrributes into a string
-                            account = str(acc.get_acc()) + "_" + acc.get_type() + "_" + acc.get_name() + "_" + acc.IBAN\
-                                      + "_" + str(acc.get_balance()) + "_" + \
-                                      acc.get_transactionlist() + "_" + acc.get_limit() + "\n"
-                            temp_reader.write(account)
-                            break
-                if account == "":  # else write normally
-                    temp_reader.write(line)
-
-        with open("accountstemp.txt", "r") as temp_reader, open("accounts.txt", "w") as file_reader:  # copy the contents of the temp file back to main accounts
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("accountstemp.txt")
-
-        accountlist = ''  # format the account list into a writeable string
-        for t, l in enumerate(self.__accounts):
-            if t == (len(self.__accounts) - 1):  # end of line to not append a comma
-                accountlist += str(self.__accounts[t].get_acc())
-            else:
-                accountlist += str(
-                    self.__accounts[t].get_acc()) + ","  # separate each element(account number) with a comma
-        with open("customers.txt", "r") as c_reader, open("customerstemp.txt", "w") as temp_reader:
-            for line in c_reader:
-                customers = line.strip().split("_")
-                # write data normally until a customer line matches our current one
-                # the current one(the most up to date) will replace the customer line to be written to the temp file
-                if customers[0] == self.__customerid:
-                    customer = str(
-                        self.__customerid) + "_" + self.__PIN + "_" + self.__firstname + "_" + self.__lastname \
-                               + "_" + str(
-                        self.__age) + "_" + accountlist + "\n"  # format customer atrributes into a string
-                    temp_reader.write(customer)
-                else:
-                    temp_reader.write(line)
-
-        with open("customerstemp.txt", "r") as temp_reader, open("customers.txt",
-                                                                 "w") as file_reader:  # copy the contents of the temp file back to main customers
-            for line in temp_reader:
-                file_reader.write(line)
-        os.remove("customerstemp.txt")
-
-
-def main():
-    """Function for program start. Calls the menu function"""
-    print("Welcome to Kieran's Bank\n")  # welcome the user
-    while input("Hit 'Enter' to login") != "":
-        pass
-    with open("customers.txt", "r") as line_reader:  #prompt user login and check if details are correct
-        while True:
-                id = input("\nCustomer ID: ")
-                for line in line_reader:  # go through each line to check the customer id
-                    customer = line.strip().split("_")
-                    if customer[0] == id:
-                        break
-                if customer[0] == id:  # proceed into menu function to begin session
-                    while True:
-                        pin = input("PIN: ")
-                        if pin == "q":
-                            break
-                        if customer[1] == pin:
-                            menu(customer)  # pass list of customer details
-                            break
-                        else:
-                            print("PIN incorrect. Try Again or 'q' to quit")
-                            continue
-                else:
-                    print("Customer ID does not exist, Please Try Again")
-                    continue
-
-                print("Session Ended. Thank You")
-                break
-
-
-def calculate_tid():
-    """function for calculating the new transaction id by counting the number of lines in the txt file"""
-    # open the transactions file in order to calculate the transaction id
-    with open("accountsTransactions.txt", "r") as file_reader:
-        tid = 0
-        for tid, l in enumerate(file_reader):  # counts the number of lines in the file
-            pass
-        if tid == 0:
-            try:  # exception for first line of txt file
-                l
-                tid += 2
-            except NameError:  # if file is empty
-                l = None
-                tid += 1
-        else:
-            tid += 2  # each line is a transaction so the no. of lines plus 2 indicates the next line/id
-    return tid
-
-
-def menu(customer):
-    """menu function for displaying all the options that access the methods"""
-    customer[5] = customer[5].strip().split(",")  # convert account numbers string to list
-    accountlist = customer[5]  # grabbing list of accounts for delete account method in customer
-    customer = Customer(customer[0], customer[1], customer[2], customer[3], customer[4], customer[5])
-    test = customer.get_accounts()
-    print(test[0].get_transactionlist())
-    while True:
-        print("Welcome", customer.get_name())  # main menu options format
-        print(30*"-")
-        print("1)\tCreate New Account")
-        print("2)\tView Transactions")
-        print("3)\tBalance")
-        print("4)\tDeposit")
-        print("5)\tWithdraw")
-        print("6)\tTransfer")
-        print("7)\tDelete an Account")
-        print("8)\tExit")
-        user_choice = int(input("Select a menu option: "))
-        match user_choice:  # C switch statement equivalent for each menu option (NOTE: Python 3.10 required)
-            case 1:  # Create New Account
-                while True:  # loop for error validation
-                    print(30*"-")
-                    print("1) Savings Account")
-                    print("2) Checking Account")
-                    type = str(input("What type of account would you like to create?:"))
-                    if type not in ["1", "2"]:
-                        print("Not a valid option")
-                        continue  # reloop and prompt again
-                    break  # break out loop and proceed
-                name = input("What name would you like for your account?\n")
-                customer.new_account(name, type)  # pass name and type into customer method
-
-            case 2:  # View Transactions
-                while True:  # error loop
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account's transactions would you like to view?")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-
-                    if int(index) not in range(1, len(accounts) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                accounts[index - 1].view_transactions()
-
-            case 3:  # Balance
-                while True:
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account balance would you like to view?")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-                    if int(index) not in range(1, len(accounts) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                balance = accounts[index - 1].get_balance()
-                print("Balance :", balance)
-
-            case 4:  # Deposit
-                while True:
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account would you like to deposit money in?")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-                    if int(index) not in range(1, len(customer.get_accounts()) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                while True:
-                    amount = input("How much would you like to deposit? (Whole numbers only)")
-                    try:
-                        amount = int(amount)
-                    except ValueError:
-                        print("Not a valid number")
-                        continue
-                    break
-                accounts[index - 1].deposit(amount)
-
-            case 5:  # Withdraw
-                while True:
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account would you like to withdraw money from?")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-                    if int(index) not in range(1, len(customer.get_accounts()) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                while True:
-                    amount = input("How much would you to like withdraw? (Whole numbers only)\n")
-                    try:
-                        amount = int(amount)
-                    except ValueError:
-                        print("Not a valid number")
-                        continue
-                    break
-                accounts[index - 1].withdraw(amount)
-
-            case 6:  # Transfer
-                while True:
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account would you like to transfer money from?\n")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-                    if int(index) not in range(1, len(customer.get_accounts()) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                while True:
-                    amount = input("How much would you to like transfer? (Whole numbers only)\n")
-                    try:
-                        amount = int(amount)
-                    except ValueError:
-                        print("Not a valid number")
-                        continue
-                    break
-                iban = input("IBAN for the money to be transferred to:\n")
-                accounts[index - 1].transfer(amount, iban)
-            case 7:  # Delete an Account
-                while True:
-                    print(30 * "-")
-                    accounts = customer.get_accounts()  # assign accounts into an accounts list
-                    for i, l in enumerate(accounts):
-                        print(i + 1,")", accounts[i])  # show accounts
-                    while True:
-                        index = input("Which account would you like to delete?")
-                        try:
-                            index = int(index)
-                        except ValueError:
-                            print("Not a valid option")
-                            continue
-                        break
-                    if int(index) not in range(1, len(customer.get_accounts()) + 1):
-                        print("Not a valid option")
-                        continue
-                    break
-                accounts.pop(index - 1)  # account is removed from accounts list
-                customer.delete_account()  # method to update details with new list called
-            case 8:  # Exit
-                print(30 * "-")
-                customer.update_details()  # all details updated before program exit
-                return  # return back to main where the program ends
-            case _:
-                print("not a valid option\n")
-                continue
-
-# begin program
-main()
+# CA2 OOP - Bank Management System
+import datetime
+import os
+import atexit
+import threading
+import metrics
+from storage import AccountStore, CustomerStore, TidAllocator, IbanAllocator, Ledger, TextBackend, debit_dates
+from binstore import BinaryAccountStore
+from sqlstore import SqliteBackend
+from shards import ShardedLedger
+from archive import LedgerArchive, ArchivedLedger
+from locks import AccountLocks
+from cache import AccountCache
+from money import Money, cents, LIMIT
+
+# every account, customer, transaction id and transaction goes through the storage backend instead of
+# the files. the txt backend appends updates to journals and the txt files are only rewritten when a
+# journal is compacted. if the accounts have been converted to the binary format (python binstore.py
+# import) the binary file is used instead, and if everything has been moved into a database
+# (python sqlstore.py import) the SQLite backend is used. once the transactions file has been split into
+# month files (python shards.py split) the manifest of the month files is there and they are used. old
+# transactions moved into the compressed archive (python archive.py before YYYY-MM-DD) are read from it
+if os.path.exists("bank.db"):
+    backend = SqliteBackend("bank.db")
+else:
+    if os.path.exists("accounts.bin"):
+        accounts = BinaryAccountStore("accounts.bin")
+    else:
+        accounts = AccountStore("accounts.txt", journaled=True)
+    if os.path.exists("accountsTransactions.manifest"):
+        transactions = ShardedLedger("accountsTransactions.txt")
+        tids = TidAllocator(transactions, "accountsTransactions.seq")
+    else:
+        transactions = Ledger("accountsTransactions.txt")  # transactions file with an index of where each one is
+        tids = TidAllocator("accountsTransactions.txt")  # ids are handed out from a checkpointed counter
+    if os.path.exists("accountsTransactions.arx"):
+        transactions = ArchivedLedger(transactions, LedgerArchive("accountsTransactions.txt"))
+        tids = TidAllocator(transactions, "accountsTransactions.seq")  # ids carry on after the archived ones
+    backend = TextBackend(accounts, CustomerStore("customers.txt", journaled=True), tids, transactions,
+                          IbanAllocator(accounts, "accounts.iban"))  # IBANs are handed out from a shuffled order
+account_store = backend.accounts
+customer_store = backend.customers
+tid_allocator = backend.tids
+ledger = backend.ledger
+iban_allocator = backend.ibans
+account_locks = AccountLocks("accounts.lock")  # held by operations so threads and programs don't change an account at once
+# none of the files are read or written until the stores are first used, so importing the module is
+# cheap. programs that change the bank call open_bank() first
+_opened = False
+_open_lock = threading.Lock()
+
+
+def open_bank():
+    """function to get the bank ready before it is used. transactions a crashed program wrote to the
+    ledger without its accounts are applied, and unused ids are given back when the program ends.
+    only done the first time it is called"""
+    global _opened
+    with _open_lock:
+        if _opened:
+            return
+        atexit.register(backend.close)
+        backend.recover()
+        _opened = True
+
+
+class BankError(Exception):
+    """General error raised when a banking operation can't go ahead. The message is the one shown to the user"""
+    pass
+
+
+class InvalidAmountError(BankError):
+    """raised for amounts that are not a positive amount of money"""
+    pass
+
+
+class InsufficientFundsError(BankError):
+    """raised when an account doesn't have the funds for a withdrawal or transfer"""
+    pass
+
+
+class LimitExceededError(BankError):
+    """raised when the withdrawal/transfer limit of a savings account has been reached"""
+    pass
+
+
+class AccountNotFoundError(BankError):
+    """raised for an account number or IBAN that doesn't exist"""
+    pass
+
+
+class LoginError(BankError):
+    """raised for a customer id that doesn't exist or a PIN that is incorrect"""
+    pass
+
+
+class AgeRestrictionError(BankError):
+    """raised when a customer is too young for the requested account type"""
+    pass
+
+
+class InvalidInputError(BankError):
+    """raised for a request or detail that isn't of the kind expected, like a name that is too long"""
+    pass
+
+
+# general account class which will act as a superclass/parent to different account types
+class Account(object):
+    """General superclass for an account. Used as a parent for subclasses defined
+    as account types. The attributes are slots so an account object is small and quick to create,
+    and amounts are Money, in cents, from when the account is created"""
+    __slots__ = ("_acc_number", "_name", "IBAN", "_funds", "_transactions")
+
+    def __init__(self, acc_number, name, IBAN, funds, transactions="None"):
+        """constructor to initialise the object. most attributes are protected so that only the class
+        and its subclasses can access them"""
+        self._acc_number = acc_number  # protected acc number for security reasons. only to be used for identification
+        self._name = name # protected name to identify between the user's accounts
+        self.IBAN = IBAN  # public IBAN to be used for money transfers
+        self._funds = Money.parse(funds)  # protected funds. read once from the units in the file
+        if transactions == "None":  # avoid problems with mutable lists. protected too for security reasons
+            self._transactions = []
+        else:
+            transactions = transactions.strip().split(",")
+            self._transactions = transactions
+
+    def get_balance(self):
+        """get method for retrieving the balance of an account"""
+        return self._funds
+
+    def get_acc(self):
+        """get method for retrieving account number"""
+        return self._acc_number
+
+    def get_name(self):
+        """get method for retrieving the name"""
+        return self._name
+
+    def get_transactionlist(self):
+        """get method for formatting the account transaction list attribute into a string.
+        This is to be used for writing/updating the accounts.txt file. Each element of the
+        transactions list is appended to a string and separated by commas"""
+        if not self._transactions:
+            return "None"
+        return ",".join(self._transactions)  # separate each element(transaction id) with a comma
+
+    def check_withdraw(self, amount):
+        """method for the error checking done before a withdrawal. a BankError with the message to be
+        shown to the user is raised if the withdrawal can't go ahead. the check methods take Money"""
+        if amount <= 0:
+            raise InvalidAmountError("You can only withdraw a positive value")  # error validation for negative withdraw values
+        if amount > self._funds:
+            raise InsufficientFundsError("You have insufficient funds to withdraw the requested amount")  # error checking for not enough funds
+
+    def check_deposit(self, amount):
+        """method for the error checking done before a deposit"""
+        if amount <= 0:
+            raise InvalidAmountError("You can only deposit a positive value")  # error validation for negative deposit values
+        if amount > LIMIT - self._funds:
+            raise InvalidAmountError("The balance of an account can be up to " + str(Money(LIMIT)))
+
+    def check_transfer(self, amount):
+        """method for the error checking done before a transfer. the IBAN is checked separately"""
+        if amount <= 0:
+            raise InvalidAmountError("You can only transfer a positive value")  # error validation for negative transfer values
+        if amount > self._funds:
+            raise InsufficientFundsError("You have insufficient funds to transfer the requested amount")  # error checking for not enough funds
+
+    @metrics.timed("account.withdraw")
+    def withdraw(self, amount):
+        """withdraw method for taking out money. error checking is done first and then the transaction
+        is recorded in the accountsTransactions.txt file. Funds are then removed from the account.
+        returns the transaction id"""
+        amount = Money.parse(amount)
+        self.check_withdraw(amount)  # raises an error if the withdraw can't go ahead
+        # call tid function
+        tid = calculate_tid()
+
+        ledger.append(tid, "withdraw", self.IBAN, amount)  # append the new transaction to the transactions file
+        self._debit(tid, amount)
+        return tid
+
+    @metrics.timed("account.deposit")
+    def deposit(self, amount):
+        """deposit method for putting in money. error checking is done then the transaction is recorded
+         and funds are added"""
+        amount = Money.parse(amount)
+        self.check_deposit(amount)  # raises an error if the deposit can't go ahead
+
+        # call tid function
+        tid = calculate_tid()
+
+        ledger.append(tid, "deposit", self.IBAN, amount)  # append the new transaction to the transactions file
+        self._credit(tid, amount)
+        return tid
+
+    @metrics.timed("account.receive_transfer")
+    def receive_transfer(self, tid, amount):
+        """receive transfer method for payee to receive transferred funds. transaction is appended to
+        the transactions list attribute and details are updated"""
+        self._credit(tid, Money.parse(amount))
+        self.update_details()
+
+    @metrics.timed("account.transfer")
+    def transfer(self, amount, IBAN):
+        """transfer method for transferring money to other accounts. error checking is done first.
+        afterwards, the passed IBAN must be validated to check if it exists or not.
+        If it does the transfer is recorded, funds are removed from the account and added
+        to the account corresponding with the IBAN"""
+        amount = Money.parse(amount)
+        self.check_transfer(amount)  # raises an error if the transfer can't go ahead
+
+        # the ledger line, the payee credit and the payer debit are written as one transaction
+        with backend.transaction():
+            # IBAN validation to check if passed IBAN is valid/exists
+            payee = account_cache.find_iban(IBAN)  # payee's account object, kept from earlier transfers to it
+            if payee is None:
+                raise AccountNotFoundError("IBAN does not exist")  # indicate IBAN does not exist to the user
+            # call tid function
+            tid = calculate_tid()
+
+            ledger.append(tid, "transfer", IBAN, amount, source=self.IBAN)  # append the new transaction to the transactions file
+            self._debit(tid, amount)
+
+            if payee.get_acc() == self._acc_number:  # transfer to the same account
+                payee = self
+            payee.receive_transfer(tid, amount)  # pass tid and amount into receive_transfer method
+            self.update_details()
+        return tid
+
+    def _debit(self, tid, amount):
+        """method to remove funds once the transaction has been recorded"""
+        account_cache.discard(self._acc_number)  # left out of the cache until it is written
+        self._transactions.append(str(tid))  # append id to transactions list to link to the account
+        self._funds = self._funds - amount  # remove funds as requested from account
+        self._add_debit()
+
+    def _credit(self, tid, amount):
+        """method to add funds once the transaction has been recorded"""
+        account_cache.discard(self._acc_number)  # left out of the cache until it is written
+        if not self._transactions or self._transactions[-1] != str(tid):  # a transfer to the same account is already linked
+            self._transactions.append(str(tid))  # append id to transactions list to link to the account
+        self._funds = self._funds + amount  # add funds as requested to account
+
+    def _add_debit(self):
+        """method called after money is taken out by a withdrawal or transfer. account types that
+        limit how often money can be taken out record it here"""
+        pass
+
+    @metrics.timed("account.transactions")
+    def transactions(self, start=None, end=None, kinds=None, min_amount=None, max_amount=None, after=None):
+        """generator returning the list of details of each transaction of the account that matches
+        the filters, in transaction id order. start and end are the first and last dates to include,
+        kinds is a list of transaction types and after is the id of the last transaction already seen.
+        the ledger index is used to read only the transactions of this account, and each one is only
+        read when the caller asks for the next, so a caller that stops early reads no further"""
+        tids = self._transactions
+        if after is not None:
+            tids = [tid for tid in tids if tid.isdigit() and int(tid) > int(after)]
+        start = None if start is None else str(start)  # dates are compared in the YYYY-MM-DD form of the ledger
+        end = None if end is None else str(end)
+        min_amount = None if min_amount is None else cents(min_amount)
+        max_amount = None if max_amount is None else cents(max_amount)
+        for t_details in ledger.read(tids, start, end):
+            if start is not None and t_details[4] < start:
+                continue
+            if end is not None and t_details[4] > end:
+                continue
+            if kinds is not None and t_details[1] not in kinds:
+                continue
+            if min_amount is not None and cents(t_details[3]) < min_amount:
+                continue
+            if max_amount is not None and cents(t_details[3]) > max_amount:
+                continue
+            yield t_details
+
+    @metrics.timed("account.statement")
+    def statement(self, start=None, end=None, kinds=None, min_amount=None, max_amount=None):
+        """method returning the list of details of each transaction associated to the account
+        that matches the filters"""
+        return list(self.transactions(start, end, kinds, min_amount, max_amount))
+
+    def statement_page(self, limit=20, after=None, start=None, end=None, kinds=None, min_amount=None, max_amount=None):
+        """method returning one page of the statement and the cursor of the next page. the cursor is
+        the id of the last transaction on the page, passed as after to get the next page, and None
+        when there are no more. reading stops at the first transaction past the page"""
+        page = []
+        for t_details in self.transactions(start, end, kinds, min_amount, max_amount, after):
+            if len(page) == limit:
+                return page, page[-1][0]
+            page.append(t_details)
+        return page, None
+
+    @metrics.timed("account.view_transactions")
+    def view_transactions(self, start=None, end=None, kinds=None, min_amount=None, max_amount=None):
+        """method to print transactions associated to the account. they are printed as they are read"""
+        shown = False
+        for t_details in self.transactions(start, end, kinds, min_amount, max_amount):
+            if not shown:
+                print("Transfer ID      Type         IBAN          Amount        Date")
+                print(60*"-")
+                shown = True
+            print("{:15s}{:15s}{:15s}{:15s}{:15s}".format(t_details[0], t_details[1], t_details[2], t_details[3], t_details[4]))
+        if not shown:
+            print("No transactions available")
+
+    def get_details(self):
+        """get method for retrieving the list of account details in the order they are written
+        to the accounts.txt file"""
+        return [str(self._acc_number), self._name, self.IBAN, str(self._funds), self.get_transactionlist()]
+
+    @metrics.timed("account.update_details")
+    def update_details(self):
+        """method to write all the object details back to the account txt file.
+        The account store replaces the outdated details with the current running object
+        and writes the accounts file from memory. The object is kept in the account cache
+        with the details written"""
+        details = self.get_details()
+        account_store.update(details)
+        account_cache.put(self, details)
+
+    def __str__(self):
+        """str method for when class is called to print"""
+        result = "Account Number: {:6s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._name, self.IBAN)
+        return result
+
+
+class SavingsAccount(Account):
+    """An account type object inheriting from the Account class. It defines a SavingsAccount.
+    Works the same as the Account class except there is a limit of 1 withdrawal/transfer
+    transaction per month"""
+    __slots__ = ("_acctype", "_debits")
+    limit = 1  # number of withdrawals/transfers allowed in a month
+    window = 12  # number of recent withdrawal/transfer dates kept with the account
+
+    def __init__(self, acc_number, acctype, name, IBAN, funds, transactions="None", debits=None):
+        Account.__init__(self, acc_number, name, IBAN, funds, transactions)
+        self._acctype = acctype
+        # dates of the most recent withdrawals/transfers. they are saved with the account so the
+        # monthly limit can be checked without reading the transactions file
+        if debits is None:  # account line from before the dates were saved
+            self._debits = self._find_debits()
+        elif debits == "None":
+            self._debits = []
+        else:
+            self._debits = debits.strip().split(",")
+
+    def _find_debits(self):
+        """method to find the withdrawal/transfer dates of the account from its own transactions
+        in the ledger. only used once for accounts that don't have the dates saved yet"""
+        return debit_dates(ledger, self.IBAN, self._transactions, self.window)
+
+    def get_type(self):
+        """get method for returning the account type"""
+        return self._acctype
+
+    def get_debitlist(self):
+        """get method for formatting the withdrawal/transfer dates into a writeable string"""
+        if not self._debits:
+            return "None"
+        return ",".join(self._debits)
+
+    def limit_reached(self):
+        """method to check if the withdrawal/transfer limit for the current month has been used up.
+        The saved dates are compared with the current year and month"""
+        month = datetime.date.today().strftime("%Y-%m")
+        debits = 0
+        for date in self._debits:
+            if date[:7] == month:
+                debits += 1
+        return debits >= self.limit
+
+    def _add_debit(self):
+        """method to record today's date as a withdrawal/transfer. only the most recent dates are kept
+        so the saved list doesn't keep growing"""
+        self._debits.append(str(datetime.date.today()))
+        del self._debits[:-self.window]
+
+    def check_withdraw(self, amount):
+        """the same as check_withdraw from Account class but with added validation.
+        The withdrawal/transfer dates saved with the account are compared with the current month.
+        If the limit has been reached then the method will not proceed"""
+        if self.limit_reached():
+            raise LimitExceededError("Savings accounts are restricted to only one withdrawal or transfer per month. "
+                                     "Your limit of " + str(self.limit) + " has already been exceeded")
+        Account.check_withdraw(self, amount)
+
+    def check_transfer(self, amount):
+        """same as check_transfer from account class but with added validation for the monthly limit"""
+        if self.limit_reached():
+            raise LimitExceededError("Savings accounts are restricted to only one withdrawal or transfer per month. "
+                                     "Your limit of " + str(self.limit) + " has already been exceeded")
+        Account.check_transfer(self, amount)
+
+    def __str__(self):
+        result = "Account Number: {:6s} Type: {:10s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._acctype, self._name, self.IBAN)
+        return result
+
+    def get_details(self):
+        return [str(self._acc_number), self._acctype, self._name, self.IBAN, str(self._funds),
+                self.get_transactionlist(), self.get_debitlist()]
+
+    @metrics.timed("account.update_details")
+    def update_details(self):
+        details = self.get_details()
+        account_store.update(details)
+        account_cache.put(self, details)
+
+
+class CheckingAccount(Account):
+    """An account type subclass of account. Everything is the same except for some formatting and the added credit limit"""
+    __slots__ = ("_acctype", "_creditlimit")
+
+    def __init__(self, acc_number, acctype, name, IBAN, funds, transactions="None", creditlimit=-1000):
+        Account.__init__(self, acc_number, name, IBAN, funds, transactions)
+        self._acctype = acctype
+        self._creditlimit = Money.parse(creditlimit)  # specified credit limit for negative balance
+
+    def get_type(self):
+        return self._acctype
+
+    def get_limit(self):
+        return self._creditlimit
+
+    def check_withdraw(self, amount):
+        if amount <= 0:
+            raise InvalidAmountError("You can only withdraw a positive value")  # error validation for negative withdraw values
+        if amount > abs(self._creditlimit) + self._funds:
+            # error checking for not enough funds with credit limit added on for the checking account
+            raise InsufficientFundsError("You have insufficient funds to withdraw the requested amount")
+
+    def check_transfer(self, amount):
+        if amount <= 0:
+            raise InvalidAmountError("You can only transfer a positive value")  # error validation for negative transfer values
+        if amount > abs(self._creditlimit) + self._funds:
+            # error checking for not enough funds with credit limit added on for the checking account
+            raise InsufficientFundsError("You have insufficient funds to transfer the requested amount")
+
+    def __str__(self):
+        result = "Account Number: {:6s} Type: {:10s} Name: {:10s} IBAN: {:16s}".format(self._acc_number, self._acctype, self._name, self.IBAN)
+        return result
+
+    def get_details(self):
+        return [str(self._acc_number), self._acctype, self._name, self.IBAN, str(self._funds),
+                self.get_transactionlist(), str(self._creditlimit)]
+
+    @metrics.timed("account.update_details")
+    def update_details(self):  # method to write all the object details back to the account txt file
+        details = self.get_details()
+        account_store.update(details)
+        account_cache.put(self, details)
+
+
+class AccountProxy(object):
+    """Stand in for an account of a logged in customer. Only the account number is known until
+    something else about the account is needed, then the account is taken from the cache and
+    everything is passed on to the account object, so logging in doesn't read any accounts and an
+    operation only reads the accounts it uses"""
+    def __init__(self, acc_number):
+        self._acc_number = str(acc_number)
+        self._account = None
+
+    def get_acc(self):
+        return self._acc_number
+
+    def loaded(self):
+        """method to check if the account has been read"""
+        return self._account is not None
+
+    def load(self):
+        """method returning the account object, reading it from the store the first time"""
+        if self._account is None:
+            account = account_cache.get(self._acc_number)
+            if account is None:
+                raise AccountNotFoundError("Account does not exist")
+            self._account = account
+        return self._account
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __str__(self):
+        return str(self.load())
+
+
+class Customer(object):
+    """General Bank Customer class with private attributes and composition for accounts"""
+    @metrics.timed("customer.load")
+    def __init__(self, customerid, pin, firstname, lastname, age, accounts="None"):
+        self.__customerid = customerid
+        self.__PIN = pin  # private pin for customer login
+        self.__firstname = firstname
+        self.__lastname = lastname
+        self.__age = age
+        if accounts == "None" or accounts == ["None"]:
+            self.__accounts = []
+        else:
+            # accounts are only read from the store when they are used
+            self.__accounts = [AccountProxy(acc_number) for acc_number in accounts if acc_number]
+
+    def __str__(self):
+        result = "Customer ID: " + self.__customerid + "\n" + "Firstname" + self.__firstname + "\n" + "Lastname: " + \
+                 self.__lastname + "\n" + "Age: " + self.__age + "\n"
+        return result
+
+    def get_custno(self):
+        return self.__customerid
+
+    def check_pin(self, pin):
+        """method to check the PIN entered at login"""
+        return self.__PIN == pin
+
+    def get_name(self):
+        return self.__firstname
+
+    def get_accounts(self):
+        return self.__accounts
+
+    def used_accounts(self):
+        """method returning the accounts that have been read since login. the others can't have been changed"""
+        return [acc for acc in self.__accounts if not isinstance(acc, AccountProxy) or acc.loaded()]
+
+    def get_accountlist(self):
+        """same as get_transactionslist from account class"""
+        accountlist = ''  # format the transaction list into a writeable string
+        for t, l in enumerate(self.__accounts):
+            if t == (len(self.__accounts) - 1):  # end of line to not append a comma
+                accountlist += str(self.__accounts[t].get_acc())
+            else:
+                accountlist += str(self.__accounts[t].get_acc()) + ","  # separate each element(transaction id) with a comma
+        return accountlist
+
+    @metrics.timed("customer.new_account")
+    def new_account(self, name, acctype):
+        """method for creating new account for customer object. error checking is done
+        and then a new account number and IBAN is calculated. The new account object is then created and
+        linked to the current customer instance"""
+        return self.new_accounts([(name, acctype)])[0]
+
+    @metrics.timed("customer.new_accounts")
+    def new_accounts(self, accounts):
+        """method for opening several accounts at once from a list of (name, acctype). the account
+        numbers follow on from the last one and the IBANs are handed out in one call, so opening a
+        batch of accounts costs the same per account as opening one. returns the new account objects"""
+        if int(self.__age) < 18 and any(acctype == "2" for name, acctype in accounts):
+            raise AgeRestrictionError("Customer Age is not above 18 for a checking account")
+        if any(acctype not in ("1", "2") for name, acctype in accounts):
+            raise BankError("Not a valid account type")
+        opened = []
+        with account_store.lock():  # no other program can take the same numbers or IBANs until the accounts are added
+            aid = account_store.next_number()  # new account number id
+            try:
+                IBANs = iban_allocator.reserve(len(accounts))
+            except LookupError:
+                raise BankError("There are no IBANs left for new accounts")
+            for (name, acctype), IBAN in zip(accounts, IBANs):
+                match acctype:  # switch statement equivalent from c
+                    case "1":  # creating a new SavingsAccount
+                        account = SavingsAccount(str(aid), "savings", name, IBAN, 0, "None", "None")
+                    case "2":  # creating a new CheckingAccount
+                        account = CheckingAccount(str(aid), "checking", name, IBAN, 0, "None", -1000)
+                account_store.add(account.get_details())  # account line is appended to the accounts file
+                opened.append(account)
+                aid += 1
+        self.__accounts.extend(opened)
+        return opened
+
+    def find_account(self, acc_number):
+        """method for retrieving one of the customer's accounts by account number"""
+        for acc in self.__accounts:
+            if acc.get_acc() == str(acc_number):
+                return acc
+        raise AccountNotFoundError("Account does not exist")
+
+    def reload_account(self, acc_number):
+        """method to get one of the customer's accounts again from the account cache, which checks it
+        against the store. used when the account was changed through another object, like the payee
+        of a transfer"""
+        for i, acc in enumerate(self.__accounts):
+            if acc.get_acc() == str(acc_number):
+                account = account_cache.get(acc_number)  # only created again if the details have changed
+                if account is None:
+                    raise AccountNotFoundError("Account does not exist")
+                self.__accounts[i] = account
+
+    def get_details(self):
+        """get method for retrieving the list of customer details in the order they are written
+        to the customers.txt file"""
+        return [str(self.__customerid), self.__PIN, self.__firstname, self.__lastname, str(self.__age),
+                self.get_accountlist()]
+
+    @metrics.timed("customer.delete_account")
+    def delete_account(self):
+        """method for deleting customer's account. The account is already delinked from the customer and
+        so the customer details must be updated using the new account list"""
+        customer_store.update(self.get_details())
+
+    @metrics.timed("customer.update_details")
+    def update_details(self):
+        """method to write all the object details back to the account and customer txt file"""
+        with backend.transaction():
+            for acc in self.used_accounts():  # replace the details of every account of the customer that was used
+                account_store.put(acc.get_details())
+            account_store.save()  # changed accounts are written once for all the accounts
+            customer_store.update(self.get_details())
+
+
+class Bank(object):
+    """Headless interface to the bank for one customer session. Operations return their results
+    instead of printing them and raise a BankError when they can't go ahead, so the menu and any
+    other program can use the same methods"""
+    def __init__(self):
+        open_bank()
+        self._customer = None  # customer logged in to the session
+
+    def customer_exists(self, customerid):
+        """method to check if a customer id exists"""
+        return customerid in customer_store
+
+    @metrics.timed("bank.login")
+    def login(self, customerid, pin):
+        """method to begin a session. the customer's accounts are read from the store when they are first used"""
+        details = customer_store.get(customerid)  # list of customer details
+        if details is None:
+            raise LoginError("Customer ID does not exist")
+        if details[1] != pin:
+            raise LoginError("PIN incorrect")
+        accounts = details[5].strip().split(",")  # convert account numbers string to list
+        self._customer = Customer(details[0], details[1], details[2], details[3], details[4], accounts)
+        return self._customer
+
+    @metrics.timed("bank.logout")
+    def logout(self):
+        """method to end the session. all details are updated before the session ends"""
+        if self._customer is not None:
+            acc_numbers = [acc.get_acc() for acc in self._customer.used_accounts()]
+            with account_locks.hold(acc_numbers), backend.transaction():
+                for acc_number in acc_numbers:
+                    self._fresh(acc_number)
+                self._customer.update_details()
+            self._customer = None
+
+    def get_customer(self):
+        if self._customer is None:
+            raise LoginError("Not logged in")
+        return self._customer
+
+    def accounts(self):
+        """method returning the account objects of the logged in customer"""
+        return list(self.get_customer().get_accounts())
+
+    def account(self, acc_number):
+        """method returning one of the logged in customer's accounts by account number"""
+        return self.get_customer().find_account(acc_number)
+
+    def _fresh(self, acc_number):
+        """method returning one of the customer's accounts checked again against the store, as another
+        session or program may have changed it. the lock of the account is held by the caller, and
+        operations that change the account hold backend.transaction() too. batches and recovery change
+        accounts holding only that lock, so the account is read inside it or a change they write
+        between the read and the update would be written over"""
+        customer = self.get_customer()
+        customer.find_account(acc_number)  # raises an error if it isn't the customer's account
+        account_store.refresh()
+        customer.reload_account(acc_number)
+        return customer.find_account(acc_number)
+
+    def balance(self, acc_number):
+        with account_locks.hold([acc_number]):
+            return self._fresh(acc_number).get_balance()
+
+    @metrics.timed("bank.deposit")
+    def deposit(self, acc_number, amount):
+        """method to deposit money. returns the transaction id and the new balance"""
+        # the transaction and the new balance are written together
+        with account_locks.hold([acc_number]), backend.transaction():
+            account = self._fresh(acc_number)
+            tid = account.deposit(to_amount(amount))
+            account.update_details()
+        return {"tid": tid, "account": account.get_acc(), "balance": account.get_balance()}
+
+    @metrics.timed("bank.withdraw")
+    def withdraw(self, acc_number, amount):
+        """method to withdraw money. returns the transaction id and the new balance"""
+        # the transaction and the new balance are written together
+        with account_locks.hold([acc_number]), backend.transaction():
+            account = self._fresh(acc_number)
+            tid = account.withdraw(to_amount(amount))
+            account.update_details()
+        return {"tid": tid, "account": account.get_acc(), "balance": account.get_balance()}
+
+    @metrics.timed("bank.transfer")
+    def transfer(self, acc_number, amount, IBAN):
+        """method to transfer money to the account with the passed IBAN. returns the transaction id
+        and the new balance. the locks of both accounts are held"""
+        account_store.refresh()
+        payee = account_store.find_iban(IBAN)
+        acc_numbers = [acc_number]
+        if payee is not None:
+            acc_numbers.append(payee[0])
+        with account_locks.hold(acc_numbers), backend.transaction():
+            account = self._fresh(acc_number)
+            tid = account.transfer(to_amount(amount), IBAN)
+            if payee is not None and payee[0] != account.get_acc():
+                self._customer.reload_account(payee[0])  # in case the payee is another account of the customer
+        return {"tid": tid, "account": account.get_acc(), "balance": account.get_balance()}
+
+    @metrics.timed("bank.statement")
+    def statement(self, acc_number, start=None, end=None, kinds=None, min_amount=None, max_amount=None):
+        """method returning the transactions of an account as a list of dictionaries. the filters
+        are the same as Account.transactions"""
+        with account_locks.hold([acc_number]):
+            transactions = self._fresh(acc_number).statement(start, end, kinds, min_amount, max_amount)
+        return [statement_row(t_details) for t_details in transactions]
+
+    @metrics.timed("bank.statement_page")
+    def statement_page(self, acc_number, limit=20, after=None, start=None, end=None, kinds=None,
+                       min_amount=None, max_amount=None):
+        """method returning one page of an account's transactions as a dictionary with the list of
+        transactions and the cursor to pass as after for the next page, None on the last page"""
+        try:
+            limit = int(limit)
+            if after is not None:
+                after = int(after)
+        except (TypeError, ValueError):
+            raise BankError("Not a valid page")
+        if limit <= 0:
+            raise BankError("Not a valid page")
+        with account_locks.hold([acc_number]):
+            page, cursor = self._fresh(acc_number).statement_page(limit, after, start, end, kinds,
+                                                                  min_amount, max_amount)
+        return {"transactions": [statement_row(t_details) for t_details in page], "next": cursor}
+
+    def open_account(self, name, acctype):
+        """method to open a new account for the customer. acctype is "1" or "savings" for a savings account
+        and "2" or "checking" for a checking account. returns the new account object"""
+        acctype = {"savings": "1", "checking": "2"}.get(acctype, acctype)
+        if acctype not in ("1", "2"):
+            raise BankError("Not a valid account type")
+        check_name(name)
+        customer = self.get_customer()
+        with backend.transaction():
+            account = customer.new_account(name, acctype)
+            customer_store.update(customer.get_details())  # link the new account to the customer
+        return account
+
+    def open_accounts(self, accounts):
+        """method to open several accounts for the customer from a list of (name, acctype). returns
+        the new account objects"""
+        accounts = [(name, {"savings": "1", "checking": "2"}.get(acctype, acctype)) for name, acctype in accounts]
+        for name, acctype in accounts:
+            check_name(name)
+        customer = self.get_customer()
+        with backend.transaction():
+            opened = customer.new_accounts(accounts)
+            customer_store.update(customer.get_details())  # link the new accounts to the customer
+        return opened
+
+    def delete_account(self, acc_number):
+        """method to delink an account from the customer"""
+        customer = self.get_customer()
+        customer.get_accounts().remove(customer.find_account(acc_number))
+        customer.delete_account()
+
+
+def main():
+    """Function for program start. Calls the menu function"""
+    print("Welcome to Kieran's Bank\n")  # welcome the user
+    while input("Hit 'Enter' to login") != "":
+        pass
+    bank = Bank()
+    while True:  # prompt user login and check if details are correct
+        id = input("\nCustomer ID: ")
+        if not bank.customer_exists(id):
+            print("Customer ID does not exist, Please Try Again")
+            continue
+        while True:
+            pin = input("PIN: ")
+            if pin == "q":
+                break
+            try:
+                bank.login(id, pin)
+            except LoginError:
+                print("PIN incorrect. Try Again or 'q' to quit")
+                continue
+            menu(bank)  # proceed into menu function to begin session
+            break
+
+        print("Session Ended. Thank You")
+        break
+
+
+def create_account(acc):
+    """function for creating the appropriate account object from a list of account details
+    by checking the type"""
+    if acc[1] == "savings":
+        if len(acc) > 6:
+            return SavingsAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5], acc[6])
+        return SavingsAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5])
+    return CheckingAccount(acc[0], acc[1], acc[2], acc[3], acc[4], acc[5], acc[6])
+
+
+# account objects are kept between operations, up to BANK_ACCOUNT_CACHE of them, so accounts used often
+# are not created from their details again unless the store has changed them
+account_cache = AccountCache(account_store, create_account, int(os.environ.get("BANK_ACCOUNT_CACHE", "1024")))
+
+
+def statement_row(t_details):
+    """function for converting the list of details of a transaction into a dictionary"""
+    return {"tid": t_details[0], "type": t_details[1], "IBAN": t_details[2], "amount": t_details[3],
+            "date": t_details[4]}
+
+
+def check_name(name):
+    """function for checking an account name can be kept in the files. the details of an account are
+    separated by _ and lists in them by commas, one account to a line, so a name with any of them would
+    change the record. raises InvalidInputError for a name that can't be used"""
+    if not isinstance(name, str) or not name.strip():
+        raise InvalidInputError("The account name can't be empty")
+    if "_" in name or "," in name or not name.isprintable():  # isprintable is False for line breaks
+        raise InvalidInputError("The account name can't have _, commas or line breaks in it")
+    if len(name.encode()) > BinaryAccountStore.NAME:  # the most a binary account record holds
+        raise InvalidInputError("Account name too long, it can be up to %d characters" % BinaryAccountStore.NAME)
+
+
+def to_amount(amount):
+    """function for converting an amount in units, with up to two decimal places, to Money"""
+    try:
+        amount = Money.parse(amount)
+    except (TypeError, ValueError):
+        raise InvalidAmountError("Not a valid number")
+    if abs(amount) > LIMIT:  # would not fit the binary and database stores
+        raise InvalidAmountError("Not a valid number, amounts can be up to " + str(Money(LIMIT)))
+    return amount
+
+
+@metrics.timed("calculate_tid")
+def calculate_tid():
+    """function for calculating the new transaction id. the id comes from the transaction id
+    allocator so the transactions file no longer has to be counted"""
+    return tid_allocator.next()
+
+
+def choose_account(bank, prompt):
+    """function for showing the customer's accounts and prompting for one of them. returns the account number"""
+    while True:  # error loop
+        print(30 * "-")
+        accounts = bank.accounts()  # assign accounts into an accounts list
+        for i, l in enumerate(accounts):
+            print(i + 1, ")", accounts[i])  # show accounts
+        while True:
+            index = input(prompt)
+            try:
+                index = int(index)
+            except ValueError:
+                print("Not a valid option")
+                continue
+            break
+        if int(index) not in range(1, len(accounts) + 1):
+            print("Not a valid option")
+            continue
+        return accounts[index - 1].get_acc()
+
+
+def input_amount(prompt):
+    """function for prompting for an amount of money"""
+    while True:
+        amount = input(prompt)
+        try:
+            amount = Money.parse(amount)
+        except ValueError:
+            print("Not a valid number")
+            continue
+        return amount
+
+
+def input_date(prompt):
+    """function for prompting for a date. None if nothing is entered"""
+    while True:
+        date = input(prompt).strip()
+        if not date:
+            return None
+        try:
+            return datetime.date.fromisoformat(date)
+        except ValueError:
+            print("Not a valid date")
+
+
+def menu(bank):
+    """menu function for displaying all the options that access the methods of the bank"""
+    customer = bank.get_customer()
+    while True:
+        print("Welcome", customer.get_name())  # main menu options format
+        print(30*"-")
+        print("1)\tCreate New Account")
+        print("2)\tView Transactions")
+        print("3)\tBalance")
+        print("4)\tDeposit")
+        print("5)\tWithdraw")
+        print("6)\tTransfer")
+        print("7)\tDelete an Account")
+        print("8)\tExit")
+        try:
+            user_choice = int(input("Select a menu option: "))
+        except ValueError:
+            user_choice = 0
+        try:
+            match user_choice:  # C switch statement equivalent for each menu option (NOTE: Python 3.10 required)
+                case 1:  # Create New Account
+                    while True:  # loop for error validation
+                        print(30*"-")
+                        print("1) Savings Account")
+                        print("2) Checking Account")
+                        type = str(input("What type of account would you like to create?:"))
+                        if type not in ["1", "2"]:
+                            print("Not a valid option")
+                            continue  # reloop and prompt again
+                        break  # break out loop and proceed
+                    name = input("What name would you like for your account?\n")
+                    account = bank.open_account(name, type)
+                    print("Account created successfully")
+                    print(account)
+
+                case 2:  # View Transactions
+                    acc_number = choose_account(bank, "Which account's transactions would you like to view?")
+                    start = input_date("From date (YYYY-MM-DD, Enter for the first): ")
+                    end = input_date("To date (YYYY-MM-DD, Enter for the last): ")
+                    kind = input("Type (deposit/withdraw/transfer, Enter for all): ").strip().lower()
+                    kinds = [kind] if kind else None
+                    page = bank.statement_page(acc_number, 20, None, start, end, kinds)  # one page read at a time
+                    if not page["transactions"]:
+                        print("No transactions available")
+                        continue
+                    print("Transfer ID      Type         IBAN          Amount        Date")
+                    print(60*"-")
+                    while True:
+                        for t in page["transactions"]:
+                            print("{:15s}{:15s}{:15s}{:15s}{:15s}".format(t["tid"], t["type"], t["IBAN"], t["amount"], t["date"]))
+                        if page["next"] is None or input("Enter for more or 'q' to stop: ") == "q":
+                            break
+                        page = bank.statement_page(acc_number, 20, page["next"], start, end, kinds)
+
+                case 3:  # Balance
+                    acc_number = choose_account(bank, "Which account balance would you like to view?")
+                    print("Balance :", bank.balance(acc_number))
+
+                case 4:  # Deposit
+                    acc_number = choose_account(bank, "Which account would you like to deposit money in?")
+                    amount = input_amount("How much would you like to deposit? (up to two decimal places)")
+                    bank.deposit(acc_number, amount)
+
+                case 5:  # Withdraw
+                    acc_number = choose_account(bank, "Which account would you like to withdraw money from?")
+                    amount = input_amount("How much would you to like withdraw? (up to two decimal places)\n")
+                    bank.withdraw(acc_number, amount)
+
+                case 6:  # Transfer
+                    acc_number = choose_account(bank, "Which account would you like to transfer money from?\n")
+                    amount = input_amount("How much would you to like transfer? (up to two decimal places)\n")
+                    iban = input("IBAN for the money to be transferred to:\n")
+                    bank.transfer(acc_number, amount, iban)
+
+                case 7:  # Delete an Account
+                    acc_number = choose_account(bank, "Which account would you like to delete?")
+                    bank.delete_account(acc_number)  # account is delinked from the customer
+
+                case 8:  # Exit
+                    print(30 * "-")
+                    bank.logout()  # all details updated before program exit
+                    return  # return back to main where the program ends
+                case _:
+                    print("not a valid option\n")
+                    continue
+        except BankError as error:  # operation couldn't go ahead so the reason is shown to the user
+            print(error)
+
+
+# begin program
+if __name__ == "__main__":
+    main()
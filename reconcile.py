@@ -0,0 +1,256 @@
+# CA2 OOP - Bank Management System
+# check of every account's balance against the sum of its transactions in the ledger
+import os
+import mmap
+import struct
+import argparse
+import tempfile
+import collections
+import multiprocessing
+from money import Money, cents
+from storage import TextBackend
+from archive import block_lines
+from project import backend, account_store, ledger, open_bank
+
+SLOT = struct.Struct("<qq")  # amount in cents and payee account number of a transfer without its payer, by id
+
+
+def _add(totals, unpaid, transaction):
+    """function for adding one ledger line to the signed totals in cents of the IBANs it pays into or out of.
+    a transfer written before the payer was kept on the line is added to unpaid instead, as the
+    payer is only known from the transactions of the accounts"""
+    if len(transaction) < 5 or not transaction[0].isdigit():
+        return False
+    try:
+        amount = cents(transaction[3])
+    except ValueError:  # line spoilt by a crash
+        return False
+    kind = transaction[1]
+    if kind in TextBackend.CREDITS:
+        totals[transaction[2]] += amount
+    elif kind in TextBackend.DEBITS:
+        totals[transaction[2]] -= amount
+    elif kind == "transfer":
+        totals[transaction[2]] += amount
+        if len(transaction) > 5:
+            totals[transaction[5]] -= amount
+        else:
+            unpaid.append((int(transaction[0]), transaction[2], amount))
+    return True
+
+
+def _sum(task):
+    """function run by the workers for one part of a ledger file, from the first line starting at or
+    after start to the last one starting before end. lines with ids up to floor are in the archive
+    and are skipped. returns the total of each IBAN, the number of transactions and the transfers
+    without their payer"""
+    filename, start, end, floor = task
+    totals = collections.defaultdict(int)
+    unpaid = []
+    count = 0
+    with open(filename, "rb") as t_reader:
+        if start > 0:
+            t_reader.seek(start - 1)
+            t_reader.readline()  # the line going over start is read by the part before
+        position = t_reader.tell()
+        while position < end:
+            line = t_reader.readline()
+            if not line:
+                break
+            position += len(line)
+            transaction = line.decode().strip().split("_")
+            if floor and transaction[0].isdigit() and int(transaction[0]) <= floor:
+                continue
+            if _add(totals, unpaid, transaction):
+                count += 1
+    return dict(totals), count, unpaid
+
+
+def _sum_block(task):
+    """function run by the workers for one compressed block of the archive. returns the same as _sum"""
+    filename, block = task
+    totals = collections.defaultdict(int)
+    unpaid = []
+    count = 0
+    for line in block_lines(filename, block):
+        if _add(totals, unpaid, line.decode().split("_")):
+            count += 1
+    return dict(totals), count, unpaid
+
+
+def _complete(filename):
+    """function returning the size of a file up to the end of its last whole line, so a line being
+    appended by another program is left for later"""
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as t_reader:
+        t_reader.seek(max(0, size - 4096))
+        data = t_reader.read(size)
+    return size - len(data) + data.rfind(b"\n") + 1
+
+
+class Reconciliation(object):
+    """Reads the ledger once and compares each account's balance with the sum of its deposits,
+    withdrawals, transfers, interest and fees.
+
+    The ledger files are cut into parts of chunk bytes and worker processes each read a part from
+    the file themselves and add up the amounts of every IBAN in it, so only the totals are passed
+    back. Each block of the archive of old transactions is a part as well. Only a few parts are
+    handed out ahead of the results, so memory depends on the number of accounts and not on the
+    length of the ledger. Programs carry on using the bank while the ledger is read. Then, holding the accounts lock, the lines written in the meantime are added and the
+    balances compared, so the accounts and the ledger are the same point in time.
+
+    Transfers from before the payer was written on the line only name the payee. The payer is the
+    other account with the transaction in its list, so the amount and payee of each one are kept in
+    a temporary file of slots by id and looked up when the accounts are gone through. A transfer
+    like that to the same account is only in the list of the account, so one that no other account
+    paid was paid by the account itself and comes to nothing, like a transfer to the same account
+    with its payer on the line"""
+    def __init__(self, workers=None, chunk=1 << 26):
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.chunk = chunk  # bytes of a ledger file read by a worker at a time
+        self.transactions = 0  # ledger lines read
+        self.accounts = 0  # accounts compared
+        self._totals = collections.Counter()  # IBAN -> signed total of its transactions
+        self._unpaid = None  # slot file of transfers without their payer
+        self._last_unpaid = 0  # highest id in the slot file
+
+    def _merge(self, result):
+        totals, count, unpaid = result
+        self._totals.update(totals)
+        self.transactions += count
+        if unpaid and self._unpaid is None:
+            self._unpaid = tempfile.TemporaryFile()
+        for tid, IBAN, amount in unpaid:
+            payee = account_store.find_iban(IBAN)
+            payee = int(payee[0]) if payee is not None else 0
+            os.pwrite(self._unpaid.fileno(), SLOT.pack(amount, payee), tid * SLOT.size)
+            self._last_unpaid = max(self._last_unpaid, tid)
+
+    def _read(self, parts):
+        """method to add up parts of the ledger in the worker processes. parts are the function
+        adding one up and its task. results are merged in the order they come back and at most two
+        parts per worker are waiting at a time"""
+        if self.workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for function, part in parts:
+                self._merge(function(part))
+            return
+        with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+            pending = collections.deque()
+            for function, part in parts:
+                pending.append(pool.apply_async(function, (part,)))
+                if len(pending) >= self.workers * 2:
+                    self._merge(pending.popleft().get())
+            while pending:
+                self._merge(pending.popleft().get())
+
+    def _parts(self, sizes, floor):
+        archive = getattr(ledger, "archive", None)
+        if archive is not None:  # each compressed block is a part
+            for block in archive.blocks():
+                yield _sum_block, (archive.data_file(), block)
+        for filename, size in sizes.items():
+            for start in range(0, size, self.chunk):
+                yield _sum, (filename, start, min(start + self.chunk, size), floor)
+
+    @staticmethod
+    def _check(found, acc, total):
+        """method to add an account to the found list if its balance isn't its total"""
+        balance = Money.parse(acc[4])
+        if total != balance:
+            found.append({"account": acc[0], "IBAN": acc[3], "balance": balance, "ledger": Money(total),
+                          "difference": balance - total})
+
+    def _compare(self):
+        """method to compare every account with its total. returns the accounts that don't match"""
+        slots = None
+        if self._unpaid is not None:
+            self._unpaid.flush()
+            slots = mmap.mmap(self._unpaid.fileno(), 0, access=mmap.ACCESS_READ)
+        found = []
+        paid = bytearray(self._last_unpaid // 8 + 1)  # bit of each transfer without its payer that an account paid
+        own = []  # [account, total, [(id, amount)]] of accounts with transfers to themselves nobody else may have paid
+        for acc in account_store:
+            self.accounts += 1
+            total = self._totals.pop(acc[3], 0)
+            received = []
+            if slots is not None and acc[5] != "None":
+                for tid in acc[5].split(","):
+                    if tid.isdigit() and int(tid) <= self._last_unpaid:
+                        amount, payee = SLOT.unpack_from(slots, int(tid) * SLOT.size)
+                        if not amount:
+                            continue
+                        if payee != int(acc[0]):  # this account paid it
+                            total -= amount
+                            paid[int(tid) >> 3] |= 1 << (int(tid) & 7)
+                        else:
+                            received.append((int(tid), amount))
+            if received:
+                own.append([acc, total, received])
+            else:
+                self._check(found, acc, total)
+        for acc, total, received in own:
+            for tid, amount in received:
+                if not paid[tid >> 3] & (1 << (tid & 7)):  # no other account paid it, so the account paid itself
+                    total -= amount
+            self._check(found, acc, total)
+        for IBAN, total in self._totals.items():
+            if total:
+                found.append({"account": None, "IBAN": IBAN, "balance": None, "ledger": Money(total),
+                              "difference": None})
+        if slots is not None:
+            slots.close()
+        return found
+
+    def run(self):
+        """method to reconcile every account. returns a list of dictionaries with the account number,
+        IBAN, balance, ledger total and difference of the accounts that don't match. IBANs in the
+        ledger that no account has are listed with an account number of None"""
+        open_bank()
+        files = ledger.files() if hasattr(ledger, "files") else None
+        floor = ledger.archive.last_tid() if hasattr(ledger, "archive") else 0  # ids up to it are read from the archive
+        try:
+            if files is not None:
+                sizes = {filename: _complete(filename) for filename in files}
+                self._read(self._parts(sizes, floor))
+            with backend.transaction():  # no other program changes an account while they are compared
+                backend.recover()  # transactions of a program that crashed while the ledger was read
+                account_store.refresh()
+                if files is None:  # a database. it is read as one here
+                    totals = collections.defaultdict(int)
+                    unpaid = []
+                    count = sum(1 for transaction in ledger if _add(totals, unpaid, transaction))
+                    self._merge((totals, count, unpaid))
+                else:
+                    for filename in ledger.files():
+                        start = sizes.get(filename, 0)
+                        end = os.path.getsize(filename)
+                        if end > start:
+                            self._merge(_sum((filename, start, end, floor)))
+                return self._compare()
+        finally:
+            if self._unpaid is not None:
+                self._unpaid.close()
+                self._unpaid = None
+
+
+def reconcile(workers=None, chunk=1 << 26):
+    """function to reconcile every account with the ledger. returns the reconciliation, with the
+    number of transactions and accounts, and the accounts that don't match"""
+    reconciliation = Reconciliation(workers, chunk)
+    return reconciliation, reconciliation.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every account's balance against the ledger")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, one per core by default")
+    parser.add_argument("--chunk", type=int, default=64, help="megabytes of the ledger read by a worker at a time")
+    args = parser.parse_args()
+    reconciliation, found = reconcile(args.workers, args.chunk << 20)
+    for mismatch in found:
+        if mismatch["account"] is None:
+            print("IBAN", mismatch["IBAN"], "has no account. ledger total", mismatch["ledger"])
+        else:
+            print("Account", mismatch["account"], mismatch["IBAN"], "balance", mismatch["balance"], "ledger total",
+                  mismatch["ledger"], "difference", mismatch["difference"])
+    print(reconciliation.transactions, "transactions read,", reconciliation.accounts, "accounts checked,",
+          len(found), "don't match the ledger")
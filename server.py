@@ -0,0 +1,243 @@
+# CA2 OOP - Bank Management System
+# network front end serving many customer sessions at once over TCP
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from money import Money
+from project import Bank, BankError, InvalidInputError, account_store, open_bank
+
+
+TEXT = (str, int)  # types of the fields holding account numbers, ids and PINs
+AMOUNT = (str, int, float)
+
+
+class SessionLocks(object):
+    """Table of asyncio locks keyed by account number. Operations hold the locks of every account
+    they touch so sessions on the same account queue up in the event loop. Locks are always
+    taken in account number order so a transfer and a transfer back can't wait on each other"""
+    def __init__(self):
+        self._locks = {}  # account number -> lock
+
+    def _lock(self, acc_number):
+        lock = self._locks.get(acc_number)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[acc_number] = lock
+        return lock
+
+    async def acquire(self, acc_numbers):
+        """method to take the locks of the passed accounts. returns the locks to be released"""
+        locks = [self._lock(n) for n in sorted(set(acc_numbers), key=lambda n: (len(n), n))]
+        for i, lock in enumerate(locks):
+            try:
+                await lock.acquire()
+            except BaseException:  # cancelled while waiting so the locks already taken are given back
+                for taken in locks[:i]:
+                    taken.release()
+                raise
+        return locks
+
+    def release(self, locks):
+        for lock in reversed(locks):
+            lock.release()
+
+
+def account_details(account):
+    """function for converting an account object into a dictionary that can be sent as JSON"""
+    details = {"account": account.get_acc(), "name": account.get_name(), "IBAN": account.IBAN,
+               "balance": account.get_balance()}
+    if hasattr(account, "get_type"):
+        details["type"] = account.get_type()
+    return details
+
+
+def plain(result):
+    """function replacing the Money amounts in a result with numbers of units, as JSON would write
+    the cents they are kept in"""
+    if isinstance(result, Money):
+        return result.number()
+    if isinstance(result, dict):
+        return {key: plain(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [plain(value) for value in result]
+    return result
+
+
+def field(request, name, types, default=None):
+    """function returning a field of a request, or default if the request doesn't have it. raises
+    InvalidInputError if the field isn't one of the passed types"""
+    value = request.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise InvalidInputError("Not a valid " + name)
+    return value
+
+
+def filters(request):
+    """function returning the statement filters of a request in the order Bank.statement takes them"""
+    kinds = field(request, "kinds", list)
+    if kinds is not None and not all(isinstance(kind, str) for kind in kinds):
+        raise InvalidInputError("Not a valid kinds")
+    return (field(request, "start", str), field(request, "end", str), kinds, field(request, "min_amount", AMOUNT),
+            field(request, "max_amount", AMOUNT))
+
+
+def new_accounts(request):
+    """function returning the name and type of each account of an open_accounts request"""
+    accounts = field(request, "accounts", list, [])
+    if not all(isinstance(account, dict) for account in accounts):
+        raise InvalidInputError("Not a valid accounts")
+    return [(str(field(account, "name", TEXT)), str(field(account, "type", TEXT))) for account in accounts]
+
+
+class BankServer(object):
+    """asyncio TCP server for the bank. Every connection is its own customer session with a Bank object.
+
+    The protocol is one JSON object per line in each direction. A request has an "op" and the
+    arguments of the matching Bank method, for example
+    {"op": "login", "customer": "1", "pin": "1234"}
+    {"op": "transfer", "account": "1", "amount": 100, "IBAN": "IE57570"}
+    {"op": "open_accounts", "accounts": [{"name": "Rent", "type": "savings"}, {"name": "Bills", "type": "checking"}]}
+    {"op": "statement_page", "account": "1", "limit": 20, "after": 57, "start": "2021-12-01", "kinds": ["deposit"]}
+    and the reply is {"ok": true, "result": ...} or {"ok": false, "error": message, "type": error class}.
+
+    Bank methods read and write files so they are run in worker threads and never block the event
+    loop. The bank takes its own thread and file locks, and the asyncio locks here keep sessions
+    waiting for a busy account from tying up the worker threads"""
+    def __init__(self, host="127.0.0.1", port=8888, workers=4):
+        self._host = host
+        self._port = port
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage")
+        self._locks = SessionLocks()
+        self._server = None
+
+    async def _run(self, function, *args):
+        """method to run a blocking function in a worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _locked(self, bank, acc_numbers, function, *args):
+        """method to run a bank operation while holding the locks of the accounts it touches"""
+        locks = await self._locks.acquire(acc_numbers)
+        try:
+            return await self._run(function, *args)
+        finally:
+            self._locks.release(locks)
+
+    async def handle(self, request, bank):
+        """method to carry out one request for a session and return the result"""
+        op = request.get("op")
+        acc_number = str(field(request, "account", TEXT))
+        match op:
+            case "login":
+                customer = await self._run(bank.login, str(field(request, "customer", TEXT)),
+                                           str(field(request, "pin", TEXT)))
+                return {"customer": customer.get_custno(), "name": customer.get_name()}
+            case "logout":
+                await self.logout(bank)
+                return None
+            case "accounts":
+                acc_numbers = [account.get_acc() for account in bank.accounts()]
+                accounts = await self._locked(bank, acc_numbers, bank.accounts)
+                return [account_details(account) for account in accounts]
+            case "balance":
+                return await self._locked(bank, [acc_number], bank.balance, acc_number)
+            case "statement":
+                return await self._locked(bank, [acc_number], bank.statement, acc_number, *filters(request))
+            case "statement_page":
+                return await self._locked(bank, [acc_number], bank.statement_page, acc_number,
+                                          field(request, "limit", int, 20), field(request, "after", TEXT),
+                                          *filters(request))
+            case "deposit":
+                return await self._locked(bank, [acc_number], bank.deposit, acc_number,
+                                          field(request, "amount", AMOUNT))
+            case "withdraw":
+                return await self._locked(bank, [acc_number], bank.withdraw, acc_number,
+                                          field(request, "amount", AMOUNT))
+            case "transfer":
+                IBAN = str(field(request, "IBAN", TEXT))
+                payee = await self._run(account_store.find_iban, IBAN)
+                acc_numbers = [acc_number]
+                if payee is not None:
+                    acc_numbers.append(payee[0])
+                return await self._locked(bank, acc_numbers, bank.transfer, acc_number,
+                                          field(request, "amount", AMOUNT), IBAN)
+            case "open_account":
+                account = await self._run(bank.open_account, str(field(request, "name", TEXT)),
+                                           str(field(request, "type", TEXT)))
+                return account_details(account)
+            case "open_accounts":
+                opened = await self._run(bank.open_accounts, new_accounts(request))
+                return [account_details(account) for account in opened]
+            case "delete_account":
+                await self._locked(bank, [acc_number], bank.delete_account, acc_number)
+                return None
+            case _:
+                raise BankError("Not a valid operation")
+
+    async def logout(self, bank):
+        """method to end a session. logging out writes all the customer's accounts so their locks are held"""
+        try:
+            acc_numbers = [account.get_acc() for account in bank.accounts()]
+        except BankError:  # not logged in
+            return
+        await self._locked(bank, acc_numbers, bank.logout)
+
+    async def session(self, reader, writer):
+        """method serving one connection until the client disconnects"""
+        bank = Bank()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise InvalidInputError("Not a valid request")
+                    reply = {"ok": True, "result": plain(await self.handle(request, bank))}
+                except BankError as error:
+                    reply = {"ok": False, "error": str(error), "type": type(error).__name__}
+                except (ValueError, TypeError, AttributeError, KeyError) as error:  # a request the checks let through
+                    reply = {"ok": False, "error": "Not a valid request", "type": type(error).__name__}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            await self.logout(bank)  # in case the session ended without logging out
+            writer.close()
+
+    async def start(self):
+        await self._run(open_bank)  # recovery is done before the first session, without blocking the loop
+        self._server = await asyncio.start_server(self.session, self._host, self._port)
+        return self._server
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bank server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    args = parser.parse_args()
+    bank_server = BankServer(args.host, args.port)
+    print("Serving on", args.host, args.port)
+    try:
+        asyncio.run(bank_server.serve_forever())
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        bank_server.close()
@@ -0,0 +1,418 @@
+# CA2 OOP - Bank Management System
+# settlement of a batch file of requests by several processes, each one owning a share of the accounts
+import sys
+import json
+import heapq
+import pickle
+import bisect
+import argparse
+import datetime
+import itertools
+import traceback
+import collections
+import multiprocessing
+from money import Money, cents
+from project import (account_store, tid_allocator, ledger, create_account, open_bank, BankError,
+                     AccountNotFoundError)
+from batch import BatchEngine
+
+OPERATIONS = ("deposit", "withdraw", "transfer")
+# files with fewer requests are run by BatchEngine, as starting the workers and passing the requests
+# and results between them costs more than the workers save on a small file
+MINIMUM = 50000
+
+# every account's details by number and account number by IBAN. filled in before the workers start
+# so they share them with the main program instead of each reading the accounts
+_accounts = {}
+_ibans = {}
+
+
+def shard_of(acc_number, shards):
+    """function returning the worker that owns an account"""
+    return int(acc_number) % shards
+
+
+def _parse(lines, first, shards):
+    """function for reading the requests of a slice of lines. requests that can be turned down
+    without looking at a balance get their result here. the others are sorted by the worker owning
+    the account money comes out of or goes into, and every transfer to an existing account also
+    becomes a credit for the worker owning the payee. returns the results and the requests and
+    credits of each worker, pickled so the main program passes them on without reading them"""
+    results = []
+    sources = [[] for _ in range(shards)]
+    credits = [[] for _ in range(shards)]
+    for pos, line in enumerate(lines, first):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):  # not JSON, or JSON that isn't an object
+            results.append((pos, json.dumps({"id": None, "error": "Not a valid request"})))
+            continue
+        rid = request.get("id")
+        try:
+            amount = cents(request.get("amount"))  # kept as a plain int until it is applied, as it is quicker to pickle
+        except (TypeError, ValueError):
+            results.append((pos, json.dumps({"id": rid, "error": "Not a valid number"})))
+            continue
+        if "iban" in request:
+            acc_number = _ibans.get(str(request["iban"]))
+        else:
+            acc_number = str(request.get("account"))
+            if acc_number not in _accounts:
+                acc_number = None
+        if acc_number is None:
+            results.append((pos, json.dumps({"id": rid, "error": "Account does not exist"})))
+            continue
+        op = request.get("op")
+        if op not in OPERATIONS:
+            results.append((pos, json.dumps({"id": rid, "error": "Not a valid operation"})))
+            continue
+        to = payee = None
+        if op == "transfer":
+            to = request.get("to")
+            payee = _ibans.get(to)
+            if payee is not None:
+                credits[shard_of(payee, shards)].append((pos, 1, payee, amount))
+        sources[shard_of(acc_number, shards)].append((pos, 0, acc_number, op, amount, payee, to, rid))
+    return results, [pickle.dumps((s, c), pickle.HIGHEST_PROTOCOL) for s, c in zip(sources, credits)]
+
+
+class ShardWorker(object):
+    """The accounts of one shard and the requests that take money out of them or put money in, run in
+    a process of its own. Requests are applied to each account in file order with the same error
+    checking as the batch engine, so every account ends up as it would if the whole file was run
+    in one process.
+
+    A transfer between two shards is done in two phases. The shard of the paying account checks it
+    and takes the money out, and passes on whether it went ahead. The shard of the payee holds the
+    credit until then, and an account waiting for a credit doesn't go past it, as the requests
+    after it could depend on the money. Requests of other accounts carry on in the meantime.
+    Transaction ids are only known once every shard has finished a chunk, so the accounts are
+    given a mark of the request's position until commit() swaps the marks for the ids"""
+    def __init__(self, index, shards):
+        self.index = index
+        self.shards = shards
+        self._accounts = {}  # account number -> account object of every account used so far
+        self._queues = {}  # account number -> requests and credits of the account not applied yet
+        self._runnable = set()  # accounts with a request or credit that can be applied
+        self._resolved = {}  # position of a transfer -> whether it went ahead, for credits not applied yet
+        self._waiting = {}  # position of a transfer -> account waiting for it
+        self._outbox = [[] for _ in range(shards)]  # transfers decided here for the credits of other shards
+        self._marks = {}  # account number -> index of the first transaction of the chunk
+        self._done = []  # (position, id, type, IBAN, amount in cents, source) of the requests that went ahead
+        self._failed = []  # (position, id, error) of the requests turned down
+
+    def parse(self, lines, first):
+        return _parse(lines, first, self.shards)
+
+    def _account(self, acc_number):
+        account = self._accounts.get(acc_number)
+        if account is None:
+            account = create_account(_accounts[acc_number])
+            self._accounts[acc_number] = account
+        if acc_number not in self._marks:
+            self._marks[acc_number] = len(account._transactions)
+        return account
+
+    def settle(self, blobs):
+        """method to take the requests and credits of a chunk and apply as many as can be"""
+        events = []
+        for blob in blobs:
+            sources, credits = pickle.loads(blob)
+            events.extend(sources)
+            events.extend(credits)
+        events.sort()  # file order. a transfer to the same account is paid out before it is paid in
+        for event in events:
+            queue = self._queues.get(event[2])
+            if queue is None:
+                queue = self._queues[event[2]] = collections.deque()
+            queue.append(event)
+            self._runnable.add(event[2])
+        return self._run()
+
+    def resolve(self, resolutions):
+        """method to take whether transfers from other shards went ahead and apply what was waiting"""
+        for pos, ok in resolutions:
+            self._decided(pos, ok)
+        return self._run()
+
+    def _decided(self, pos, ok):
+        self._resolved[pos] = ok
+        acc_number = self._waiting.pop(pos, None)
+        if acc_number is not None:
+            self._runnable.add(acc_number)
+
+    def _run(self):
+        """method applying requests until every account is finished or waiting for another shard.
+        returns the decided transfers for each shard and whether anything is left waiting"""
+        while self._runnable:
+            acc_number = self._runnable.pop()
+            queue = self._queues[acc_number]
+            while queue:
+                event = queue[0]
+                if event[1] == 1:  # credit of a transfer
+                    ok = self._resolved.pop(event[0], None)
+                    if ok is None:
+                        self._waiting[event[0]] = acc_number
+                        break
+                    if ok:
+                        self._account(acc_number)._credit("p" + str(event[0]), Money(event[3]))
+                else:
+                    self._apply(event)
+                queue.popleft()
+            if not queue:
+                del self._queues[acc_number]
+        outbox = self._outbox
+        self._outbox = [[] for _ in range(self.shards)]
+        return outbox, bool(self._queues)
+
+    def _apply(self, event):
+        """method to apply a request to the account money comes out of or goes into"""
+        pos, _, acc_number, op, amount, payee, to, rid = event
+        account = self._account(acc_number)
+        amount = Money(amount)
+        mark = "p" + str(pos)
+        try:
+            match op:
+                case "deposit":
+                    account.check_deposit(amount)
+                    account._credit(mark, amount)
+                    IBAN, source = account.IBAN, None
+                case "withdraw":
+                    account.check_withdraw(amount)
+                    account._debit(mark, amount)
+                    IBAN, source = account.IBAN, None
+                case "transfer":
+                    account.check_transfer(amount)
+                    if payee is None:
+                        raise AccountNotFoundError("IBAN does not exist")
+                    account._debit(mark, amount)
+                    IBAN, source = to, account.IBAN
+        except BankError as error:  # same error checking as the account classes
+            self._failed.append((pos, rid, str(error)))
+            ok = False
+        else:
+            self._done.append((pos, rid, op, IBAN, int(amount), source))
+            ok = True
+        if op == "transfer" and payee is not None:
+            shard = shard_of(payee, self.shards)
+            if shard == self.index:
+                self._decided(pos, ok)
+            else:
+                self._outbox[shard].append((pos, ok))
+
+    def positions(self):
+        """method returning the positions of the requests of the chunk that went ahead"""
+        return [done[0] for done in self._done]
+
+    def commit(self, done, base):
+        """method to give the requests of the chunk their transaction ids. done is the sorted list of
+        positions that went ahead in every shard and base the first id reserved for them, so ids are
+        handed out in file order the same as in one process. returns the transactions for the ledger,
+        the results and the details of the accounts changed by the chunk"""
+        for acc_number, start in self._marks.items():
+            transactions = self._accounts[acc_number]._transactions
+            for i in range(start, len(transactions)):
+                transactions[i] = str(base + bisect.bisect_left(done, int(transactions[i][1:])))
+        entries = []
+        results = []
+        for pos, rid, kind, IBAN, amount, source in self._done:
+            tid = base + bisect.bisect_left(done, pos)
+            entries.append((tid, kind, IBAN, amount, source))
+            results.append((pos, json.dumps({"id": rid, "tid": tid})))
+        for pos, rid, error in self._failed:
+            results.append((pos, json.dumps({"id": rid, "error": error})))
+        entries.sort()  # requests are applied account by account, so they are put back in id order for the ledger
+        changed = [self._accounts[acc_number].get_details() for acc_number in self._marks]
+        self._marks = {}
+        self._done = []
+        self._failed = []
+        return entries, results, changed
+
+
+def _serve(connection, index, shards):
+    """function run by each worker process. commands are method names of the worker with their
+    arguments, and the reply is (True, result) or (False, traceback) if the method failed"""
+    worker = ShardWorker(index, shards)
+    while True:
+        command, args = connection.recv()
+        if command == "stop":
+            break
+        try:
+            reply = (True, getattr(worker, command)(*args))
+        except Exception:
+            reply = (False, traceback.format_exc())
+        connection.send(reply)
+    connection.close()
+
+
+class Settlement(object):
+    """Runs a file of requests with the accounts shared out by account number between worker
+    processes. The file is read a chunk at a time. Each worker reads a slice of the chunk and sorts
+    its requests by the shard they belong to, the shards apply their requests and pass the
+    decided transfers between them until every request of the chunk is done, and the chunk is
+    committed: the ids are reserved, the transactions written to the ledger and the changed accounts
+    put in the store. The result is the same as BatchEngine running the file in one process.
+
+    Workers are started with fork so they share the accounts read by the main program. The file is
+    run by BatchEngine instead where fork isn't available, with one worker, on a machine with one
+    core, where the workers would only take turns, and for files of fewer than minimum requests"""
+    def __init__(self, workers=None, chunk=100000, minimum=MINIMUM):
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.chunk = chunk
+        self.minimum = minimum
+        self._date = datetime.date.today()
+        self._connections = []
+        self._processes = []
+
+    def _start(self):
+        _accounts.clear()
+        _ibans.clear()
+        for acc in account_store:
+            _accounts[acc[0]] = acc
+            _ibans[acc[3]] = acc[0]
+        context = multiprocessing.get_context("fork")
+        for index in range(self.workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, args=(child, index, self.workers), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _stop(self):
+        for connection in self._connections:
+            try:
+                connection.send(("stop", ()))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self._connections = []
+        self._processes = []
+        _accounts.clear()
+        _ibans.clear()
+
+    def _call(self, command, args_list):
+        """method to run a command on every worker at the same time. returns their results in order"""
+        for connection, args in zip(self._connections, args_list):
+            connection.send((command, args))
+        replies = []
+        for connection in self._connections:
+            ok, result = connection.recv()
+            if not ok:
+                raise RuntimeError("Settlement worker failed\n" + result)
+            replies.append(result)
+        return replies
+
+    def _chunk(self, lines, first):
+        """method to settle one chunk of lines. returns the results in file order and the number of
+        requests that went ahead"""
+        workers = self.workers
+        size = -(-len(lines) // workers)
+        parsed = self._call("parse", [(lines[i * size:(i + 1) * size], first + i * size) for i in range(workers)])
+        results = [None] * len(lines)
+        for slice_results, _ in parsed:
+            for pos, line in slice_results:
+                results[pos - first] = line
+
+        replies = self._call("settle", [([blobs[shard] for _, blobs in parsed],) for shard in range(workers)])
+        while True:
+            inboxes = [[] for _ in range(workers)]
+            waiting = False
+            for outbox, pending in replies:
+                waiting = waiting or pending
+                for shard, resolutions in enumerate(outbox):
+                    inboxes[shard].extend(resolutions)
+            if not any(inboxes):
+                if waiting:
+                    raise RuntimeError("Settlement stopped with transfers waiting for each other")
+                break
+            replies = self._call("resolve", [(inbox,) for inbox in inboxes])
+
+        done = sorted(pos for positions in self._call("positions", [()] * workers) for pos in positions)
+        tids = tid_allocator.reserve(len(done))
+        committed = self._call("commit", [(done, tids.start)] * workers)
+        for tid, kind, IBAN, amount, source in heapq.merge(*(entries for entries, _, _ in committed)):
+            ledger.append(tid, kind, IBAN, Money(amount), self._date, source)
+        for _, chunk_results, changed in committed:
+            for pos, line in chunk_results:
+                results[pos - first] = line
+            for acc in changed:
+                account_store.put(acc)
+        return [line for line in results if line is not None], len(done)
+
+    def run(self, requests, results=None):
+        """method to settle every request from an iterable of JSON lines, the same as
+        BatchEngine.run. returns the number of requests that went ahead and the number that failed"""
+        requests = iter(requests)
+        head = list(itertools.islice(requests, self.minimum))  # enough to know if the file is small
+        requests = itertools.chain(head, requests)
+        if (len(head) < self.minimum or self.workers <= 1 or multiprocessing.cpu_count() == 1
+                or "fork" not in multiprocessing.get_all_start_methods()):
+            return BatchEngine().run(requests, results)
+        done = 0
+        failed = 0
+        open_bank()
+        store_lock = account_store.lock()  # held for the whole run as in BatchEngine.run
+        store_lock.acquire()
+        try:
+            account_store.refresh()
+            self._start()
+            ledger.begin()
+            try:
+                first = 0
+                lines = []
+                for line in requests:
+                    lines.append(line)
+                    if len(lines) == self.chunk:
+                        chunk_results, chunk_done = self._chunk(lines, first)
+                        first += len(lines)
+                        lines = []
+                        done += chunk_done
+                        failed += len(chunk_results) - chunk_done
+                        if results is not None:
+                            results.write("".join(line + "\n" for line in chunk_results))
+                if lines:
+                    chunk_results, chunk_done = self._chunk(lines, first)
+                    done += chunk_done
+                    failed += len(chunk_results) - chunk_done
+                    if results is not None:
+                        results.write("".join(line + "\n" for line in chunk_results))
+            finally:
+                # the chunks committed so far are saved. a chunk that failed part way has nothing
+                # in the ledger or the store
+                ledger.commit()
+                account_store.save()
+        finally:
+            self._stop()
+            store_lock.release()
+        return done, failed
+
+
+def run_settlement(requests_file, results_file=None, workers=None, chunk=100000, minimum=MINIMUM):
+    """function to settle a JSONL file of requests. the results are written to results_file"""
+    settlement = Settlement(workers, chunk, minimum)
+    with open(requests_file, "r") as requests:
+        if results_file is None:
+            return settlement.run(requests)
+        with open(results_file, "w", buffering=1 << 20) as results:
+            return settlement.run(requests, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Settle a file of requests across several processes")
+    parser.add_argument("requests", help="JSONL file of deposit, withdraw and transfer requests")
+    parser.add_argument("results", nargs="?", help="JSONL file the results are written to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, one per core by default")
+    parser.add_argument("--chunk", type=int, default=100000, help="number of requests settled together")
+    parser.add_argument("--minimum", type=int, default=MINIMUM,
+                        help="number of requests below which the file is run in one process")
+    args = parser.parse_args()
+    done, failed = run_settlement(args.requests, args.results, args.workers, args.chunk, args.minimum)
+    print(done, "requests processed,", failed, "failed")
@@ -0,0 +1,376 @@
+# CA2 OOP - Bank Management System
+# ledger split into one transactions file per month with a manifest of the files
+import os
+import sys
+import bisect
+import stat
+import datetime
+import threading
+import metrics
+from locks import FileLock
+from storage import LedgerIndex, file_id
+from groupcommit import GroupCommitter
+
+
+class Shard(object):
+    """One month file of the ledger as listed in the manifest. The shard being appended to is open
+    and its range of ids and dates isn't known yet. Once the next month starts it is closed and
+    the first and last id and date are recorded, and a closed shard can be sealed read only"""
+    def __init__(self, month, filename, first=None, last=None, start=None, end=None, state="open"):
+        self.month = month  # YYYY-MM
+        self.filename = filename
+        self.first = first  # lowest and highest transaction id in the shard
+        self.last = last
+        self.start = start  # earliest and latest transaction date, in YYYY-MM-DD form
+        self.end = end
+        self.state = state  # open, closed or sealed
+
+    @classmethod
+    def from_record(cls, record, directory=""):
+        month, filename, first, last, start, end, state = record
+        filename = os.path.join(directory, filename)  # the manifest only has the file name
+        if first == "None":
+            return cls(month, filename, state=state)
+        return cls(month, filename, int(first), int(last), start, end, state)
+
+    def record(self):
+        return [self.month, os.path.basename(self.filename), str(self.first), str(self.last), str(self.start),
+                str(self.end), self.state]
+
+    def overlaps(self, start, end):
+        """method to check if the shard can have transactions between two dates. None is no bound"""
+        if self.first is None:
+            return True
+        return (start is None or self.end >= start) and (end is None or self.start <= end)
+
+    def scan(self):
+        """method to work out the range of ids and dates of the shard from its file"""
+        self.first = self.last = self.start = self.end = None
+        if os.path.exists(self.filename):
+            with open(self.filename, "r") as t_reader:
+                for line in t_reader:
+                    transaction = line.strip().split("_")
+                    if len(transaction) < 5 or not transaction[0].isdigit():
+                        continue
+                    tid = int(transaction[0])
+                    if self.first is None:
+                        self.first = self.last = tid
+                        self.start = self.end = transaction[4]
+                    self.first = min(self.first, tid)
+                    self.last = max(self.last, tid)
+                    self.start = min(self.start, transaction[4])
+                    self.end = max(self.end, transaction[4])
+        if self.first is None:  # empty shard. it can't hold anything
+            self.first, self.last = 0, -1
+            self.start = self.end = self.month + "-01"
+
+
+class ShardedLedger(object):
+    """Ledger kept as one transactions file per month, listed in a manifest file. Transactions are
+    appended to the newest shard and a new shard is started when the first transaction of a new
+    month is written, so every shard covers a run of transaction ids that comes after the runs of
+    the shards before it. Each shard has its own offset index, reading transactions only opens the
+    shards that can hold their ids, and queries bounded by date only open the shards with
+    transactions in the range. It has the same methods as Ledger, and the newest shard is synced
+    to disk as the sync policy asks in the same way"""
+    BATCH = 1 << 20
+
+    def __init__(self, filename="accountsTransactions.txt", policy=None):
+        self._prefix = os.path.splitext(filename)[0]
+        self._manifest = self._prefix + ".manifest"
+        self._lock = FileLock(filename + ".lock")  # held while appending, rotating or changing the manifest
+        self._manifest_id = None
+        self._shards = []  # shards in month order
+        self._indexes = {}  # shard file -> offset index
+        self._policy = policy
+        self._committers = {}  # shard file -> file kept open for appending
+        self._buffer = None  # batch lines not written yet
+        self._batch_thread = None
+        self._batch_shard = None
+        self._offset = 0
+        self._pending = []
+        self._ticket = None
+        self._read_lock = threading.Lock()
+
+    # manifest
+
+    def _refresh(self):
+        """method to read the manifest again if another program has changed it"""
+        manifest = file_id(self._manifest)
+        if manifest == self._manifest_id:
+            return
+        with self._read_lock:
+            shards = []
+            if manifest is not None:
+                with open(self._manifest, "r") as manifest_reader:
+                    for line in manifest_reader:
+                        record = line.strip().split("_")
+                        if record != [""]:
+                            shards.append(Shard.from_record(record, os.path.dirname(self._manifest)))
+            self._shards = shards
+            self._manifest_id = manifest
+
+    def _write_manifest(self):
+        """method to write the manifest through a synced temp file. the lock is held by the caller"""
+        temp = self._manifest + ".tmp"
+        with open(temp, "w") as manifest_writer:
+            for shard in self._shards:
+                manifest_writer.write("_".join(shard.record()) + "\n")
+            manifest_writer.flush()
+            os.fsync(manifest_writer.fileno())
+        os.replace(temp, self._manifest)
+        self._manifest_id = file_id(self._manifest)
+
+    def shards(self):
+        """method returning the shards listed in the manifest"""
+        self._refresh()
+        return list(self._shards)
+
+    def _shard_file(self, month):
+        return self._prefix + "-" + month + ".txt"
+
+    def _current(self, date):
+        """method returning the shard to append to, starting the shard of a new month if the date
+        is in a later month than the newest shard. the lock is held by the caller"""
+        self._refresh()
+        month = str(date)[:7]
+        if self._shards and self._shards[-1].month >= month:
+            return self._shards[-1]  # a date from an earlier month still goes to the newest shard
+        if self._shards:
+            newest = self._shards[-1]
+            newest.scan()  # nothing is appended to it again so its range is fixed
+            newest.state = "closed"
+            committer = self._committers.pop(newest.filename, None)
+            if committer is not None:
+                committer.close()
+        shard = Shard(month, self._shard_file(month))
+        self._shards.append(shard)
+        self._write_manifest()
+        return shard
+
+    def _index(self, shard):
+        index = self._indexes.get(shard.filename)
+        if index is None:
+            index = LedgerIndex(shard.filename)
+            self._indexes[shard.filename] = index
+        return index
+
+    def _committer(self, shard):
+        committer = self._committers.get(shard.filename)
+        if committer is None:
+            committer = GroupCommitter(shard.filename, self._policy)
+            self._committers[shard.filename] = committer
+        return committer
+
+    # same methods as Ledger
+
+    def begin(self):
+        """method to start a batch in the newest shard. the lock is held until commit()"""
+        self._lock.acquire()
+        shard = self._current(datetime.date.today())
+        index = self._index(shard)
+        index.catch_up()
+        self._buffer = bytearray()
+        self._batch_thread = threading.get_ident()
+        self._batch_shard = shard
+        self._offset = os.path.getsize(shard.filename) if os.path.exists(shard.filename) else 0
+        self._pending = []
+        self._ticket = None
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._ticket = self._committer(self._batch_shard).write(self._buffer)[1]
+            self._buffer = bytearray()
+
+    def commit(self):
+        if self._buffer is None:
+            return
+        try:
+            self._write_buffer()
+            ticket = self._ticket
+            committer = self._committer(self._batch_shard)
+            self._buffer = None
+            self._batch_thread = None
+            self._index(self._batch_shard).add_many(self._pending, self._offset)
+            self._pending = []
+        finally:
+            self._lock.release()
+        if ticket is not None:
+            committer.wait(ticket)
+
+    @metrics.timed("ledger.append")
+    def append(self, tid, kind, IBAN, amount, date=None, source=None):
+        """method to append a transaction line to the newest shard. the line is the same as in
+        Ledger.append"""
+        if date is None:
+            date = datetime.date.today()
+        transaction = str(tid) + "_" + kind + "_" + IBAN + "_" + str(amount) + "_" + str(date)
+        if source is not None:
+            transaction += "_" + source
+        data = (transaction + "\n").encode()
+        if self._batch_thread == threading.get_ident():  # part of a batch
+            self._buffer += data
+            self._pending.append((int(tid), self._offset))
+            self._offset += len(data)
+            if len(self._buffer) >= self.BATCH:
+                self._write_buffer()
+        else:
+            with self._lock:
+                shard = self._current(date)
+                index = self._index(shard)
+                index.catch_up()
+                committer = self._committer(shard)
+                offset, ticket = committer.write(data)
+                index.add(tid, offset, offset + len(data))
+            committer.wait(ticket)
+        if metrics.enabled:
+            metrics.file_io(self._prefix + "-*.txt", written=len(data))
+
+    @metrics.timed("ledger.read")
+    def read(self, tids, start=None, end=None):
+        """generator returning the list of details of each passed transaction id in id order.
+        only the shards that can hold the ids, and that have transactions between the start and
+        end dates if they are passed, are opened. ids that are not in the ledger are skipped"""
+        self._refresh()
+        shards = [shard for shard in self._shards if shard.overlaps(str(start) if start else None,
+                                                                     str(end) if end else None)]
+        wanted = sorted(int(tid) for tid in tids if str(tid).isdigit())
+        found = []
+        for shard in shards:  # each shard is looked up once, for the ids in its range
+            if not wanted:
+                break
+            if shard.first is None:
+                low, high = 0, len(wanted)
+            else:
+                low, high = bisect.bisect_left(wanted, shard.first), bisect.bisect_right(wanted, shard.last)
+            if low == high:
+                continue
+            index = self._index(shard)
+            missing = []  # ids of a block written after the next shard was started can be in a later shard
+            for tid in wanted[low:high]:
+                offset = index.offset(tid)
+                if offset is None:
+                    missing.append(tid)
+                else:
+                    found.append((tid, shard.filename, offset))
+            wanted[low:high] = missing
+        found.sort()
+        files = {}
+        try:
+            for tid, filename, offset in found:
+                t_reader = files.get(filename)
+                if t_reader is None:
+                    t_reader = files[filename] = open(filename, "rb")
+                t_reader.seek(offset)
+                yield t_reader.readline().decode().strip().split("_")
+        finally:
+            for t_reader in files.values():
+                t_reader.close()
+
+    def between(self, start=None, end=None):
+        """generator returning every transaction dated between start and end, reading only the
+        shards with transactions in the range"""
+        start = str(start) if start else None
+        end = str(end) if end else None
+        for shard in self.shards():
+            if not shard.overlaps(start, end) or not os.path.exists(shard.filename):
+                continue
+            with open(shard.filename, "r") as t_reader:
+                for line in t_reader:
+                    transaction = line.strip().split("_")
+                    if len(transaction) < 5:
+                        continue
+                    if (start is None or transaction[4] >= start) and (end is None or transaction[4] <= end):
+                        yield transaction
+
+    def __iter__(self):
+        """iterate through the details of every transaction, shard by shard"""
+        return self.between()
+
+    def files(self):
+        """method returning the shard files in month order, the same as Ledger.files"""
+        return [shard.filename for shard in self.shards() if os.path.exists(shard.filename)]
+
+    def last_tid(self):
+        """method returning the highest transaction id in the ledger, 0 if it is empty"""
+        last = 0
+        for shard in self.shards():
+            if shard.first is None:
+                if os.path.exists(shard.filename):
+                    with self._lock:
+                        index = self._index(shard)
+                        index.catch_up()
+                        last = max(last, index.last())
+            else:
+                last = max(last, shard.last)
+        return last
+
+    def seal(self, before=None):
+        """method to make the closed shards read only, all of them or the ones of months before the
+        passed YYYY-MM month. returns the months sealed"""
+        sealed = []
+        with self._lock:
+            self._refresh()
+            for shard in self._shards:
+                if shard.state == "closed" and (before is None or shard.month < before):
+                    if os.path.exists(shard.filename):
+                        os.chmod(shard.filename, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                    shard.state = "sealed"
+                    sealed.append(shard.month)
+            if sealed:
+                self._write_manifest()
+        return sealed
+
+    def close(self):
+        for committer in self._committers.values():
+            committer.close()
+        for index in self._indexes.values():
+            index.close()
+
+
+def split(filename="accountsTransactions.txt"):
+    """function for splitting the transactions file into shards. a new shard starts at the first
+    transaction of a later month than the one before it, so the shards keep the order of the file.
+    the transactions file and its index are removed once the manifest has been written"""
+    ledger = ShardedLedger(filename)
+    if os.path.exists(ledger._manifest):
+        raise FileExistsError(ledger._manifest + " already exists")
+    shards = []
+    writer = None
+    with open(filename, "r") as t_reader:
+        for line in t_reader:
+            transaction = line.strip().split("_")
+            if len(transaction) < 5:
+                continue
+            month = transaction[4][:7]
+            if not shards or month > shards[-1].month:
+                if writer is not None:
+                    writer.close()
+                shards.append(Shard(month, ledger._shard_file(month), state="closed"))
+                writer = open(shards[-1].filename, "w", buffering=1 << 20)
+            writer.write("_".join(transaction) + "\n")
+    if writer is not None:
+        writer.close()
+    for shard in shards:
+        shard.scan()
+    if shards:
+        shards[-1].first = shards[-1].last = shards[-1].start = shards[-1].end = None
+        shards[-1].state = "open"  # later transactions of the same month carry on in it
+    with ledger._lock:
+        ledger._shards = shards
+        ledger._write_manifest()
+    os.remove(filename)
+    index = os.path.splitext(filename)[0] + ".idx"
+    if os.path.exists(index):
+        os.remove(index)
+    return [shard.month for shard in shards]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("split", "seal"):
+        print("Usage: python shards.py split | seal [YYYY-MM]")
+        sys.exit(1)
+    if sys.argv[1] == "split":
+        print("Shards:", ", ".join(split()))
+    else:
+        print("Sealed:", ", ".join(ShardedLedger().seal(sys.argv[2] if len(sys.argv) > 2 else None)))
@@ -0,0 +1,543 @@
+# CA2 OOP - Bank Management System
+# optional SQLite storage for the accounts, customers and transactions
+import os
+import sys
+import queue
+import sqlite3
+import datetime
+import threading
+import metrics
+import groupcommit
+from money import Money, CENTS
+from storage import IbanAllocator
+from archive import LedgerArchive
+from shards import ShardedLedger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    acc_number INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    iban TEXT NOT NULL UNIQUE,
+    funds INTEGER NOT NULL,
+    transactions TEXT NOT NULL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS customers (
+    customerid TEXT PRIMARY KEY,
+    pin TEXT NOT NULL,
+    firstname TEXT NOT NULL,
+    lastname TEXT NOT NULL,
+    age TEXT NOT NULL,
+    accounts TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    tid INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    iban TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_iban ON transactions (iban);
+"""
+
+# sync policy -> PRAGMA synchronous. in WAL mode FULL syncs every commit, and commits of other
+# connections made during the sync wait for the next one. NORMAL syncs at checkpoints only
+SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "records": "NORMAL", "os": "OFF"}
+
+
+class ConnectionPool(object):
+    """Small pool of connections to the database file. A thread borrows a connection for each
+    statement, or keeps the same one from the start to the end of a transaction. Connections are
+    opened in WAL mode so readers see a consistent snapshot while a writer is busy, and every
+    statement is a fixed SQL string so sqlite3 reuses the prepared statement from the cache of
+    the connection instead of parsing it again. How often commits are synced to disk comes from
+    the sync policy"""
+    def __init__(self, filename="bank.db", size=4, policy=None):
+        self._filename = filename
+        self._policy = policy if policy is not None else groupcommit.default_policy
+        self._idle = queue.LifoQueue()  # connections not borrowed by a thread
+        self._slots = threading.BoundedSemaphore(size)  # threads wait when all connections are borrowed
+        self._local = threading.local()  # connection and transaction depth of each thread
+        self._schema_lock = threading.Lock()
+        self._schema = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self._filename, timeout=30, isolation_level=None,
+                                     check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=" + SYNCHRONOUS[self._policy.mode])
+        if not self._schema:
+            with self._schema_lock:
+                if not self._schema:
+                    connection.executescript(SCHEMA)
+                    columns = [row[1] for row in connection.execute("PRAGMA table_info(transactions)")]
+                    if "source" not in columns:  # database made before the payer of a transfer was kept
+                        connection.execute("ALTER TABLE transactions ADD COLUMN source TEXT")
+                    self._cents(connection)
+                    self._schema = True
+        return connection
+
+    @staticmethod
+    def _cents(connection):
+        """method to change the amounts of a database made before cents were kept from whole units to
+        cents. user_version is 1 once they are in cents"""
+        if connection.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] < 1:  # not done by another program meanwhile
+                connection.execute("UPDATE accounts SET funds = funds * ?", (CENTS,))
+                connection.execute("UPDATE transactions SET amount = amount * ?", (CENTS,))
+                connection.execute("PRAGMA user_version = 1")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _borrow(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+    def _give_back(self, connection):
+        self._idle.put(connection)
+        self._slots.release()
+
+    @metrics.timed("sqlite.execute")
+    def execute(self, sql, parameters=()):
+        """method to run one statement and return all its rows. the connection of the thread's
+        transaction is used if there is one"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection.execute(sql, parameters).fetchall()
+        connection = self._borrow()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            self._give_back(connection)
+
+    def begin(self):
+        """method to start a transaction on the thread's connection. a transaction started while one
+        is already open is part of it"""
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            connection = self._borrow()
+            try:
+                connection.execute("BEGIN IMMEDIATE")  # takes the write lock now so the transaction can't fail half way
+            except BaseException:
+                self._give_back(connection)
+                raise
+            self._local.connection = connection
+            self._local.failed = False
+        self._local.depth = depth + 1
+
+    @metrics.timed("sqlite.commit")
+    def end(self, failed=False):
+        """method to end a transaction. the outermost one commits, or rolls back if it or a
+        transaction inside it failed"""
+        self._local.depth -= 1
+        if failed:
+            self._local.failed = True
+        if self._local.depth > 0:
+            return
+        connection = self._local.connection
+        self._local.connection = None
+        try:
+            connection.execute("ROLLBACK" if self._local.failed else "COMMIT")
+        finally:
+            self._give_back(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Transaction(object):
+    """Lock like object for a transaction, so the SQLite backend can be used by code written for
+    the file locks of the txt backend. The transaction is committed when it is released, or
+    rolled back if the with statement ended with an error"""
+    def __init__(self, pool):
+        self._pool = pool
+
+    def acquire(self):
+        self._pool.begin()
+
+    def release(self):
+        self._pool.end()
+
+    def __enter__(self):
+        self._pool.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pool.end(failed=exc_type is not None)
+
+
+class SqliteAccountStore(object):
+    """Account store kept in the accounts table. Accounts are found through the account number
+    primary key and the unique IBAN index. Balances are kept in cents. Changes are written straight to the database so there
+    is nothing to save or refresh. It has the same methods as AccountStore so it can be used in
+    its place"""
+    COLUMNS = "acc_number, type, name, iban, funds, transactions, extra"
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def _details(self, row):
+        acc = [str(column) for column in row[:6]]
+        acc[4] = str(Money(row[4]))
+        if row[6] is not None:
+            acc.append(row[6])
+        return acc
+
+    def _row(self, acc):
+        acc = [str(a) for a in acc]
+        return (int(acc[0]), acc[1], acc[2], acc[3], Money.parse(acc[4]), acc[5], acc[6] if len(acc) > 6 else None)
+
+    def get(self, acc_number):
+        acc_number = str(acc_number)
+        if not acc_number.isdigit():
+            return None
+        rows = self._pool.execute("SELECT " + self.COLUMNS + " FROM accounts WHERE acc_number = ?",
+                                  (int(acc_number),))
+        if not rows:
+            return None
+        return self._details(rows[0])
+
+    def find_iban(self, IBAN):
+        rows = self._pool.execute("SELECT " + self.COLUMNS + " FROM accounts WHERE iban = ?", (IBAN,))
+        if not rows:
+            return None
+        return self._details(rows[0])
+
+    def iban_exists(self, IBAN):
+        return bool(self._pool.execute("SELECT 1 FROM accounts WHERE iban = ?", (IBAN,)))
+
+    def next_number(self):
+        """method for retrieving the account number to be used for a new account. lock() should be
+        held until the account is added so another program can't take the same number"""
+        return self._pool.execute("SELECT coalesce(max(acc_number), 0) + 1 FROM accounts")[0][0]
+
+    def __contains__(self, acc_number):
+        return self.get(acc_number) is not None
+
+    def __len__(self):
+        return self._pool.execute("SELECT count(*) FROM accounts")[0][0]
+
+    def __iter__(self):
+        for row in self._pool.execute("SELECT " + self.COLUMNS + " FROM accounts ORDER BY acc_number"):
+            yield self._details(row)
+
+    def add(self, acc):
+        try:
+            self._pool.execute("INSERT INTO accounts (" + self.COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               self._row(acc))
+        except sqlite3.IntegrityError:
+            raise ValueError("Account number already exists")
+
+    def put(self, acc):
+        """method to write the details of an account. a new account is added"""
+        self._pool.execute("INSERT INTO accounts (" + self.COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (acc_number) DO UPDATE SET type = excluded.type, name = excluded.name, "
+                           "iban = excluded.iban, funds = excluded.funds, transactions = excluded.transactions, "
+                           "extra = excluded.extra", self._row(acc))
+
+    def update(self, acc):
+        self.put(acc)
+
+    def save(self):
+        """changes are written when they are made so there is nothing left to save"""
+        pass
+
+    def refresh(self):
+        """every read sees what other programs have committed so there is nothing to catch up with"""
+        pass
+
+    def reload(self):
+        pass
+
+    def lock(self):
+        """method returning a transaction, for holding it across several calls"""
+        return Transaction(self._pool)
+
+    def close(self):
+        pass
+
+
+class SqliteCustomerStore(object):
+    """Customer store kept in the customers table. It has the same methods as CustomerStore"""
+    COLUMNS = "customerid, pin, firstname, lastname, age, accounts"
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def get(self, customerid):
+        rows = self._pool.execute("SELECT " + self.COLUMNS + " FROM customers WHERE customerid = ?",
+                                  (str(customerid),))
+        if not rows:
+            return None
+        return list(rows[0])
+
+    def __contains__(self, customerid):
+        return bool(self._pool.execute("SELECT 1 FROM customers WHERE customerid = ?", (str(customerid),)))
+
+    def __len__(self):
+        return self._pool.execute("SELECT count(*) FROM customers")[0][0]
+
+    def __iter__(self):
+        for row in self._pool.execute("SELECT " + self.COLUMNS + " FROM customers ORDER BY rowid"):
+            yield list(row)
+
+    def add(self, customer):
+        try:
+            self._pool.execute("INSERT INTO customers (" + self.COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?)",
+                               tuple(str(c) for c in customer))
+        except sqlite3.IntegrityError:
+            raise ValueError("Customer ID already exists")
+
+    def put(self, customer):
+        self._pool.execute("INSERT INTO customers (" + self.COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (customerid) DO UPDATE SET pin = excluded.pin, "
+                           "firstname = excluded.firstname, lastname = excluded.lastname, age = excluded.age, "
+                           "accounts = excluded.accounts", tuple(str(c) for c in customer))
+
+    def update(self, customer):
+        self.put(customer)
+
+    def save(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def reload(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteTidAllocator(object):
+    """Transaction id sequence kept in a database file of its own next to the bank database. Ids
+    are reserved while the thread may be in the middle of a transaction on the bank database, so
+    a separate file is needed both to avoid waiting for that transaction's own write lock and so a
+    transaction that is rolled back never gives its ids to someone else while they are still held
+    in memory"""
+    def __init__(self, pool, filename="bank.seq", block=32):
+        self._pool = pool  # bank database, only read for the first id when the sequence is new
+        self._filename = filename
+        self._block = block
+        self._connection = None
+        self._lock = threading.Lock()
+        self._next = 0  # next id of the current block
+        self._end = 0  # first id after the current block
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._filename, timeout=30, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS sequence (name TEXT PRIMARY KEY, "
+                                     "value INTEGER NOT NULL)")
+        return self._connection
+
+    @metrics.timed("tids.reserve")
+    def _reserve(self, count):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute("SELECT value FROM sequence WHERE name = 'tid'").fetchall()
+            if rows:
+                start = rows[0][0]
+            else:
+                start = self._pool.execute("SELECT coalesce(max(tid), 0) + 1 FROM transactions")[0][0]
+            connection.execute("INSERT OR REPLACE INTO sequence (name, value) VALUES ('tid', ?)", (start + count,))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return start
+
+    def reserve(self, count):
+        """method to reserve a block of ids in one call. returns a range of the reserved ids"""
+        with self._lock:
+            start = self._reserve(count)
+        return range(start, start + count)
+
+    def next(self):
+        """method to hand out the next transaction id"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self._reserve(self._block)
+                self._end = self._next + self._block
+            tid = self._next
+            self._next += 1
+        return tid
+
+    def close(self):
+        """method to give back the unused ids of the current block if nothing was reserved after it"""
+        with self._lock:
+            if self._next < self._end and self._connection is not None:
+                self._connection.execute("UPDATE sequence SET value = ? WHERE name = 'tid' AND value = ?",
+                                         (self._next, self._end))
+                self._next = self._end = 0
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class SqliteLedger(object):
+    """Ledger kept in the transactions table. Transactions of an account are read through the tid
+    primary key and amounts are kept in cents. It has the same methods as Ledger"""
+    CHUNK = 500  # ids looked up in one statement
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._batch = Transaction(pool)
+
+    def begin(self):
+        """method to start a batch. the transactions are inserted in one database transaction"""
+        self._batch.acquire()
+
+    def commit(self):
+        self._batch.release()
+
+    def append(self, tid, kind, IBAN, amount, date=None, source=None):
+        if date is None:
+            date = datetime.date.today()
+        self._pool.execute("INSERT INTO transactions (tid, kind, iban, amount, date, source) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (int(tid), kind, IBAN, Money.parse(amount), str(date), source))
+
+    @staticmethod
+    def _details(row):
+        """method for turning a row into the list of details of a ledger line. the source is only
+        there for transfers"""
+        details = [str(column) for column in row[:5]]
+        details[3] = str(Money(row[3]))
+        if row[5] is not None:
+            details.append(row[5])
+        return details
+
+    def read(self, tids, start=None, end=None):
+        """generator returning the list of details of each passed transaction id in id order.
+        ids that are not in the ledger are skipped, and so are transactions outside the start and
+        end dates when they are passed"""
+        tids = sorted(set(int(tid) for tid in tids if str(tid).isdigit()))
+        dates = (str(start) if start else "0000-00-00", str(end) if end else "9999-99-99")
+        for first in range(0, len(tids), self.CHUNK):
+            chunk = tids[first:first + self.CHUNK]
+            rows = self._pool.execute("SELECT tid, kind, iban, amount, date, source FROM transactions WHERE tid IN (" +
+                                      ", ".join("?" * len(chunk)) + ") AND date BETWEEN ? AND ? ORDER BY tid",
+                                      chunk + list(dates))
+            for row in rows:
+                yield self._details(row)
+
+    def __iter__(self):
+        """iterate through the details of every transaction in id order"""
+        last = 0
+        while True:  # read a chunk at a time so the connection isn't held while the caller works
+            rows = self._pool.execute("SELECT tid, kind, iban, amount, date, source FROM transactions WHERE tid > ? "
+                                      "ORDER BY tid LIMIT " + str(self.CHUNK), (last,))
+            if not rows:
+                return
+            for row in rows:
+                yield self._details(row)
+            last = rows[-1][0]
+
+    def last_tid(self):
+        """method returning the highest transaction id in the ledger, 0 if it is empty"""
+        return self._pool.execute("SELECT MAX(tid) FROM transactions")[0][0] or 0
+
+
+class SqliteBackend(object):
+    """Storage backend kept in one SQLite database. It has the same parts as storage.TextBackend.
+    A transaction is a database transaction, so the ledger line and the changed accounts of a
+    transfer are committed together or not at all"""
+    def __init__(self, filename="bank.db", connections=4, policy=None):
+        self._pool = ConnectionPool(filename, connections, policy)
+        self.accounts = SqliteAccountStore(self._pool)
+        self.customers = SqliteCustomerStore(self._pool)
+        self.tids = SqliteTidAllocator(self._pool, os.path.splitext(filename)[0] + ".seq")
+        self.ledger = SqliteLedger(self._pool)
+        self.ibans = IbanAllocator(self.accounts, os.path.splitext(filename)[0] + ".iban")
+
+    def transaction(self):
+        return Transaction(self._pool)
+
+    def recover(self):
+        """method for the same use as TextBackend.recover. a transaction that was cut short by a crash
+        is rolled back by the database, so there is never anything to apply"""
+        return []
+
+    def close(self):
+        self.tids.close()
+        self._pool.close()
+
+
+def import_text(db_file="bank.db"):
+    """function for copying the txt files, with their journals, into a new database"""
+    from storage import AccountStore, CustomerStore
+    from project import create_account, ledger, open_bank
+    open_bank()  # transactions a crashed program left without their accounts are applied before copying
+    if os.path.exists(db_file):
+        raise FileExistsError(db_file + " already exists")
+    backend = SqliteBackend(db_file)
+    with backend.transaction():
+        for acc in AccountStore("accounts.txt", journaled=True):
+            if acc[1] == "savings" and len(acc) < 7:
+                acc = create_account(acc).get_details()  # the account object finds the dates in the ledger
+            backend.accounts.add(acc)
+        for customer in CustomerStore("customers.txt", journaled=True):
+            backend.customers.add(customer)
+        for transaction in ledger:  # the transactions file or its shards
+            backend.ledger.append(*transaction)
+    backend.close()
+
+
+def export_text(db_file="bank.db"):
+    """function for writing the database back out as the txt files. transactions that are in the
+    archive of old transactions are left there and not written to the transactions file. month files
+    the ledger was split into before it was imported are removed, as the transactions file has them"""
+    floor = LedgerArchive("accountsTransactions.txt").last_tid()  # 0 if there is no archive
+    months = [shard.filename for shard in ShardedLedger("accountsTransactions.txt").shards()]
+    backend = SqliteBackend(db_file)
+    files = (("accounts.txt", backend.accounts), ("customers.txt", backend.customers),
+             ("accountsTransactions.txt", (transaction for transaction in backend.ledger
+                                           if int(transaction[0]) > floor)))
+    for filename, records in files:
+        temp = filename + ".tmp"
+        with open(temp, "w") as text_writer:
+            for record in records:
+                text_writer.write("_".join(record) + "\n")
+        os.replace(temp, filename)
+    backend.close()
+    # journals, the ledger index and the id checkpoint describe the old files. the manifest goes
+    # first so the month files are no longer used in place of the transactions file
+    stale = ["accounts.journal", "customers.journal", "accounts.snap", "customers.snap", "accountsTransactions.idx",
+             "accountsTransactions.seq", "accountsTransactions.manifest"]
+    for month in months:
+        stale += [month, os.path.splitext(month)[0] + ".idx"]
+    for filename in stale:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python sqlstore.py import|export [bank.db]")
+        sys.exit(1)
+    db = sys.argv[2] if len(sys.argv) > 2 else "bank.db"
+    if sys.argv[1] == "import":
+        import_text(db)
+    else:
+        export_text(db)
@@ -0,0 +1,1208 @@
+# CA2 OOP - Bank Management System
+# storage classes used by the account and customer classes to read and write the txt files
+import gc
+import os
+import math
+import random
+import datetime
+import struct
+import marshal
+import threading
+import metrics
+from locks import FileLock, HeldRanges
+from money import Money, cents
+from groupcommit import GroupCommitter, durable
+
+
+def file_id(filename):
+    """function returning what identifies a version of a file: its inode, size and modification time.
+    None if the file doesn't exist"""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class RecordIndex(object):
+    """Index file mapping the first detail of each line of a txt file, when it is a number, to the
+    byte offset of the line, so one record is read with a seek instead of reading the whole file.
+    Like the ledger index it has one 8 byte slot per number holding the offset plus one. The header
+    is the identity of the file the index was built from, so an index left over from another version
+    of the file is noticed and built again. The store rewriting the file writes the index with it"""
+    HEADER = struct.Struct("<qqq")  # inode, size and modification time of the indexed file
+    SLOT = struct.Struct("<q")
+    LONGEST = 7  # digits of the largest number indexed, so the index stays a sensible size
+
+    def __init__(self, filename, index=None):
+        self._filename = filename
+        if index is None:
+            index = os.path.splitext(filename)[0] + ".idx"
+        self._index = index
+        self._file = None
+
+    @classmethod
+    def indexable(cls, key):
+        return key.isdigit() and len(key) <= cls.LONGEST
+
+    def _header(self):
+        header = os.pread(self._file.fileno(), self.HEADER.size, 0)
+        if len(header) < self.HEADER.size:
+            return None
+        return self.HEADER.unpack(header)
+
+    def _current(self):
+        """method returning the index file if it was built from the file as it is now, building it
+        again if it wasn't. the lock of the file is held by the caller"""
+        base = file_id(self._filename)
+        if base is None:
+            return None
+        if self._file is not None and self._header() == base:
+            return self._file
+        self.close()  # another program may have written a new index
+        if os.path.exists(self._index):
+            self._file = open(self._index, "rb")
+            if self._header() == base:
+                return self._file
+        self.build(base)
+        return self._file
+
+    def build(self, base, offsets=None):
+        """method to write the index for the version base of the file. offsets is a list of
+        (number, offset) of its lines if the caller knows them, otherwise the file is read"""
+        if offsets is None:
+            offsets = []
+            lines = 0
+            with open(self._filename, "rb") as file_reader:
+                offset = 0
+                for line in file_reader:
+                    lines += 1
+                    key = line.split(b"_", 1)[0].decode()
+                    if self.indexable(key):
+                        offsets.append((int(key), offset))
+                    offset += len(line)
+            if metrics.enabled:
+                metrics.file_io(self._filename, read=offset, lines=lines)
+        slots = bytearray(self.SLOT.size * (max((key for key, _ in offsets), default=-1) + 1))
+        for key, offset in offsets:
+            self.SLOT.pack_into(slots, key * self.SLOT.size, offset + 1)
+        temp = self._index + ".tmp"
+        with open(temp, "wb") as index_writer:
+            index_writer.write(self.HEADER.pack(*base))
+            index_writer.write(slots)
+        os.replace(temp, self._index)
+        if metrics.enabled:
+            metrics.file_io(self._index, written=self.HEADER.size + len(slots))
+        self.close()
+        self._file = open(self._index, "rb")
+
+    def appended(self, key, offset, before, after):
+        """method to add a line appended to the file. before and after are the identities of the
+        file either side of the append. nothing is done if the index wasn't up to date before it"""
+        if not self.indexable(key) or not os.path.exists(self._index):
+            return
+        with open(self._index, "r+b") as index_writer:
+            header = index_writer.read(self.HEADER.size)
+            if len(header) < self.HEADER.size or self.HEADER.unpack(header) != before:
+                return
+            index_writer.seek(self.HEADER.size + int(key) * self.SLOT.size)
+            index_writer.write(self.SLOT.pack(offset + 1))
+            index_writer.seek(0)
+            index_writer.write(self.HEADER.pack(*after))
+        self.close()
+
+    def line(self, key):
+        """get method for reading the line of a number from the file. None if it isn't there"""
+        index = self._current()
+        if index is None:
+            return None
+        slot = os.pread(index.fileno(), self.SLOT.size, self.HEADER.size + int(key) * self.SLOT.size)
+        if len(slot) < self.SLOT.size or self.SLOT.unpack(slot)[0] == 0:
+            return None
+        with open(self._filename, "rb") as file_reader:
+            file_reader.seek(self.SLOT.unpack(slot)[0] - 1)
+            line = file_reader.readline()
+        if metrics.enabled:
+            metrics.file_io(self._filename, read=len(line), lines=1)
+        return line
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RecordStore(object):
+    """In memory copy of a txt file where each line is a record of details separated by underscores
+    and the first detail identifies the record. The file is only read once, on first use.
+
+    In journaled mode an update appends the changed record to a journal file instead of rewriting
+    the whole file. Reading the store folds the journal over the base file, and once the journal
+    grows past the threshold it is compacted: the base file is rewritten in a background thread
+    and the journal is started again.
+
+    The whole file is only read once something needs every record. Until then a record is read on
+    its own: the journals are searched for a newer copy of it and otherwise its line in the base
+    file is found through an index of offsets, and changed records are appended to the journal
+    without reading the rest. Looking up a customer or account takes the same time however many
+    there are. A program that goes on to read many records loads the file after LAZY of them.
+
+    Each compaction also writes a snapshot of the records and indexes in binary beside the base
+    file, so loading the file reads them back with marshal instead of splitting every line. The
+    snapshot holds the identity of the base file it was written with and is only used while that
+    file is still there. It is tagged with a number given by the replay function, which the backend
+    sets on the account store to apply the ledger to the records before they are written and
+    return the last transaction id
+
+    Writes are done while holding a lock on the file, after catching up with anything other programs
+    have written since the store was read, so several programs can use the same files. The journal is
+    kept open and synced to disk as the sync policy asks, with the wait for the sync done after the
+    lock is let go so writes of other threads are covered by the same sync"""
+    LAZY = 256  # records read one at a time before the whole file is loaded
+    SNAPSHOT = struct.Struct("<qqqq")  # tag, then the inode, size and modification time of the base file
+
+    def __init__(self, filename, journaled=False, threshold=64 * 1024, policy=None):
+        self._filename = filename
+        self._journal = os.path.splitext(filename)[0] + ".journal"  # journal is kept beside the base file
+        self._journaled = journaled
+        self._threshold = threshold  # size in bytes the journal can reach before it is compacted
+        self._records = None  # first detail -> list of details. None until the file is loaded
+        self._dirty = set()  # records changed in memory but not written yet
+        self._newline = True  # False if the base file does not end with a new line
+        self._base_id = None  # identity of the base file when it was read, to notice it being replaced
+        self._journal_id = None  # inode of the journal that has been read
+        self._journal_pos = 0  # how much of the journal has been read
+        self._lock = FileLock(filename + ".lock")
+        self._compactor = None  # background thread rewriting the base file
+        self._committer = GroupCommitter(self._journal, policy)
+        self._offsets = RecordIndex(filename)  # line of each record in the base file
+        self._staged = {}  # records put before the file was loaded and not saved yet
+        self._lookups = 0  # records read one at a time
+        self._snapshot = os.path.splitext(filename)[0] + ".snap"  # records of the base file in binary
+        self.replay = None  # function run before a snapshot is written. returns the tag of the snapshot
+
+    def _clear(self):
+        """method to empty the in memory copy. subclasses extend it to empty their own indexes"""
+        self._records = {}
+
+    def _load(self):
+        """method to read the whole file into memory. only done the first time something needs every
+        record. records put before then become changed records"""
+        if self._records is not None:
+            return
+        with self._lock:
+            if self._records is not None:
+                return
+            self._read()
+            for record in self._staged.values():
+                self._index(record)
+                self._dirty.add(record[0])
+            self._staged = {}
+
+    def _read(self):
+        """method to read the base file, or its snapshot, and fold the journals over it. the garbage
+        collector is stopped meanwhile, as it would go through the records read so far again and
+        again while millions of them are made"""
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self._read_base()
+        finally:
+            if collecting:
+                gc.enable()
+        # the old journal only exists if the program stopped in the middle of a compaction
+        self._read_journal(self._journal + ".old", 0)
+        journal = file_id(self._journal)
+        self._journal_id = journal[0] if journal is not None else None
+        self._journal_pos = self._read_journal(self._journal, 0)
+
+    def _read_base(self):
+        self._clear()
+        self._base_id = file_id(self._filename)
+        state = self._read_snapshot() if self._base_id is not None else None
+        if state is not None:
+            self._restore(state)
+            self._newline = True
+        elif self._base_id is not None:
+            lines = 0
+            with open(self._filename, "r") as file_reader:
+                for line in file_reader:
+                    lines += 1
+                    self._newline = line.endswith("\n")
+                    record = line.strip().split("_")
+                    if record != [""]:  # skip blank lines
+                        self._index(record)
+            if metrics.enabled:
+                metrics.file_io(self._filename, read=self._base_id[1], lines=lines)
+
+    def _read_snapshot(self):
+        """method returning the records and indexes of the snapshot. None if there is no snapshot of
+        the base file as it is now"""
+        try:
+            with open(self._snapshot, "rb") as snap_reader:
+                header = snap_reader.read(self.SNAPSHOT.size)
+                if len(header) < self.SNAPSHOT.size or self.SNAPSHOT.unpack(header)[1:] != self._base_id:
+                    return None
+                data = snap_reader.read()
+        except FileNotFoundError:
+            return None
+        if metrics.enabled:
+            metrics.file_io(self._snapshot, read=len(header) + len(data))
+        try:
+            return marshal.loads(data)
+        except (EOFError, ValueError, TypeError):  # cut short by a crash. the base file is read instead
+            return None
+
+    def _write_snapshot(self, tag):
+        """method to write the snapshot of the base file just written from memory, with the indexes
+        so they don't have to be made again when it is loaded. A temp file is written and synced and
+        then renamed over the snapshot, the same as the base file"""
+        temp = self._snapshot + ".tmp"
+        data = marshal.dumps(self._state())
+        with open(temp, "wb") as snap_writer:
+            snap_writer.write(self.SNAPSHOT.pack(tag, *self._base_id))
+            snap_writer.write(data)
+            snap_writer.flush()
+            os.fsync(snap_writer.fileno())
+        os.replace(temp, self._snapshot)
+        if metrics.enabled:
+            metrics.file_io(self._snapshot, written=self.SNAPSHOT.size + len(data))
+
+    def snapshot_tag(self):
+        """get method for the tag of the snapshot. None if there is no snapshot. The tag stays good
+        after the base file is compacted again without a snapshot, so only the file has to exist"""
+        try:
+            with open(self._snapshot, "rb") as snap_reader:
+                header = snap_reader.read(self.SNAPSHOT.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < self.SNAPSHOT.size:
+            return None
+        return self.SNAPSHOT.unpack(header)[0]
+
+    def tag_snapshot(self, tag):
+        """method to change the tag of the snapshot without writing the records again. If there is
+        no snapshot yet one with only the tag is written, which has no records to be loaded"""
+        with self._lock:
+            if os.path.exists(self._snapshot):
+                with open(self._snapshot, "r+b") as snap_writer:
+                    snap_writer.write(struct.pack("<q", tag))
+                    snap_writer.flush()
+                    os.fsync(snap_writer.fileno())
+            else:
+                with open(self._snapshot, "wb") as snap_writer:
+                    snap_writer.write(self.SNAPSHOT.pack(tag, 0, 0, 0))  # matches no base file
+                    snap_writer.flush()
+                    os.fsync(snap_writer.fileno())
+
+    def _read_journal(self, journal, start):
+        """method to fold the records of a journal into memory from the start offset. returns the
+        offset after the last complete record"""
+        if not os.path.exists(journal):
+            return start
+        first = start
+        lines = 0
+        with open(journal, "rb") as journal_reader:
+            journal_reader.seek(start)
+            for line in journal_reader:
+                if not line.endswith(b"\n"):  # half written record from a crash or another program
+                    break
+                start += len(line)
+                lines += 1
+                record = line.decode().strip().split("_")
+                if record != [""]:
+                    self._index(record)
+        if metrics.enabled:
+            metrics.file_io(journal, read=start - first, lines=lines)
+        return start
+
+    @metrics.timed("store.refresh")
+    def refresh(self):
+        """method to catch up with changes written by other programs. only the new part of the journal
+        is read unless the base file has been replaced by a compaction. nothing is done if the file
+        hasn't been loaded, as records are read from the files as they are then"""
+        if self._records is None:
+            return
+        with self._lock:
+            journal = file_id(self._journal)
+            if file_id(self._filename) != self._base_id:
+                self._read()  # another program compacted or rewrote the file
+            elif journal is None:
+                if self._journal_id is not None:
+                    self._read()
+            elif self._journal_id is None:  # journal started since the last read
+                self._journal_id = journal[0]
+                self._journal_pos = self._read_journal(self._journal, 0)
+            elif journal[0] != self._journal_id or journal[1] < self._journal_pos:
+                self._read()
+            elif journal[1] > self._journal_pos:
+                self._journal_pos = self._read_journal(self._journal, self._journal_pos)
+
+    def _index(self, record):
+        """method to add a record to memory. subclasses extend it to keep their own indexes"""
+        self._records[record[0]] = record
+
+    def _state(self):
+        """method returning what is in memory, for a snapshot. subclasses add their own indexes"""
+        return self._records
+
+    def _restore(self, state):
+        """method to put what _state returned back in memory"""
+        self._records = state
+
+    def _lazy(self, key):
+        """method to check if a record should be read on its own instead of loading the file"""
+        if self._records is not None or not RecordIndex.indexable(key) or self._lookups >= self.LAZY:
+            return False
+        self._lookups += 1
+        return True
+
+    def _lookup(self, key):
+        """method to read one record without loading the file. the newest copy in the journals is
+        used, otherwise the line is read from the base file at its offset in the index"""
+        with self._lock:
+            record = self._staged.get(key)
+            if record is not None:
+                return list(record)
+            line = self._find_journal(self._journal, key)
+            if line is None:
+                line = self._find_journal(self._journal + ".old", key)
+            if line is None:
+                line = self._offsets.line(key)
+        if line is None:
+            return None
+        return line.decode().strip().split("_")
+
+    def _find_journal(self, journal, key):
+        """method returning the last line of a record in a journal. None if it isn't there"""
+        try:
+            with open(journal, "rb") as journal_reader:
+                data = journal_reader.read()
+        except FileNotFoundError:
+            return None
+        if metrics.enabled:
+            metrics.file_io(journal, read=len(data))
+        data = data[:data.rfind(b"\n") + 1]  # a half written record at the end is left out
+        prefix = b"\n" + key.encode() + b"_"
+        start = data.rfind(prefix)
+        if start >= 0:
+            start += 1
+        elif data.startswith(prefix[1:]):
+            start = 0
+        else:
+            return None
+        return data[start:data.index(b"\n", start)]
+
+    def reload(self):
+        """method to drop the in memory copy so the file is read again on next use"""
+        self.wait()
+        with self._lock:
+            self._records = None
+            self._dirty = set()
+            self._staged = {}
+
+    def close(self):
+        """method to wait for a running compaction and sync the journal so the program can end"""
+        self.wait()
+        self._committer.close()
+        self._offsets.close()
+
+    def get(self, key):
+        """get method for retrieving the list of details of a record. None is returned if it doesn't exist"""
+        key = str(key)
+        if self._lazy(key):
+            return self._lookup(key)
+        self._load()
+        record = self._records.get(key)
+        if record is None:
+            return None
+        return list(record)  # copy so callers can't change the store by accident
+
+    def current(self, key):
+        """method returning the store's own list of details of a record, without copying it. the
+        record is given a new list every time it changes, so a caller keeping the list can tell if
+        the record has changed since by checking it is still the same one. it must not be changed.
+        None is returned if the record doesn't exist"""
+        key = str(key)
+        if self._lazy(key):
+            return self._lookup(key)
+        self._load()
+        return self._records.get(key)
+
+    def __contains__(self, key):
+        key = str(key)
+        if self._lazy(key):
+            return self._lookup(key) is not None
+        self._load()
+        return key in self._records
+
+    def __len__(self):
+        self._load()
+        return len(self._records)
+
+    def __iter__(self):
+        """iterate through the details of every record in file order"""
+        self._load()
+        for record in list(self._records.values()):
+            yield list(record)
+
+    @metrics.timed("store.add")
+    def add(self, record):
+        """method for adding a new record. the line is appended to the end of the journal, or to the
+        end of the base file when the store is not journaled"""
+        record = [str(r) for r in record]
+        ticket = None
+        self._load()  # new records are checked against every record by the stores with other indexes
+        with self._lock:
+            self.refresh()
+            self._index(record)
+            if self._journaled:
+                ticket = self._append([record])
+            else:
+                line = "_".join(record) + "\n"
+                if not self._newline:  # the last line has no new line so one is written first
+                    line = "\n" + line
+                with open(self._filename, "a") as file_reader:
+                    offset = file_reader.tell() + (0 if self._newline else 1)
+                    file_reader.write(line)
+                self._newline = True
+                before = self._base_id
+                self._base_id = file_id(self._filename)
+                self._offsets.appended(record[0], offset, before, self._base_id)
+                if metrics.enabled:
+                    metrics.file_io(self._filename, written=len(line))
+        if ticket is not None:
+            self._committer.wait(ticket)
+
+    def put(self, record):
+        """method to replace the details of a record in memory only. save() has to be called
+        afterwards to write the change to the file"""
+        record = [str(r) for r in record]
+        with self._lock:
+            if self._records is None:
+                self._staged[record[0]] = record
+                return
+            self._index(record)
+            self._dirty.add(record[0])
+
+    @metrics.timed("store.update")
+    def update(self, record):
+        """method to replace the details of a record and write the change to the file"""
+        record = [str(r) for r in record]
+        with self._lock:
+            self.refresh()
+            self.put(record)
+            self.save()
+
+    @metrics.timed("store.save")
+    def save(self):
+        """method to write the changed records to the file. In journaled mode only the changed records
+        are appended to the journal, otherwise the whole file is rewritten"""
+        ticket = None
+        with self._lock:
+            if self._records is None and not self._journaled:
+                self._load()  # the whole file is rewritten so every record is needed
+            if self._records is None:
+                ticket = self._append(list(self._staged.values()))
+                self._staged = {}
+            elif self._journaled:
+                ticket = self._append([self._records[key] for key in self._dirty])
+            else:
+                self._rewrite(list(self._records.values()))
+            self._dirty = set()
+        if ticket is not None:
+            self._committer.wait(ticket)
+
+    def _append(self, records):
+        """method to append records to the journal and start a compaction if it grew too big.
+        the file lock is held by the caller. returns the ticket of the sync to wait for once
+        the lock is let go"""
+        if not records:
+            return None
+        data = "".join("_".join(record) + "\n" for record in records).encode()
+        start, ticket = self._committer.write(data)
+        inode = self._committer.inode()
+        if metrics.enabled:
+            metrics.file_io(self._journal, written=len(data))
+        if self._records is None:
+            size = start + len(data)  # nothing is loaded so the whole journal is left for the next read
+        else:
+            if self._journal_id is None and start == self._journal_pos:  # this write started the journal
+                self._journal_id = inode
+            if inode == self._journal_id and start == self._journal_pos:
+                self._journal_pos += len(data)
+            # otherwise another program wrote to the journal without this store seeing it. the position is
+            # left as it is so the next refresh reads those records along with ours
+            size = self._journal_pos
+        if size >= self._threshold and (self._compactor is None or not self._compactor.is_alive()):
+            self.compact()
+        return ticket
+
+    @metrics.timed("store.rewrite")
+    def _rewrite(self, records):
+        """method to write the base file from a list of records. A temp file is written and synced and
+        then renamed over the base file so the file is never left half written. the index of where each
+        record is goes with it"""
+        temp = self._filename + ".tmp"
+        offsets = []
+        with open(temp, "wb", buffering=1 << 20) as temp_writer:
+            offset = 0
+            for record in records:
+                line = ("_".join(record) + "\n").encode()
+                if RecordIndex.indexable(record[0]):
+                    offsets.append((int(record[0]), offset))
+                temp_writer.write(line)
+                offset += len(line)
+            temp_writer.flush()
+            os.fsync(temp_writer.fileno())
+        os.replace(temp, self._filename)
+        self._newline = True
+        self._base_id = file_id(self._filename)
+        self._offsets.build(self._base_id, offsets)
+        if metrics.enabled:
+            metrics.file_io(self._filename, written=self._base_id[1])
+
+    def compact(self, background=True):
+        """method to fold the journal into the base file. the base file is rewritten from memory while
+        holding the file lock and the journal is started again. In the background the caller carries on
+        straight away and other writers wait for the lock"""
+        if background:
+            self._compactor = threading.Thread(target=self._compact)
+            self._compactor.start()
+        else:
+            self._compact()
+
+    @metrics.timed("store.compact")
+    def _compact(self):
+        with self._lock:
+            self._load()
+            self.refresh()  # include what other programs have written
+            tag = self.replay() if self.replay is not None else 0
+            records = [list(record) for record in self._records.values()]
+            old = self._journal + ".old"
+            if os.path.exists(old):
+                # left over from a compaction that never finished so the journal is added onto it
+                if os.path.exists(self._journal):
+                    with open(old, "a") as old_writer, open(self._journal, "r") as journal_reader:
+                        old_writer.write(journal_reader.read())
+                    os.remove(self._journal)
+            elif os.path.exists(self._journal):
+                os.replace(self._journal, old)
+            self._journal_id = None
+            self._journal_pos = 0
+            self._rewrite(records)
+            self._write_snapshot(tag)
+            if os.path.exists(old):
+                os.remove(old)  # old journal is now part of the base file
+
+    def wait(self):
+        """method to wait for a running compaction to finish"""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+            self._compactor = None
+
+
+class AccountStore(RecordStore):
+    """Store for the accounts txt file. Each record is the list of details of an account and
+    is indexed by account number and by IBAN so finding an account never needs to scan the file"""
+    def __init__(self, filename="accounts.txt", journaled=False, threshold=64 * 1024, policy=None):
+        RecordStore.__init__(self, filename, journaled, threshold, policy)
+        self._ibans = {}  # IBAN -> account number
+        self._last_number = 0  # highest account number in the file
+
+    def _clear(self):
+        RecordStore._clear(self)
+        self._ibans = {}
+        self._last_number = 0
+
+    def _index(self, acc):
+        """method to add a list of account details to both indexes"""
+        old = self._records.get(acc[0])
+        if old is not None and old[3] != acc[3]:
+            del self._ibans[old[3]]
+        self._records[acc[0]] = acc
+        self._ibans[acc[3]] = acc[0]
+        if acc[0].isdigit() and int(acc[0]) > self._last_number:
+            self._last_number = int(acc[0])
+
+    def _state(self):
+        return self._records, self._ibans, self._last_number
+
+    def _restore(self, state):
+        self._records, self._ibans, self._last_number = state
+
+    def find_iban(self, IBAN):
+        """get method for retrieving the list of details of the account with the passed IBAN"""
+        self._load()
+        acc_number = self._ibans.get(IBAN)
+        if acc_number is None:
+            return None
+        return list(self._records[acc_number])
+
+    def iban_exists(self, IBAN):
+        """method to check if an IBAN is already used by an account"""
+        self._load()
+        return IBAN in self._ibans
+
+    def lock(self):
+        """method returning the lock of the file, for holding it across several calls"""
+        return self._lock
+
+    def next_number(self):
+        """method for retrieving the account number to be used for a new account. the file lock
+        should be held until the account is added so another program can't take the same number"""
+        self._load()
+        self.refresh()
+        return self._last_number + 1
+
+
+class CustomerStore(RecordStore):
+    """Store for the customers txt file. Each record is the list of details of a customer
+    indexed by customer id"""
+    def __init__(self, filename="customers.txt", journaled=False, threshold=64 * 1024, policy=None):
+        RecordStore.__init__(self, filename, journaled, threshold, policy)
+
+
+class TidAllocator(object):
+    """Sequence used to hand out transaction ids. Ids are counted in memory and a block of them is
+    reserved at a time by writing the end of the block to a small checkpoint file. After a crash
+    the count carries on from the checkpoint so an id is never given out twice, although the
+    unused ids of the crashed block are skipped. ledger is the transactions file, or a ledger object
+    with a last_tid() method such as a sharded ledger, and is only used when there is no checkpoint.
+
+    Each program hands out ids from its own block, so the ledger isn't written in id order and a
+    program can still write ids below the last one in the ledger. The block a program is handing
+    out ids from is held in the .held file beside the checkpoint until it is used up, which tells
+    recovery the lowest id that may still be written. Blocks taken with reserve() aren't held, as
+    their ids are written while the accounts lock is held and recovery takes that lock too"""
+    def __init__(self, ledger="accountsTransactions.txt", filename=None, block=32):
+        self._ledger = ledger
+        if filename is None:
+            filename = os.path.splitext(ledger)[0] + ".seq"  # checkpoint file is kept beside the ledger file
+        self._filename = filename
+        self._block = block  # number of ids reserved with each checkpoint
+        self._start = 0  # first id of the block being handed out
+        self._next = 0  # next id to be handed out
+        self._limit = 0  # ids below the limit are reserved by this allocator
+        self._lock = FileLock(filename + ".lock")  # other programs reserve ids from the same checkpoint
+        self._held = HeldRanges(os.path.splitext(filename)[0] + ".held")
+
+    def _scan_ledger(self):
+        """method to find the next id from the ledger. only needed the first time when there is
+        no checkpoint file yet"""
+        if not isinstance(self._ledger, str):
+            return self._ledger.last_tid() + 1
+        last = 0
+        if os.path.exists(self._ledger):
+            lines = 0
+            with open(self._ledger, "r") as t_reader:
+                for line in t_reader:
+                    lines += 1
+                    tid = line.split("_", 1)[0].strip()
+                    if tid.isdigit() and int(tid) > last:
+                        last = int(tid)
+            if metrics.enabled:
+                metrics.file_io(self._ledger, read=os.path.getsize(self._ledger), lines=lines)
+        return last + 1
+
+    def _read_checkpoint(self):
+        """method to read the first id not yet reserved by anyone"""
+        try:
+            with open(self._filename, "r") as seq_reader:
+                return int(seq_reader.read().strip())
+        except (FileNotFoundError, ValueError):  # no checkpoint yet or an empty one
+            return self._scan_ledger()
+
+    def _write_checkpoint(self, value):
+        """method to write the checkpoint file. the value is written to a temp file and synced
+        before being renamed over the checkpoint so a crash never leaves it half written"""
+        temp = self._filename + ".tmp"
+        with open(temp, "w") as seq_writer:
+            seq_writer.write(str(value))
+            seq_writer.flush()
+            os.fsync(seq_writer.fileno())
+        os.replace(temp, self._filename)
+        if metrics.enabled:
+            metrics.file_io(self._filename, written=len(str(value)))
+
+    @metrics.timed("tids.reserve")
+    def reserve(self, count):
+        """method to reserve a block of ids in one call. returns a range of the reserved ids"""
+        if count <= 0:
+            return range(0)
+        with self._lock:
+            start = max(self._read_checkpoint(), self._limit)
+            self._write_checkpoint(start + count)
+        return range(start, start + count)
+
+    def next(self):
+        """method to hand out the next transaction id"""
+        with self._lock:  # threads share the block
+            if self._next >= self._limit:  # current block is used up so a new one is reserved
+                block = self.reserve(self._block)
+                self._held.hold(block.start, block.stop)  # before the checkpoint lock is let go
+                self._held.let_go(self._start, self._limit)
+                self._start = self._next = block.start
+                self._limit = block.stop
+            tid = self._next
+            self._next += 1
+        return tid
+
+    def close(self):
+        """method to give back the unused ids of the current block. this is only possible if
+        nothing has been reserved after our block"""
+        with self._lock:
+            if self._next < self._limit and self._read_checkpoint() == self._limit:
+                self._write_checkpoint(self._next)
+            self._held.let_go(self._start, self._limit)
+            self._start = self._limit = self._next
+
+    def floor(self):
+        """method returning the lowest id a running program may still write to the ledger, the start
+        of the lowest block held or the first id not reserved. None if no id has been reserved yet.
+        where blocks can't be held it is 1, so every id is checked"""
+        with self._lock:
+            try:
+                with open(self._filename, "r") as seq_reader:
+                    checkpoint = int(seq_reader.read().strip())
+            except (FileNotFoundError, ValueError):
+                return None
+            if not self._held.supported:
+                return 1
+            return self._held.lowest(checkpoint)
+
+
+class IbanAllocator(object):
+    """Hands out IBAN numbers no account has, instead of trying random numbers until a free one
+    turns up. Every 5 digit number is visited once in a shuffled order: position i of the order is
+    the number (i * step + offset) % SPACE + 1, and as the step has no factor in common with SPACE
+    no number comes up twice. The position reached is kept in a small checkpoint file with the step
+    and offset, so handing out an IBAN only moves the position on. Numbers already taken by accounts
+    opened before the allocator are skipped, each of them once, and numbers are never handed out
+    again, even if their account is deleted. accounts is the account store the IBANs are for"""
+    SPACE = 99999
+
+    def __init__(self, accounts, filename="accounts.iban"):
+        self._accounts = accounts
+        self._filename = filename
+        self._lock = FileLock(filename + ".lock")
+
+    def _read_checkpoint(self):
+        """method to read the position, step and offset. a new shuffled order is picked the first time"""
+        try:
+            with open(self._filename, "r") as iban_reader:
+                position, step, offset = iban_reader.read().strip().split("_")
+                return int(position), int(step), int(offset)
+        except (FileNotFoundError, ValueError):
+            step = random.randrange(1, self.SPACE)
+            while math.gcd(step, self.SPACE) != 1:
+                step = random.randrange(1, self.SPACE)
+            return 0, step, random.randrange(self.SPACE)
+
+    def _write_checkpoint(self, position, step, offset):
+        """method to write the checkpoint through a synced temp file, the same as TidAllocator"""
+        temp = self._filename + ".tmp"
+        with open(temp, "w") as iban_writer:
+            iban_writer.write(str(position) + "_" + str(step) + "_" + str(offset))
+            iban_writer.flush()
+            os.fsync(iban_writer.fileno())
+        os.replace(temp, self._filename)
+
+    def reserve(self, count):
+        """method to hand out count IBANs in one call. the accounts lock should be held until the
+        accounts are added. LookupError is raised if there aren't that many numbers left"""
+        IBANs = []
+        with self._lock:
+            position, step, offset = self._read_checkpoint()
+            while len(IBANs) < count:
+                if position >= self.SPACE:
+                    raise LookupError("No IBAN numbers are left")
+                IBAN = "IE" + str((position * step + offset) % self.SPACE + 1)
+                position += 1
+                if not self._accounts.iban_exists(IBAN):
+                    IBANs.append(IBAN)
+            self._write_checkpoint(position, step, offset)
+        return IBANs
+
+    def next(self):
+        """method to hand out the next IBAN"""
+        return self.reserve(1)[0]
+
+
+class LedgerIndex(object):
+    """Index file mapping each transaction id to the byte offset of its line in the ledger.
+    The file starts with the size of the ledger it covers followed by one 8 byte slot per id,
+    so the offset of an id is found with a single read at a fixed position. Slots hold the offset
+    plus one so ids that were never used read back as 0"""
+    HEADER = struct.Struct("<q")
+    SLOT = struct.Struct("<q")
+
+    def __init__(self, ledger="accountsTransactions.txt", filename=None):
+        self._ledger = ledger
+        if filename is None:
+            filename = os.path.splitext(ledger)[0] + ".idx"
+        self._filename = filename
+        self._file = None  # index file opened on first use
+
+    def _open(self):
+        """method to open the index and bring it up to date with the ledger"""
+        if self._file is not None:
+            return
+        mode = "r+b" if os.path.exists(self._filename) else "w+b"
+        self._file = open(self._filename, mode)
+        self.catch_up()
+
+    def catch_up(self):
+        """method to index the lines appended to the ledger since the index was last updated, by
+        this program or another one. the ledger lock is held by the caller"""
+        self._open()
+        covered = self._covered()
+        size = os.path.getsize(self._ledger) if os.path.exists(self._ledger) else 0
+        if covered > size:  # the ledger was replaced so the index is built again
+            self._file.truncate(0)
+            covered = 0
+        if covered < size:
+            lines = 0
+            with open(self._ledger, "rb") as t_reader:
+                t_reader.seek(covered)
+                offset = covered
+                for line in t_reader:
+                    lines += 1
+                    tid = line.split(b"_", 1)[0].strip()
+                    if tid.isdigit():
+                        self._write_slot(int(tid), offset)
+                    offset += len(line)
+            self._set_covered(size)
+            if metrics.enabled:
+                metrics.file_io(self._ledger, read=size - covered, lines=lines)
+                metrics.file_io(self._filename, written=lines * self.SLOT.size)
+
+    def _covered(self):
+        self._file.seek(0)
+        header = self._file.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            return 0
+        return self.HEADER.unpack(header)[0]
+
+    def _set_covered(self, size):
+        self._file.seek(0)
+        self._file.write(self.HEADER.pack(size))
+        self._file.flush()
+
+    def _write_slot(self, tid, offset):
+        self._file.seek(self.HEADER.size + tid * self.SLOT.size)
+        self._file.write(self.SLOT.pack(offset + 1))
+
+    def add(self, tid, offset, end):
+        """method to record the offset of a line appended to the ledger. end is the size of
+        the ledger after the line"""
+        self._open()
+        self._write_slot(int(tid), offset)
+        self._set_covered(end)
+        if metrics.enabled:
+            metrics.file_io(self._filename, written=self.SLOT.size + self.HEADER.size)
+
+    def add_many(self, entries, end):
+        """method to record the offsets of many appended lines at once. entries is a list of
+        (transaction id, offset) and slots of consecutive ids are written together"""
+        self._open()
+        entries = sorted(entries)
+        start = 0
+        while start < len(entries):
+            stop = start + 1
+            while stop < len(entries) and entries[stop][0] == entries[stop - 1][0] + 1:
+                stop += 1
+            run = b"".join(self.SLOT.pack(offset + 1) for tid, offset in entries[start:stop])
+            self._file.seek(self.HEADER.size + entries[start][0] * self.SLOT.size)
+            self._file.write(run)
+            start = stop
+        self._set_covered(end)
+        if metrics.enabled:
+            metrics.file_io(self._filename, written=len(entries) * self.SLOT.size + self.HEADER.size)
+
+    def offset(self, tid):
+        """get method for retrieving the offset of a transaction. None if it is not in the ledger"""
+        self._open()
+        # pread doesn't move the shared file position so threads can look up offsets at the same time
+        slot = os.pread(self._file.fileno(), self.SLOT.size, self.HEADER.size + int(tid) * self.SLOT.size)
+        if metrics.enabled:
+            metrics.file_io(self._filename, read=len(slot))
+        if len(slot) < self.SLOT.size:
+            return None
+        offset = self.SLOT.unpack(slot)[0]
+        if offset == 0:
+            return None
+        return offset - 1
+
+    def last(self):
+        """method returning the highest transaction id in the index, 0 if there is none. the slot
+        of the highest id is the end of the file, so only the last slots are read"""
+        self._open()
+        tid = (os.fstat(self._file.fileno()).st_size - self.HEADER.size) // self.SLOT.size - 1
+        while tid > 0 and self.offset(tid) is None:
+            tid -= 1
+        return max(tid, 0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Ledger(object):
+    """The transactions txt file. Lines are only ever appended and each one is recorded in the
+    ledger index, so the transactions of an account are read by seeking straight to them
+    instead of reading the whole file. The file is kept open and synced to disk as the sync
+    policy asks"""
+    BATCH = 1 << 20  # bytes of batch lines buffered before they are written
+
+    def __init__(self, filename="accountsTransactions.txt", policy=None):
+        self._filename = filename
+        self._index = LedgerIndex(filename)
+        self._lock = FileLock(filename + ".lock")  # held while appending so lines and offsets match up
+        self._committer = GroupCommitter(filename, policy)
+        self._buffer = None  # batch lines not written yet. None when there is no batch
+        self._batch_thread = None  # thread writing the batch. other threads wait for the lock
+        self._offset = 0  # offset the next batch line is written at
+        self._pending = []  # (transaction id, offset) of batch lines not in the index yet
+        self._ticket = None  # ticket of the last batch write
+
+    def begin(self):
+        """method to start a batch. lines are buffered and written in large blocks instead of one
+        write per line, and the index is only updated when the batch is committed. the ledger lock
+        is held until then"""
+        self._lock.acquire()
+        self._index.catch_up()
+        self._buffer = bytearray()
+        self._batch_thread = threading.get_ident()
+        self._offset = os.path.getsize(self._filename) if os.path.exists(self._filename) else 0
+        self._pending = []
+        self._ticket = None
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._ticket = self._committer.write(self._buffer)[1]
+            self._buffer = bytearray()
+
+    def commit(self):
+        """method to finish a batch. the buffered lines are written and added to the index. returns
+        once the whole batch is synced as the policy asks"""
+        if self._buffer is None:
+            return
+        try:
+            self._write_buffer()
+            ticket = self._ticket
+            self._buffer = None
+            self._batch_thread = None
+            self._index.add_many(self._pending, self._offset)
+            self._pending = []
+        finally:
+            self._lock.release()
+        if ticket is not None:
+            self._committer.wait(ticket)
+
+    @metrics.timed("ledger.append")
+    def append(self, tid, kind, IBAN, amount, date=None, source=None):
+        """method to append a transaction line to the ledger. the line is made of the transaction id,
+        type, IBAN, amount and date separated by underscores. the IBAN of a transfer is the payee's
+        and the IBAN the money came from is added as the source at the end of the line"""
+        if date is None:
+            date = datetime.date.today()
+        transaction = str(tid) + "_" + kind + "_" + IBAN + "_" + str(amount) + "_" + str(date)
+        if source is not None:
+            transaction += "_" + source
+        transaction += "\n"
+        data = transaction.encode()
+        if self._batch_thread == threading.get_ident():  # part of a batch
+            self._buffer += data
+            self._pending.append((int(tid), self._offset))
+            self._offset += len(data)
+            if len(self._buffer) >= self.BATCH:
+                self._write_buffer()
+            if metrics.enabled:
+                metrics.file_io(self._filename, written=len(data))
+            return
+        with self._lock:
+            self._index.catch_up()  # index has to be up to date before the offset is added
+            offset, ticket = self._committer.write(data)
+            self._index.add(tid, offset, offset + len(data))
+        self._committer.wait(ticket)  # other threads can append while this one waits for the sync
+        if metrics.enabled:
+            metrics.file_io(self._filename, written=len(data))
+
+    @metrics.timed("ledger.read")
+    def read(self, tids, start=None, end=None):
+        """generator returning the list of details of each passed transaction id in id order.
+        ids that are not in the ledger are skipped. start and end are the dates the caller is
+        interested in, which a sharded ledger uses to skip shards. here every id is read"""
+        offsets = []
+        for tid in tids:
+            if str(tid).isdigit():
+                offset = self._index.offset(tid)
+                if offset is not None:
+                    offsets.append((int(tid), offset))
+        offsets.sort()
+        if not offsets:
+            return
+        with open(self._filename, "rb") as t_reader:
+            for tid, offset in offsets:
+                t_reader.seek(offset)
+                line = t_reader.readline()
+                if metrics.enabled:
+                    metrics.file_io(self._filename, read=len(line), lines=1)
+                yield line.decode().strip().split("_")
+
+    def __iter__(self):
+        """iterate through the details of every transaction in the ledger"""
+        if not os.path.exists(self._filename):
+            return
+        with open(self._filename, "r") as t_reader:
+            for line in t_reader:
+                if metrics.enabled:
+                    metrics.file_io(self._filename, read=len(line), lines=1)
+                transaction = line.strip().split("_")
+                if transaction != [""]:
+                    yield transaction
+
+    def files(self):
+        """method returning the files of the ledger, for programs that read them in parts themselves"""
+        return [self._filename] if os.path.exists(self._filename) else []
+
+    def last_tid(self):
+        """method returning the highest transaction id in the ledger, 0 if it is empty"""
+        if not os.path.exists(self._filename):
+            return 0
+        with self._lock:
+            self._index.catch_up()
+            return self._index.last()
+
+    def close(self):
+        self._committer.close()
+        self._index.close()
+
+
+def debit_dates(ledger, IBAN, tids, window):
+    """function for finding the withdrawal/transfer dates of a savings account from its own transactions
+    in the ledger, for account lines from before the dates were saved. returns the last window of them"""
+    debits = []
+    for tran in ledger.read(tids):
+        # transfers to the account are also linked to it but they have the account's IBAN
+        if tran[1] == "withdraw" or (tran[1] == "transfer" and tran[2] != IBAN):
+            debits.append(tran[4])
+    return debits[-window:]
+
+
+class TextBackend(object):
+    """Storage backend made of the txt files. A backend is what the bank keeps its data in and has
+    four parts used through the same methods whatever the backend is:
+    accounts   - store of account details with get, find_iban, iban_exists, next_number, add, put,
+                 update, save, refresh, lock and iteration
+    customers  - store of customer details with get, add, put, update, save and refresh
+    tids       - transaction id sequence with next, reserve and close
+    ledger     - transactions with append, read, last_tid, begin, commit and iteration
+    ibans      - IBANs for new accounts with next and reserve
+    and transaction() returns a lock that makes the writes done while it is held one unit of work.
+    For the txt files that is the accounts file lock, so other programs wait until all of them are
+    written, and the syncs of the writes are waited for once it is let go so the operations of
+    several threads share them. sqlstore.SqliteBackend is the other backend.
+
+    The ledger line of an operation is written before its accounts, so a program that crashes in
+    between leaves a transaction the accounts don't have. recover() applies those transactions when
+    a program starts. Only the ledger after the tag of the accounts snapshot is read, as everything
+    before it was checked when the snapshot was taken, and each compaction of the accounts checks
+    the ledger since the last snapshot before writing a new one. The binary account file has no
+    snapshots and keeps only the tag. recover() does nothing for the database, which rolls back a
+    transaction cut short by a crash"""
+    CREDITS = ("deposit", "interest")  # transaction types paying money into the account of the line
+    DEBITS = ("withdraw", "fee")  # and taking money out of it. a transfer does both
+    WINDOW = 12  # withdrawal/transfer dates kept by a savings account, the same as SavingsAccount.window
+
+    def __init__(self, accounts, customers, tids, ledger, ibans):
+        self.accounts = accounts
+        self.customers = customers
+        self.tids = tids
+        self.ledger = ledger
+        self.ibans = ibans
+        self.applied = []  # ids of the transactions applied by the last replay
+        if isinstance(accounts, RecordStore):  # the binary account store has no snapshots
+            accounts.replay = self._replay
+
+    def transaction(self):
+        return durable(self.accounts.lock())
+
+    def _replay(self):
+        """method to apply the transactions of the ledger after the snapshot tag that are missing from
+        their accounts. called holding the accounts lock, so no operation is half way through and a
+        missing transaction was left by a program that crashed. returns the tag of the next snapshot:
+        the last id in the ledger, or the id before the lowest one a running program may still write"""
+        first = (self.accounts.snapshot_tag() or 0) + 1
+        last = self.ledger.last_tid()
+        self.applied = []
+        known = {}  # account number -> set of its transaction ids, made the first time the account is seen
+        # the whole ledger is read in file order the first time instead of looking up every id
+        transactions = self.ledger.read(range(first, last + 1)) if first > 1 else iter(self.ledger)
+        for transaction in transactions:
+            if len(transaction) < 5 or not transaction[0].isdigit():
+                continue
+            tid, kind, IBAN, amount, date = transaction[:5]
+            amount = cents(amount)
+            if kind in self.CREDITS:
+                sides = [(IBAN, amount)]
+            elif kind in self.DEBITS:
+                sides = [(IBAN, -amount)]
+            elif kind == "transfer":
+                sides = [(IBAN, amount)]
+                if len(transaction) > 5:  # lines from before the payer was recorded only have the payee
+                    sides.insert(0, (transaction[5], -amount))
+            else:
+                continue
+            changed = {}  # account number -> details, as a transfer to the same account changes it twice
+            for IBAN, amount in sides:
+                acc = self.accounts.find_iban(IBAN)
+                if acc is None:
+                    continue
+                if acc[0] in changed:
+                    acc = changed[acc[0]]
+                else:
+                    tids = known.get(acc[0])
+                    if tids is None:
+                        tids = known[acc[0]] = set(acc[5].split(","))
+                    if tid in tids:
+                        continue  # the account has the transaction already
+                    tids.add(tid)
+                    acc[5] = tid if acc[5] == "None" else acc[5] + "," + tid
+                acc[4] = str(Money(cents(acc[4]) + amount))
+                if amount < 0 and kind != "fee" and acc[1] == "savings" and len(acc) > 6:
+                    debits = [] if acc[6] == "None" else acc[6].split(",")
+                    debits.append(date)
+                    acc[6] = ",".join(debits[-self.WINDOW:])
+                changed[acc[0]] = acc
+            for acc in changed.values():
+                self.accounts.put(acc)
+            if changed:
+                self.applied.append(int(tid))
+        floor = self.tids.floor()  # running programs can still write ids of their blocks below the last one
+        return last if floor is None else min(last, floor - 1)
+
+    @metrics.timed("backend.recover")
+    def recover(self):
+        """method to apply the transactions left without their accounts by programs that crashed.
+        The tag of the snapshot is moved on to the end of the ledger afterwards, or to just before
+        the lowest id a running program may still write, so the next program starts from there. The
+        first time there is no snapshot and the whole ledger is checked. returns the ids of the
+        transactions applied"""
+        if self.ledger.last_tid() <= (self.accounts.snapshot_tag() or 0):
+            return []  # nothing has been written since the snapshot
+        with self.transaction():
+            tag = self._replay()
+            self.accounts.save()
+            self.accounts.tag_snapshot(tag)
+        return self.applied
+
+    def close(self):
+        """method to give back unused transaction ids and sync the files when the program ends"""
+        self.tids.close()
+        self.ledger.close()
+        self.accounts.close()
+        self.customers.close()
@@ -0,0 +1,28 @@
+# CA2 OOP - Bank Management System
+# shared fixtures of the tests. every test runs on its own generated files in a temporary directory
+import os
+import sys
+import subprocess
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import bench  # noqa: E402
+
+
+def run(directory, *args, check=True):
+    """function for running one of the programs, or python code passed with -c, in a directory of
+    bank files. project.py reads and writes the files of the directory it is run in, so anything
+    importing it runs in its own process. returns the completed process with its output as text"""
+    env = dict(os.environ, PYTHONPATH=REPO)
+    args = [os.path.join(REPO, args[0])] + list(args[1:]) if args[0].endswith(".py") else list(args)
+    return subprocess.run([sys.executable] + args, cwd=str(directory), env=env, capture_output=True, text=True,
+                          check=check)
+
+
+@pytest.fixture
+def bank(tmp_path):
+    """directory with 50 customers, 100 accounts and 500 transactions of generated files"""
+    bench.generate(str(tmp_path), 50, 100, 500)
+    return tmp_path
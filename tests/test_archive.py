@@ -0,0 +1,37 @@
+# CA2 OOP - Bank Management System
+# tests of reading the bank after old transactions are archived
+import pytest
+from conftest import run
+
+LISTING = """
+import project
+bank = project.Bank()
+for customer in project.customer_store:
+    bank.login(customer[0], customer[1])
+    for acc_number in customer[5].split(","):
+        print(acc_number, bank.statement(acc_number))
+for transaction in project.ledger:
+    print("_".join(transaction))
+print(project.ledger.last_tid())
+"""
+DEPOSIT = """
+import project
+customer = next(iter(project.customer_store))
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+print(bank.deposit(customer[5].split(",")[0], 5)["tid"])
+"""
+
+
+@pytest.mark.parametrize("codec", ["lzma", "zlib"])
+def test_archived_bank_reads_the_same(bank, codec):
+    before = run(bank, "-c", LISTING).stdout
+    date = (bank / "accountsTransactions.txt").read_text().splitlines()[300].split("_")[4]
+    assert "transactions archived" in run(bank, "archive.py", "before", date, "--codec", codec, "--block", "2").stdout
+    info = run(bank, "archive.py", "info").stdout.splitlines()[-1].split()
+    assert int(info[0]) > 1 and int(info[-1]) >= 300  # several blocks, holding the ids up to the date
+    assert run(bank, "-c", LISTING).stdout == before
+    for workers in ("1", "2"):
+        assert "0 don't match" in run(bank, "reconcile.py", "--workers", workers).stdout
+    assert run(bank, "-c", DEPOSIT).stdout.strip() == str(int(before.split()[-1]) + 1)
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "2").stdout
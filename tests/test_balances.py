@@ -0,0 +1,78 @@
+# CA2 OOP - Bank Management System
+# tests of the balance book on numpy columns and on the array.array columns used without numpy
+import json
+import pytest
+from conftest import run
+from money import Money, cents
+from storage import AccountStore
+
+MONTH_END = """
+import sys
+import json
+import datetime
+from money import Money
+if sys.argv[1] == "array":
+    sys.modules["numpy"] = None  # import numpy fails the way it does when it isn't installed
+import balances
+from project import account_store
+book = balances.BalanceBook.load(account_store)
+before = {acc[0]: str(book.balance(acc[0])) for acc in account_store}
+summary = balances.month_end(0.01, 15, datetime.date(2021, 6, 30))
+account_store.refresh()
+after = balances.BalanceBook.load(account_store)
+print(json.dumps({"columns": type(book.balances).__module__, "before": before, "after": str(Money(int(sum(after.balances)))),
+                  "summary": {key: str(value) if isinstance(value, Money) else value for key, value in summary.items()}}))
+"""
+CUSTOMERS = "1_1234_Aoife_Kelly_30_1,2,3,4,5\n"
+ACCOUNTS = ("1_savings_Rent_IE100_1234.56_1_None\n"
+            "2_savings_Car_IE200_0_None_None\n"
+            "3_checking_Bills_IE300_-20.50_2,3_-1000\n"
+            "4_checking_Travel_IE400_-1200_4_-1000\n"
+            "5_checking_Food_IE500_99.99_5_-500\n")
+LEDGER = ("1_deposit_IE100_1234.56_2021-06-01\n"
+          "2_deposit_IE300_10_2021-06-02\n"
+          "3_withdraw_IE300_30.50_2021-06-03\n"
+          "4_withdraw_IE400_1200_2021-06-04\n"
+          "5_deposit_IE500_99.99_2021-06-05\n")
+
+
+@pytest.fixture
+def bank(tmp_path):
+    """savings accounts with and without money and checking accounts above zero, below zero and below their limit"""
+    (tmp_path / "customers.txt").write_text(CUSTOMERS)
+    (tmp_path / "accounts.txt").write_text(ACCOUNTS)
+    (tmp_path / "accountsTransactions.txt").write_text(LEDGER)
+    return tmp_path
+
+
+def _accounts(directory):
+    store = AccountStore(str(directory / "accounts.txt"), journaled=True)
+    return {acc[0]: acc for acc in store}
+
+
+@pytest.mark.parametrize("columns", ["numpy", "array"])
+def test_month_end_matches_the_text_store(bank, columns):
+    if columns == "numpy":
+        pytest.importorskip("numpy")
+    accounts = _accounts(bank)
+    result = json.loads(run(bank, "-c", MONTH_END, columns).stdout)
+    assert result["columns"] == columns
+    assert result["before"] == {number: str(Money.parse(acc[4])) for number, acc in accounts.items()}
+
+    interest = {number: cents(acc[4]) * 10000 // 1000000 for number, acc in accounts.items()
+                if acc[1] == "savings" and cents(acc[4]) > 0}
+    fees = {number: 1500 for number, acc in accounts.items() if acc[1] == "checking" and cents(acc[4]) < 0}
+    assert interest == {"1": 1234} and fees == {"3": 1500, "4": 1500}
+    summary = result["summary"]
+    assert summary["accounts"] == len(accounts)
+    assert summary["interest_paid"] == sum(1 for amount in interest.values() if amount)
+    assert summary["interest_total"] == str(Money(sum(interest.values())))
+    assert summary["fees_charged"] == len(fees)
+    assert summary["fees_total"] == str(Money(sum(fees.values())))
+    assert summary["over_limit"] == ["4"]
+
+    after = _accounts(bank)
+    for number, acc in accounts.items():
+        assert cents(after[number][4]) == cents(acc[4]) + interest.get(number, 0) - fees.get(number, 0), number
+    assert result["after"] == str(Money(sum(cents(acc[4]) for acc in after.values())))
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "1").stdout
@@ -0,0 +1,36 @@
+# CA2 OOP - Bank Management System
+# tests of the batch engine
+import json
+from money import Money, cents
+from conftest import run
+
+REQUESTS = [
+    {"id": 1, "op": "deposit", "account": "1", "amount": "10.50"},
+    [1, 2],
+    "deposit",
+    None,
+    {"id": 2, "op": "deposit", "account": "1", "amount": "ten"},
+    {"id": 3, "op": "deposit", "iban": ["IE1"], "amount": 5},
+    {"id": 4, "op": "refund", "account": "1", "amount": 5},
+    {"id": 5, "op": "withdraw", "account": "1", "amount": 10 ** 9},
+    {"id": 6, "op": "deposit", "account": "1", "amount": 1},
+]
+
+
+def test_every_line_gets_a_result(bank):
+    before = (bank / "accounts.txt").read_text().splitlines()[0].split("_")[4]
+    lines = [json.dumps(request) for request in REQUESTS] + ["{not json"]
+    (bank / "requests.jsonl").write_text("\n".join(lines) + "\n")
+    output = run(bank, "batch.py", "requests.jsonl", "results.jsonl").stdout
+    assert "2 requests processed, 8 failed" in output
+    results = [json.loads(line) for line in (bank / "results.jsonl").read_text().splitlines()]
+    assert len(results) == 10
+    assert "tid" in results[0] and "tid" in results[8]
+    assert [result.get("error") for result in results[1:4]] == ["Not a valid request"] * 3
+    assert results[4]["error"] == "Not a valid number"
+    assert results[5]["error"] == "Account does not exist"
+    assert results[6]["error"] == "Not a valid operation"
+    assert "insufficient funds" in results[7]["error"]
+    assert results[9] == {"id": None, "error": "Not a valid request"}
+    after = run(bank, "-c", "from project import account_store; print(account_store.get('1')[4])").stdout
+    assert Money.parse(after.strip()) == Money.parse(before) + cents("11.50")
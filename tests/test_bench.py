@@ -0,0 +1,24 @@
+# CA2 OOP - Bank Management System
+# tests of the generated data sets
+import pytest
+import bench
+from conftest import run
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_generated_files_add_up(tmp_path, legacy):
+    bench.generate(str(tmp_path), 20, 40, 300, seed=3, legacy=legacy)
+    transfers = [line.split("_") for line in (tmp_path / "accountsTransactions.txt").read_text().splitlines()
+                 if line.split("_")[1] == "transfer"]
+    IBANs = {line.split("_")[3] for line in (tmp_path / "accounts.txt").read_text().splitlines()}
+    assert transfers and all(len(transfer) == (5 if legacy else 6) for transfer in transfers)
+    assert legacy or all(transfer[5] in IBANs for transfer in transfers)
+    assert "0 don't match" in run(tmp_path, "reconcile.py", "--workers", "1").stdout
+
+
+def test_generated_transfers_are_written_as_the_bank_writes_them(tmp_path):
+    bench.generate(str(tmp_path), 5, 10, 50)
+    run(tmp_path, "-c", "import project; project.ledger.append(51, 'transfer', 'IE7919', 5, '2024-01-02', 'IE15838')")
+    lines = (tmp_path / "accountsTransactions.txt").read_text().splitlines()
+    transfer = next(line for line in lines[:-1] if "_transfer_" in line)
+    assert len(transfer.split("_")) == len(lines[-1].split("_"))
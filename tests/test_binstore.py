@@ -0,0 +1,60 @@
+# CA2 OOP - Bank Management System
+# tests of the binary accounts file
+import shutil
+import pytest
+from conftest import run
+from binstore import BinaryAccountStore
+
+OPERATIONS = """
+import project
+customer = next(iter(project.customer_store))
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+acc_number = customer[5].split(",")[0]
+for i in range(20):
+    bank.deposit(acc_number, "1.25")
+    bank.withdraw(acc_number, 1)
+try:
+    bank.open_account("A name far too long for a record", "savings")
+except project.InvalidInputError as error:
+    print(error)
+for amount in (10 ** 30, "9" * 40):  # more than the binary file holds
+    try:
+        bank.deposit(acc_number, amount)
+    except project.InvalidAmountError as error:
+        print(error)
+bank.logout()
+for acc in project.account_store:
+    print("_".join(acc))
+"""
+
+
+def test_binary_file_matches_the_text_file(bank, tmp_path_factory):
+    binary = tmp_path_factory.mktemp("binary")
+    shutil.copytree(bank, binary, dirs_exist_ok=True)
+    run(binary, "binstore.py", "import")
+    text_output = run(bank, "-c", OPERATIONS).stdout.splitlines()
+    binary_output = run(binary, "-c", OPERATIONS).stdout.splitlines()
+    assert binary_output[0] == "Account name too long, it can be up to 24 characters"
+    assert binary_output[1:3] == ["Not a valid number, amounts can be up to 10000000000000"] * 2
+    assert binary_output == text_output
+    assert "0 don't match" in run(binary, "reconcile.py", "--workers", "1").stdout
+
+
+@pytest.mark.parametrize("name, IBAN, field", [("N" * 25, "IE100", "Account name"), ("Bills", "IE" + "1" * 11, "IBAN")])
+def test_field_too_long_for_a_record_is_named(tmp_path, name, IBAN, field):
+    store = BinaryAccountStore(str(tmp_path / "accounts.bin"))
+    with pytest.raises(ValueError, match="^" + field + " too long"):
+        store.add(["1", "checking", name, IBAN, "0", "None", "-1000"])
+    store.close()
+
+
+def test_savings_dates_are_found_when_imported_without_the_program(tmp_path):
+    (tmp_path / "accounts.txt").write_text("1_savings_Rent_IE100_60_1,2,3\n")  # from before the dates were saved
+    (tmp_path / "accountsTransactions.txt").write_text("1_deposit_IE100_100_2021-01-04\n"
+                                                      "2_withdraw_IE100_15_2021-02-05\n"
+                                                      "3_transfer_IE200_25_2021-03-06_IE100\n")
+    run(tmp_path, "binstore.py", "import")
+    store = BinaryAccountStore(str(tmp_path / "accounts.bin"))
+    assert store.get("1")[6] == "2021-02-05,2021-03-06"
+    store.close()
@@ -0,0 +1,59 @@
+# CA2 OOP - Bank Management System
+# tests of the cache of account objects
+from cache import AccountCache
+from storage import AccountStore
+
+ACCOUNTS = ("1_checking_Bills_IE100_60_1_-1000\n"
+            "2_savings_Rent_IE200_40_2_None\n"
+            "3_savings_Car_IE300_0_None_None\n")
+
+
+class Built(object):
+    """stand in for an account object, counting how many are made"""
+    made = 0
+
+    def __init__(self, details):
+        Built.made += 1
+        self.details = details
+
+    def get_acc(self):
+        return self.details[0]
+
+
+def _cache(tmp_path, size):
+    (tmp_path / "accounts.txt").write_text(ACCOUNTS)
+    store = AccountStore(str(tmp_path / "accounts.txt"), journaled=True)
+    Built.made = 0
+    return store, AccountCache(store, Built, size)
+
+
+def test_least_recently_used_account_is_dropped(tmp_path):
+    store, cache = _cache(tmp_path, 2)
+    first = cache.get("1")
+    cache.get("2")
+    assert cache.get("1") is first  # 1 is now used more recently than 2
+    cache.get("3")
+    assert cache.stats() == {"accounts": 2, "size": 2, "hits": 1, "misses": 3, "evictions": 1}
+    assert cache.get("1") is first
+    cache.get("2")  # dropped, so made again
+    assert Built.made == 4 and cache.get("4") is None
+
+
+def test_accounts_changed_in_the_store_are_made_again(tmp_path):
+    store, cache = _cache(tmp_path, 8)
+    account = cache.get("1")
+    assert cache.find_iban("IE100") is account
+    other = AccountStore(str(tmp_path / "accounts.txt"), journaled=True)  # another program
+    acc = other.get("1")
+    acc[3], acc[4] = "IE101", "75"
+    other.update(acc)
+    other.close()
+    changed = cache.find_iban("IE101")
+    assert changed is not account and changed.details[4] == "75"
+    assert cache.find_iban("IE100") is None
+    cache.discard("1")  # changed in memory by an operation
+    written = Built(store.get("1"))
+    cache.put(written, store.current("1"))  # written back
+    assert cache.get("1") is written
+    off = AccountCache(store, Built, 0)
+    assert off.get("2") is not off.get("2") and off.stats()["accounts"] == 0
@@ -0,0 +1,81 @@
+# CA2 OOP - Bank Management System
+# tests of the files synced by the group committer
+import os
+import time
+import threading
+import pytest
+from groupcommit import SyncPolicy, GroupCommitter
+
+
+def _in_thread(target, timeout=30):
+    """function running target in a thread. returns the error it raised and fails if it doesn't end"""
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as error:
+            errors.append(error)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "a wait never returned"
+    return errors[0] if errors else None
+
+
+@pytest.mark.parametrize("policy", ["always", "interval:1"])
+def test_file_renamed_while_it_is_synced(tmp_path, monkeypatch, policy):
+    filename = str(tmp_path / "journal")
+    committer = GroupCommitter(filename, SyncPolicy.parse(policy))
+    lock = threading.Lock()  # the lock of the file writers hold
+    opening = os.open
+
+    def slow_open(*args, **kwargs):  # the old file is let go while syncs are running
+        time.sleep(0.005)
+        return opening(*args, **kwargs)
+    monkeypatch.setattr(os, "open", slow_open)
+
+    errors = []
+
+    def writer():
+        try:
+            for i in range(100):
+                with lock:
+                    offset, ticket = committer.write(b"line\n")
+                committer.wait(ticket)
+        except Exception as error:
+            errors.append(error)
+
+    def rotator():
+        for i in range(30):
+            with lock:
+                os.rename(filename, filename + ".old")
+                offset, ticket = committer.write(b"line\n")
+            committer.wait(ticket)
+
+    committer.write(b"line\n")
+    threads = [threading.Thread(target=writer) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    assert _in_thread(rotator) is None
+    for thread in threads:
+        thread.join(30)
+        assert not thread.is_alive(), "a wait never returned"
+    assert errors == []
+    committer.close()
+    assert os.path.getsize(filename) + os.path.getsize(filename + ".old") > 0
+
+
+def test_failed_sync_is_raised_by_the_waiting_threads(tmp_path, monkeypatch):
+    committer = GroupCommitter(str(tmp_path / "journal"), SyncPolicy.parse("interval:1"))
+
+    def failing_fsync(fd):
+        raise OSError(5, "Input/output error")
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    offset, ticket = committer.write(b"line\n")
+    error = _in_thread(lambda: committer.wait(ticket))
+    assert isinstance(error, OSError)
+    monkeypatch.undo()  # the flusher carries on once the disk works again
+    offset, ticket = committer.write(b"line\n")
+    assert _in_thread(lambda: committer.wait(ticket)) is None
+    committer.close()
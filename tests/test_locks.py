@@ -0,0 +1,67 @@
+# CA2 OOP - Bank Management System
+# tests of several programs with several threads using the bank at once
+import sys
+import json
+import random
+import subprocess
+from conftest import REPO, run
+
+SESSIONS = """
+import sys, random, threading, traceback
+import project
+project.open_bank()
+customers = list(project.customer_store)
+IBANs = [acc[3] for acc in project.account_store]
+errors = []
+
+def session(seed):
+    rng = random.Random(seed)
+    bank = project.Bank()
+    try:
+        for i in range(30):
+            customer = rng.choice(customers)
+            bank.login(customer[0], customer[1])
+            acc_number = customer[5].split(",")[0]
+            try:
+                if rng.random() < 0.4:
+                    bank.deposit(acc_number, 3)
+                else:
+                    bank.transfer(acc_number, 9, rng.choice(IBANs))
+            except project.BankError:
+                pass
+            bank.logout()
+    except Exception:
+        errors.append(traceback.format_exc())
+
+threads = [threading.Thread(target=session, args=(int(sys.argv[1]) * 10 + n,)) for n in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print("".join(errors))
+"""
+
+
+def mismatches(bank):
+    """the accounts reconcile reports with their differences from the ledger"""
+    lines = run(bank, "reconcile.py", "--workers", "1").stdout.splitlines()
+    return [(line.split()[1], line.split()[-1]) for line in lines if line.startswith("Account ")]
+
+
+def test_programs_with_threads_share_the_accounts(bank):
+    before = mismatches(bank)
+    rng = random.Random(2)
+    IBANs = [line.split("_")[3] for line in (bank / "accounts.txt").read_text().splitlines()]
+    for i in range(3):
+        requests = [{"op": "transfer", "account": str(rng.randint(1, 100)), "amount": 2, "to": rng.choice(IBANs)}
+                    for j in range(200)]
+        (bank / ("requests%d.jsonl" % i)).write_text("".join(json.dumps(request) + "\n" for request in requests))
+    programs = [subprocess.Popen([sys.executable, "-c", SESSIONS, str(i)], cwd=str(bank), env={"PYTHONPATH": REPO},
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for i in range(6)]
+    programs += [subprocess.Popen([sys.executable, REPO + "/batch.py", "requests%d.jsonl" % i], cwd=str(bank),
+                                  env={"PYTHONPATH": REPO}, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for i in range(3)]
+    for program in programs:
+        out, errors = program.communicate()
+        assert program.returncode == 0 and "Traceback" not in out + errors, out + errors
+    assert mismatches(bank) == before  # no credit or debit was written over by another program
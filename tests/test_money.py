@@ -0,0 +1,41 @@
+# CA2 OOP - Bank Management System
+# tests of amounts of money
+import json
+import pytest
+from money import Money, cents
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12", 1200), ("12.5", 1250), ("12.05", 1205), ("-3.10", -310), ("+4", 400), (" 7.1 ", 710),
+    (12, 1200), (12.1, 1210), (0.3, 30), (Money(99), 99),
+])
+def test_amounts_are_read_as_cents(value, expected):
+    assert cents(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1.234", "abc", "", "12.", ".5", "1,000"])
+def test_text_that_is_not_an_amount_is_refused(value):
+    with pytest.raises(ValueError):
+        cents(value)
+
+
+@pytest.mark.parametrize("value", [True, None, [12]])
+def test_values_that_are_not_amounts_are_refused(value):
+    with pytest.raises(TypeError):
+        cents(value)
+
+
+def test_money_is_written_in_units():
+    assert str(Money.parse("12.1")) == "12.10"
+    assert str(Money.parse("1300")) == "1300"
+    assert str(Money.parse("-0.05")) == "-0.05"
+    assert "%s|%6s" % (Money(1205), Money(100)) == "12.05|     1"
+    assert json.dumps([Money(1205).number(), Money(1300).number()]) == "[12.05, 13]"
+
+
+def test_sums_of_money_are_exact_and_stay_money():
+    total = sum([Money.parse("0.1")] * 3, Money(0))
+    assert total == Money.parse("0.3") and type(total) is Money
+    assert type(100 - Money(1)) is Money and str(-Money(5)) == "-0.05"
+    money = Money(5)
+    assert Money.parse(money) is money
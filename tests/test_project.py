@@ -0,0 +1,175 @@
+# CA2 OOP - Bank Management System
+# tests of the bank's customers, accounts and sessions
+import datetime
+import pytest
+from conftest import run
+from storage import AccountStore, CustomerStore
+
+CUSTOMERS = ("1_1234_Aoife_Kelly_30_1,2,3\n"
+             "2_4321_Sean_Byrne_16_4\n")
+ACCOUNTS = ("1_savings_Rent_IE100_500_1,2_2021-01-15\n"
+            "2_checking_Bills_IE200_250_3,4,5_-1000\n"
+            "3_savings_Car_IE300_20_6_None\n"
+            "4_savings_Pocket_IE400_0_None_None\n")
+LEDGER = ("1_deposit_IE100_600_2021-01-04\n"
+          "2_withdraw_IE100_100_2021-01-15\n"
+          "3_deposit_IE200_100_2021-02-01\n"
+          "4_deposit_IE200_200_2021-02-10\n"
+          "5_withdraw_IE200_50_2021-03-05\n"
+          "6_deposit_IE300_20_2021-03-06\n")
+
+WITHDRAW_TWICE = """
+import sys
+import project
+bank = project.Bank()
+bank.login("1", "1234")
+for acc_number in sys.argv[1:]:
+    for i in range(2):
+        try:
+            bank.withdraw(acc_number, 5)
+            print(acc_number, "withdrawn")
+        except project.LimitExceededError:
+            print(acc_number, "limit")
+bank.logout()
+"""
+
+SESSION = """
+import project
+bank = project.Bank()
+for customer, pin in (("9", "1234"), ("1", "0000")):
+    try:
+        bank.login(customer, pin)
+    except project.LoginError as error:
+        print(type(error).__name__, error)
+bank.login("1", "1234")
+print(bank.deposit("2", "10.50"))
+print(bank.transfer("2", 20, "IE300"))
+for call in (lambda: bank.deposit("2", -5), lambda: bank.withdraw("2", 5000), lambda: bank.transfer("2", 5, "IE999"),
+             lambda: bank.balance("4"), lambda: bank.withdraw("3", "x")):
+    try:
+        call()
+    except project.BankError as error:
+        print(type(error).__name__, error)
+bank.logout()
+bank.login("2", "4321")
+try:
+    bank.open_account("Spending", "checking")
+except project.AgeRestrictionError as error:
+    print(type(error).__name__, error)
+print(bank.open_account("Spending", "savings").get_details()[:3])
+bank.logout()
+"""
+
+STATEMENT = """
+import project
+read = project.ledger.read
+reads = []  # ids read from the ledger
+
+
+def counted(*args):
+    for transaction in read(*args):
+        reads.append(transaction[0])
+        yield transaction
+project.ledger.read = counted
+bank = project.Bank()
+bank.login("1", "1234")
+print([row["tid"] for row in bank.statement("2")])
+print([row["tid"] for row in bank.statement("2", start="2021-02-05", end="2021-03-31")])
+print([row["tid"] for row in bank.statement("2", kinds=["withdraw"])])
+print([row["tid"] for row in bank.statement("2", min_amount=100, max_amount="150")])
+after = None
+while True:
+    reads.clear()
+    page = bank.statement_page("2", limit=2, after=after)
+    print([row["tid"] for row in page["transactions"]], page["next"], reads)
+    after = page["next"]
+    if after is None:
+        break
+"""
+
+LOGIN = """
+import json
+import metrics
+metrics.enable()
+import project
+bank = project.Bank()
+for customer, pin in (("9999", "1234"), ("500", "0500"), ("1", "1234")):  # a retry finds customers before the last one
+    try:
+        customer = bank.login(customer, pin)
+        print(customer.get_custno(), [acc.get_acc() for acc in customer.used_accounts()])
+    except project.LoginError as error:
+        print(error)
+print(bank.balance("3"), [acc.get_acc() for acc in bank.get_customer().used_accounts()])
+files = metrics.snapshot()["files"]
+print(files["customers.txt"]["lines_scanned"], files["accounts.txt"]["lines_scanned"])
+"""
+
+
+@pytest.fixture
+def bank(tmp_path):
+    """two customers, one under 18, with savings and checking accounts and their transactions"""
+    (tmp_path / "customers.txt").write_text(CUSTOMERS)
+    (tmp_path / "accounts.txt").write_text(ACCOUNTS)
+    (tmp_path / "accountsTransactions.txt").write_text(LEDGER)
+    return tmp_path
+
+
+def _account(directory, acc_number):
+    return AccountStore(str(directory / "accounts.txt"), journaled=True).get(acc_number)
+
+
+def test_savings_limit_is_checked_from_the_saved_dates(bank):
+    today = str(datetime.date.today())
+    old = ["2020-%02d-01" % month for month in range(1, 13)]
+    # account 3 has a date of this month saved that the ledger doesn't have, so only the saved dates are looked at
+    (bank / "accounts.txt").write_text(ACCOUNTS.replace("_2021-01-15\n", "_" + ",".join(old) + "\n")
+                                       .replace("_6_None\n", "_6_" + today + "\n"))
+    assert run(bank, "-c", WITHDRAW_TWICE, "1", "3").stdout.splitlines() == \
+        ["1 withdrawn", "1 limit", "3 limit", "3 limit"]
+    assert _account(bank, "1")[6] == ",".join(old[1:] + [today])  # only the last 12 dates are kept
+    assert _account(bank, "3")[6] == today
+
+
+def test_bank_is_used_without_the_menu(bank):
+    assert run(bank, "-c", "import project").stdout == ""  # nothing is asked or printed on import
+    assert run(bank, "-c", SESSION).stdout.splitlines() == [
+        "LoginError Customer ID does not exist",
+        "LoginError PIN incorrect",
+        "{'tid': 7, 'account': '2', 'balance': Money('260.50')}",
+        "{'tid': 8, 'account': '2', 'balance': Money('240.50')}",
+        "InvalidAmountError You can only deposit a positive value",
+        "InsufficientFundsError You have insufficient funds to withdraw the requested amount",
+        "AccountNotFoundError IBAN does not exist",
+        "AccountNotFoundError Account does not exist",
+        "InvalidAmountError Not a valid number",
+        "AgeRestrictionError Customer Age is not above 18 for a checking account",
+        "['5', 'savings', 'Spending']",
+    ]
+    assert _account(bank, "2")[4] == "240.50" and _account(bank, "3")[4] == "40"
+    assert CustomerStore(str(bank / "customers.txt"), journaled=True).get("2")[5] == "4,5"
+
+
+def test_statements_are_filtered_and_paged(bank):
+    assert run(bank, "-c", STATEMENT).stdout.splitlines() == [
+        "['3', '4', '5']",
+        "['4', '5']",
+        "['5']",
+        "['3']",
+        "['3', '4'] 4 ['3', '4', '5']",  # reading stops at the first transaction past the page
+        "['5'] None ['5']",
+    ]
+
+
+def test_login_reads_only_the_customer_and_the_accounts_used(bank):
+    with open(bank / "customers.txt", "a") as c_writer:
+        for customer in range(3, 501):
+            c_writer.write("%d_%04d_Name_Surname_40_None\n" % (customer, customer))
+    for i in range(2):  # the first program applies the ledger to the accounts and the next builds the indexes
+        run(bank, "-c", LOGIN)
+    assert run(bank, "-c", LOGIN).stdout.splitlines() == [
+        "Customer ID does not exist",
+        "500 []",
+        "1 []",  # no account is read at login
+        "20 ['3']",
+        "2 1",  # the lines of the two customers found and of the account used
+    ]
@@ -0,0 +1,33 @@
+# CA2 OOP - Bank Management System
+# tests of checking the balances against the ledger
+import pytest
+from conftest import run
+
+CUSTOMERS = "1_1234_Aoife_Kelly_30_1,2\n"
+ACCOUNTS = ("1_checking_Bills_IE100_60_1,2,3,4,5_-1000\n"
+            "2_savings_Rent_IE200_40_3_None\n")
+LEDGER = ("1_deposit_IE100_100_2021-01-04\n"
+          "2_transfer_IE100_25_2021-01-05\n"  # from before the payer was written, to the same account
+          "3_transfer_IE200_40_2021-01-06\n"  # from before the payer was written, from account 1
+          "4_transfer_IE100_5_2021-01-07_IE100\n"
+          "5_withdraw_IE100_0.00_2021-01-08\n")
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    (tmp_path / "customers.txt").write_text(CUSTOMERS)
+    (tmp_path / "accounts.txt").write_text(ACCOUNTS)
+    (tmp_path / "accountsTransactions.txt").write_text(LEDGER)
+    return tmp_path
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_transfer_to_the_same_account_comes_to_nothing(legacy, workers):
+    assert run(legacy, "reconcile.py", "--workers", workers).stdout.endswith("2 accounts checked, 0 don't match the ledger\n")
+
+
+def test_changed_balance_is_found(legacy):
+    (legacy / "accounts.txt").write_text(ACCOUNTS.replace("_60_", "_85_"))
+    output = run(legacy, "reconcile.py", "--workers", "1").stdout
+    assert "Account 1 IE100 balance 85 ledger total 60 difference 25" in output
+    assert output.endswith("1 don't match the ledger\n")
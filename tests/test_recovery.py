@@ -0,0 +1,81 @@
+# CA2 OOP - Bank Management System
+# tests of recovering the transactions of a program that crashed
+import os
+import sys
+import subprocess
+import pytest
+from conftest import REPO, run
+
+CRASH = """
+import os, project
+customer = next(iter(project.customer_store))
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+project.account_store.update = lambda details: os._exit(1)  # the program dies after writing the ledger line
+bank.deposit(customer[5].split(",")[0], "7.25")
+"""
+ACCOUNT = """
+import sys, project
+project.open_bank()
+customer = project.customer_store.get(sys.argv[1] if len(sys.argv) > 1 else "1")
+print("_".join(project.account_store.get(customer[5].split(",")[0])))
+"""
+# deposits into the first account of customer 1, then waits with the rest of its block of ids
+# and crashes after writing the ledger line of the next deposit
+HOLDER = """
+import os, sys, project
+customer = project.customer_store.get("1")
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+bank.deposit(customer[5].split(",")[0], 1)
+print("deposited", flush=True)
+sys.stdin.readline()
+project.account_store.update = lambda details: os._exit(1)
+bank.deposit(customer[5].split(",")[0], "7.25")
+"""
+DEPOSIT = """
+import project
+customer = project.customer_store.get("2")
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+bank.deposit(customer[5].split(",")[0], 3)
+"""
+
+
+def test_importing_the_bank_writes_nothing(bank):
+    before = sorted(os.listdir(bank))
+    run(bank, "-c", "import project, batch, reconcile, server, settle, balances")
+    assert sorted(os.listdir(bank)) == before
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_crashed_deposit_is_applied_once(bank, binary):
+    if binary:
+        run(bank, "binstore.py", "import")
+    before = run(bank, "-c", ACCOUNT).stdout.strip().split("_")
+    assert run(bank, "-c", CRASH, check=False).returncode == 1
+    tid = (bank / "accountsTransactions.txt").read_text().splitlines()[-1].split("_")[0]
+    if not binary:
+        stored = [line.split("_") for line in (bank / "accounts.txt").read_text().splitlines()]
+        assert before in stored  # the crash left the account as it was
+    after = run(bank, "-c", ACCOUNT).stdout.strip().split("_")
+    assert float(after[4]) == float(before[4]) + 7.25
+    assert after[5].split(",")[-1] == tid
+    assert run(bank, "-c", ACCOUNT).stdout.strip().split("_") == after  # not applied a second time
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "1").stdout
+
+
+def test_crash_below_the_ids_of_other_programs_is_applied(bank):
+    before = run(bank, "-c", ACCOUNT).stdout.strip().split("_")
+    holder = subprocess.Popen([sys.executable, "-c", HOLDER], cwd=str(bank), env={"PYTHONPATH": REPO},
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline() == "deposited\n"
+        run(bank, "-c", DEPOSIT)  # a later block of ids
+        run(bank, "-c", ACCOUNT, "2")  # recovery while the holder still has ids below the last one
+    finally:
+        holder.communicate("\n")
+    assert holder.returncode == 1
+    after = run(bank, "-c", ACCOUNT).stdout.strip().split("_")
+    assert float(after[4]) == float(before[4]) + 8.25
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "1").stdout
@@ -0,0 +1,97 @@
+# CA2 OOP - Bank Management System
+# tests of the replies of the TCP server
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import pytest
+from conftest import REPO
+
+
+@pytest.fixture
+def client(bank):
+    """connection to a server running on the generated files, logged in as customer 1"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(REPO, "server.py"), "--port", str(port)], cwd=str(bank),
+                              env=dict(os.environ, PYTHONPATH=REPO), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for attempt in range(100):
+            try:
+                connection = socket.create_connection(("127.0.0.1", port))
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("server didn't start")
+        with connection, connection.makefile("rw") as stream:
+            def send(request):
+                stream.write((request if isinstance(request, str) else json.dumps(request)) + "\n")
+                stream.flush()
+                line = stream.readline()
+                assert line, "connection closed without a reply"
+                return json.loads(line)
+            pin = (bank / "customers.txt").read_text().splitlines()[0].split("_")[1]
+            assert send({"op": "login", "customer": "1", "pin": pin})["ok"]
+            yield send
+    finally:
+        server.terminate()
+        errors = server.communicate()[1].decode()
+        assert "Traceback" not in errors, errors
+
+
+@pytest.mark.parametrize("request_line", [
+    "[1, 2]",
+    "5",
+    "{not json",
+    json.dumps({"op": "statement", "account": "1", "kinds": 5}),
+    json.dumps({"op": "statement", "account": "1", "kinds": [1]}),
+    json.dumps({"op": "statement", "account": "1", "start": 2021}),
+    json.dumps({"op": "statement_page", "account": "1", "limit": "ten"}),
+    json.dumps({"op": "deposit", "account": ["1"], "amount": 5}),
+    json.dumps({"op": "deposit", "account": "1", "amount": {"units": 5}}),
+    json.dumps({"op": "transfer", "account": "1", "amount": 5, "IBAN": [1]}),
+    json.dumps({"op": "open_accounts", "accounts": [1, 2]}),
+    json.dumps({"op": "open_accounts", "accounts": "savings"}),
+    json.dumps({"op": "refund", "account": "1"}),
+])
+def test_bad_requests_get_an_error_reply(client, request_line):
+    reply = client(request_line)
+    assert reply["ok"] is False and reply["error"]
+    assert client({"op": "balance", "account": "1"})["ok"]  # the session carries on
+
+
+def test_good_requests(client):
+    balance = client({"op": "balance", "account": "1"})["result"]
+    reply = client({"op": "deposit", "account": "1", "amount": "2.50"})
+    assert reply["ok"], reply
+    assert client({"op": "balance", "account": "1"})["result"] == balance + 2.5
+    statement = client({"op": "statement", "account": "1", "kinds": ["deposit"]})["result"]
+    assert statement and all(row["type"] == "deposit" for row in statement)
+
+
+@pytest.mark.parametrize("name", ["x\n1_checking_Forged_IE1_99999999_None_-1000", "x_y", "Rent,Bills", "x\ry", "", "  ",
+                                  "N" * 25])
+def test_account_names_that_would_change_the_records_are_refused(bank, client, name):
+    balance = client({"op": "balance", "account": "1"})["result"]
+    for request in ({"op": "open_account", "name": name, "type": "checking"},
+                    {"op": "open_accounts", "accounts": [{"name": "Rent", "type": "savings"}, {"name": name, "type": "savings"}]}):
+        reply = client(request)
+        assert reply["ok"] is False and reply["type"] == "InvalidInputError", reply
+    assert client({"op": "balance", "account": "1"})["result"] == balance
+    assert not any("99999999" in path.read_text() for path in bank.iterdir() if path.suffix in (".txt", ".journal"))
+    reply = client({"op": "open_account", "name": "Holiday Fund", "type": "savings"})
+    assert reply["ok"] and reply["result"]["name"] == "Holiday Fund", reply
+
+
+@pytest.mark.parametrize("amount", [10 ** 30, "9" * 40, 1e30, "-" + "9" * 40])
+def test_amounts_too_large_to_keep_are_refused(client, amount):
+    balance = client({"op": "balance", "account": "1"})["result"]
+    for request in ({"op": "deposit", "account": "1", "amount": amount},
+                    {"op": "withdraw", "account": "1", "amount": amount}):
+        reply = client(request)
+        assert reply["ok"] is False and reply["type"] == "InvalidAmountError", reply
+    assert client({"op": "balance", "account": "1"})["result"] == balance
@@ -0,0 +1,50 @@
+# CA2 OOP - Bank Management System
+# tests of settling a requests file across worker processes
+import json
+import random
+import shutil
+from conftest import run
+
+SETTLE = """
+import multiprocessing
+multiprocessing.cpu_count = lambda: 4  # the workers are used even on a machine with one core
+import settle
+started = []
+start = settle.Settlement._start
+settle.Settlement._start = lambda settlement: started.append(start(settlement))
+print(settle.run_settlement("requests.jsonl", "results.jsonl", workers=3, chunk=97, minimum=MINIMUM))
+print(len(started), "started")
+"""
+ACCOUNTS = "from project import account_store\nfor acc in account_store: print('_'.join(acc))"
+
+
+def requests(bank, count):
+    rng = random.Random(1)
+    ibans = [line.split("_")[3] for line in (bank / "accounts.txt").read_text().splitlines()]
+    lines = []
+    for i in range(count):
+        op = rng.choice(("deposit", "withdraw", "transfer"))
+        request = {"id": i, "op": op, "account": str(rng.randint(1, 105)), "amount": rng.choice((5, "2.50", 300))}
+        if op == "transfer":
+            request["to"] = rng.choice(ibans)
+        lines.append(json.dumps(request))
+    lines[10] = "[1, 2]"
+    lines[20] = "{not json"
+    return "\n".join(lines) + "\n"
+
+
+def test_settlement_matches_the_batch_engine(bank, tmp_path_factory):
+    settled = tmp_path_factory.mktemp("settled")
+    shutil.copytree(bank, settled, dirs_exist_ok=True)
+    for directory in (bank, settled):
+        (directory / "requests.jsonl").write_text(requests(bank, 1000))
+    run(bank, "batch.py", "requests.jsonl", "results.jsonl")
+    assert run(settled, "-c", SETTLE.replace("MINIMUM", "0")).stdout.endswith("1 started\n")
+    for name in ("results.jsonl", "accountsTransactions.txt"):
+        assert (settled / name).read_text() == (bank / name).read_text()
+    assert run(settled, "-c", ACCOUNTS).stdout == run(bank, "-c", ACCOUNTS).stdout
+
+
+def test_small_files_run_in_one_process(bank):
+    (bank / "requests.jsonl").write_text(requests(bank, 50))
+    assert run(bank, "-c", SETTLE.replace("MINIMUM", "51")).stdout.endswith("0 started\n")
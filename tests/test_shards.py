@@ -0,0 +1,61 @@
+# CA2 OOP - Bank Management System
+# tests of the ledger split into month files
+import os
+import stat
+import random
+from conftest import run
+from storage import Ledger
+from shards import ShardedLedger
+
+LEDGER = ("1_deposit_IE100_100_2021-01-04\n"
+          "3_deposit_IE100_10_2021-01-30\n"
+          "4_withdraw_IE100_5_2021-02-01\n"
+          "2_deposit_IE100_20_2021-01-31\n"  # from a block of ids handed out before the month ended
+          "5_withdraw_IE100_5_2021-02-11\n"
+          "6_deposit_IE100_1_2021-03-02\n")
+
+
+def test_read_finds_ids_in_any_shard(bank):
+    filename = str(bank / "accountsTransactions.txt")
+    tids = [str(tid) for tid in random.Random(4).sample(range(1, 520), 120)] + ["x", "999999"]
+    ledger = Ledger(filename)
+    expected = list(ledger.read(tids))
+    ledger.close()
+    run(bank, "shards.py", "split")
+    ledger = ShardedLedger(filename)
+    assert len(ledger.shards()) > 1
+    assert list(ledger.read(tids)) == expected
+    ledger.close()
+
+
+def test_read_finds_an_id_written_after_the_next_month_started(tmp_path):
+    (tmp_path / "accountsTransactions.txt").write_text(LEDGER)
+    run(tmp_path, "shards.py", "split")
+    ledger = ShardedLedger(str(tmp_path / "accountsTransactions.txt"))
+    assert [(shard.month, shard.first, shard.last) for shard in ledger.shards()] == \
+        [("2021-01", 1, 3), ("2021-02", 2, 5), ("2021-03", None, None)]
+    assert [transaction[0] for transaction in ledger.read(["6", "2", "5", "1", "3", "4"])] == ["1", "2", "3", "4", "5", "6"]
+    assert [transaction[0] for transaction in ledger.read(["2", "4"], start="2021-02-01")] == ["2", "4"]
+    ledger.close()
+
+
+def test_shards_are_rotated_by_month_read_by_date_and_sealed(tmp_path):
+    filename = str(tmp_path / "accountsTransactions.txt")
+    (tmp_path / "accountsTransactions.txt").write_text(LEDGER)
+    assert run(tmp_path, "shards.py", "split").stdout == "Shards: 2021-01, 2021-02, 2021-03\n"
+    ledger = ShardedLedger(filename)
+    ledger.append(7, "deposit", "IE100", "3", "2021-03-20")
+    ledger.append(8, "withdraw", "IE100", "2", "2021-04-02")  # the first of a new month closes the March shard
+    assert [(shard.month, shard.first, shard.last, shard.state) for shard in ledger.shards()] == \
+        [("2021-01", 1, 3, "closed"), ("2021-02", 2, 5, "closed"), ("2021-03", 6, 7, "closed"), ("2021-04", None, None, "open")]
+    with open(ledger.shards()[0].filename, "a") as t_writer:  # only seen if the January shard is opened
+        t_writer.write("9_deposit_IE100_1_2021-02-15\n")
+    assert [t[0] for t in ledger.between("2021-02-01", "2021-03-31")] == ["4", "5", "6", "7"]
+    assert ledger.last_tid() == 8
+    assert ledger.seal("2021-03") == ["2021-01", "2021-02"]
+    ledger.close()
+    ledger = ShardedLedger(filename)  # another program reads the states from the manifest
+    assert [shard.state for shard in ledger.shards()] == ["sealed", "sealed", "closed", "open"]
+    assert not os.stat(ledger.shards()[1].filename).st_mode & stat.S_IWUSR
+    assert [t[0] for t in ledger.read(["8", "4"])] == ["4", "8"]
+    ledger.close()
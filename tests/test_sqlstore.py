@@ -0,0 +1,44 @@
+# CA2 OOP - Bank Management System
+# tests of moving the bank into the database and back
+from conftest import run
+
+COUNT = "from project import ledger; print(sum(1 for transaction in ledger), ledger.last_tid())"
+KIND = "import project; print(type(project.backend).__name__, type(project.ledger).__name__)"
+DEPOSIT = """
+import project
+customer = next(iter(project.customer_store))
+bank = project.Bank()
+bank.login(customer[0], customer[1])
+print(bank.deposit(customer[5].split(",")[0], "12.50")["tid"])
+bank.logout()
+"""
+
+
+def test_export_keeps_the_archive(bank):
+    before = run(bank, "-c", COUNT).stdout
+    run(bank, "archive.py", "before", (bank / "accountsTransactions.txt").read_text().splitlines()[250].split("_")[4])
+    run(bank, "sqlstore.py", "import")
+    assert run(bank, "-c", COUNT).stdout == before
+    run(bank, "sqlstore.py", "export")
+    (bank / "bank.db").rename(bank / "exported.db")
+    assert (bank / "accountsTransactions.arx").exists()
+    assert run(bank, "-c", COUNT).stdout == before
+    first = int((bank / "accountsTransactions.txt").read_text().split("_", 1)[0])
+    assert first == int(run(bank, "archive.py", "info").stdout.split()[-1]) + 1  # archived lines aren't written twice
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "1").stdout
+
+
+def test_export_of_a_split_ledger_is_used_in_place_of_the_month_files(bank):
+    run(bank, "shards.py", "split")
+    assert run(bank, "-c", KIND).stdout == "TextBackend ShardedLedger\n"
+    run(bank, "sqlstore.py", "import")
+    assert run(bank, "-c", KIND).stdout == "SqliteBackend SqliteLedger\n"
+    tid = run(bank, "-c", DEPOSIT).stdout.strip()  # only in the database
+    before = run(bank, "-c", COUNT).stdout
+    run(bank, "sqlstore.py", "export")
+    (bank / "bank.db").rename(bank / "exported.db")
+    assert run(bank, "-c", KIND).stdout == "TextBackend Ledger\n"
+    assert not list(bank.glob("accountsTransactions-*"))
+    assert run(bank, "-c", COUNT).stdout == before
+    assert (bank / "accountsTransactions.txt").read_text().splitlines()[-1].startswith(tid + "_deposit_")
+    assert "0 don't match" in run(bank, "reconcile.py", "--workers", "1").stdout
@@ -0,0 +1,98 @@
+# CA2 OOP - Bank Management System
+# tests of the stores of the txt files
+import os
+import threading
+import pytest
+from conftest import run
+from storage import AccountStore, TidAllocator, IbanAllocator, Ledger
+
+ALLOCATE = """
+import sys
+from storage import TidAllocator
+tids = TidAllocator("accountsTransactions.txt", block=int(sys.argv[1]))
+print(" ".join(str(tids.next()) for i in range(200)))
+tids.close()
+"""
+
+
+def test_journal_is_compacted_past_the_threshold(bank):
+    store = AccountStore(str(bank / "accounts.txt"), journaled=True, threshold=4096)
+    assert len(store) == 100  # the whole file is loaded, as when a batch runs
+    journal = str(bank / "accounts.journal")
+    for i in range(200):
+        acc = store.get(str(i % 100 + 1))
+        acc[2] = "Renamed" + str(i)
+        store.put(acc)
+        store.save()  # the batch engine only saves, it never refreshes
+        store.wait()
+        assert not os.path.exists(journal) or os.path.getsize(journal) < 4096 + 200
+    store.close()
+    store = AccountStore(str(bank / "accounts.txt"), journaled=True)
+    assert store.get("100")[2] == "Renamed199"
+    assert sum(1 for acc in store if acc[2].startswith("Renamed")) == 100
+
+
+def test_ids_carry_on_from_the_ledger_and_then_the_checkpoint(tmp_path):
+    ledger = tmp_path / "accountsTransactions.txt"
+    ledger.write_text("3_deposit_IE100_5_2021-01-04\n1_deposit_IE100_5_2021-01-04\n7_withdraw_IE100_5_2021-01-05\n")
+    tids = TidAllocator(str(ledger), block=4)
+    assert [tids.next() for i in range(5)] == [8, 9, 10, 11, 12]  # a second block is taken after 11
+    assert tids.reserve(10) == range(16, 26)
+    assert (tmp_path / "accountsTransactions.seq").read_text() == "26"
+    ledger.write_text("")  # the ledger is no longer read once there is a checkpoint
+    crashed = TidAllocator(str(ledger), block=4)
+    assert crashed.next() == 26  # the unused ids of the blocks before are skipped
+    crashed.close()  # nothing was reserved after its block, so the rest of it is given back
+    assert TidAllocator(str(ledger), block=4).next() == 27
+
+
+def test_programs_at_the_same_time_get_different_ids(tmp_path):
+    (tmp_path / "accountsTransactions.txt").write_text("1_deposit_IE100_5_2021-01-04\n")
+    outputs = []
+    threads = [threading.Thread(target=lambda block=block: outputs.append(run(tmp_path, "-c", ALLOCATE, block).stdout))
+               for block in ("1", "8", "8", "32")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tids = [int(tid) for output in outputs for tid in output.split()]
+    assert len(tids) == 800 and len(set(tids)) == 800 and min(tids) == 2
+
+
+def test_ledger_lines_are_read_through_the_index(tmp_path):
+    filename = tmp_path / "accountsTransactions.txt"
+    filename.write_text("1_deposit_IE100_100_2021-01-04\n"
+                        "3_deposit_IE200_50_2021-01-05\n"
+                        "2_withdraw_IE100_25_2021-01-05\n")
+    ledger = Ledger(str(filename))  # the index is built from the file the first time
+    assert [t[0] for t in ledger.read(["3", "1", "x", "99", "2"])] == ["1", "2", "3"]
+    other = Ledger(str(filename))  # another program appending
+    other.append(4, "transfer", "IE200", "10", "2021-01-06", "IE100")
+    assert list(ledger.read(["4"])) == [["4", "transfer", "IE200", "10", "2021-01-06", "IE100"]]
+    assert ledger.last_tid() == 4
+    other.close()
+    ledger.close()
+    filename.write_text("5_deposit_IE300_1_2021-02-01\n")  # replaced, as by an export
+    ledger = Ledger(str(filename))
+    assert list(ledger.read(["1", "5"])) == [["5", "deposit", "IE300", "1", "2021-02-01"]]
+    assert ledger.last_tid() == 5
+    ledger.close()
+
+
+def test_ibans_are_handed_out_once_and_skip_the_ones_taken(tmp_path, monkeypatch):
+    monkeypatch.setattr(IbanAllocator, "SPACE", 10)  # IE1 to IE10
+    (tmp_path / "accounts.txt").write_text("1_checking_Bills_IE3_0_None_-1000\n2_savings_Rent_IE7_0_None_None\n")
+    store = AccountStore(str(tmp_path / "accounts.txt"))
+    first = IbanAllocator(store, str(tmp_path / "accounts.iban")).reserve(3)
+    ibans = IbanAllocator(store, str(tmp_path / "accounts.iban"))  # carries on from the checkpoint
+    rest = ibans.reserve(4) + [ibans.next()]
+    assert sorted(first + rest, key=lambda IBAN: int(IBAN[2:])) == ["IE1", "IE2", "IE4", "IE5", "IE6", "IE8", "IE9", "IE10"]
+    with pytest.raises(LookupError):
+        ibans.next()
+
+
+def test_ibans_of_the_whole_space_are_different(tmp_path):
+    store = AccountStore(str(tmp_path / "accounts.txt"))
+    ibans = IbanAllocator(store, str(tmp_path / "accounts.iban")).reserve(5000)
+    assert len(set(ibans)) == 5000
+    assert all(IBAN.startswith("IE") and 1 <= int(IBAN[2:]) <= 99999 for IBAN in ibans)